@@ -0,0 +1,164 @@
+"""Cross-version alignment: where did a moment of the old mix end up in the new one?
+
+Both files are reduced to an onset envelope (rises in log RMS) at
+``ENV_RATE`` frames per second, read block by block, so an hour of audio is a
+few hundred thousand floats. The new version is then cut into ``WINDOW``
+second windows every ``STEP`` seconds and each window is located in the old
+envelope, within ``MAX_SHIFT`` seconds of the same position, by normalised
+cross-correlation. Windows are matched in batches with one ``rfft`` each.
+
+Each window yields an anchor (new start, old start, confidence = the
+correlation peak, 0..1). Repeated sections (a second chorus) correlate as
+well as the original, so a peak is preferred the closer its offset is to the
+previous confident window's. ``TimeMap`` turns the anchors into a piecewise
+constant-offset map from old to new timecodes.
+"""
+from typing import NamedTuple
+
+import numpy as np
+import soundfile as sf
+
+from .schemas import MIN_CONFIDENCE
+
+ENV_RATE = 50  # envelope frames per second
+WINDOW = 10.0  # seconds
+STEP = 5.0
+MAX_SHIFT = 120.0
+DRIFT_PENALTY = 0.002  # score lost per second of offset away from the previous anchor's
+BATCH = 16  # windows per FFT
+BLOCK_FRAMES = 1 << 18
+
+
+class Anchor(NamedTuple):
+    new_start: float
+    old_start: float
+    confidence: float
+
+    @property
+    def offset(self) -> float:
+        return self.old_start - self.new_start
+
+
+class Segment(NamedTuple):
+    """A stretch of the new version that is the old one shifted by ``offset``."""
+    new_start: float
+    new_end: float
+    offset: float
+    confidence: float
+
+
+def envelope(path: str) -> np.ndarray:
+    """Onset envelope of the audio file at ``path``, ``ENV_RATE`` frames per second."""
+    with sf.SoundFile(path) as f:
+        hop = max(1, round(f.samplerate / ENV_RATE))
+        parts = []
+        carry = np.empty(0, dtype=np.float32)
+        while True:
+            block = f.read(BLOCK_FRAMES, dtype="float32", always_2d=True)
+            mono = np.concatenate([carry, block.mean(axis=1)])
+            usable = len(mono) // hop * hop
+            if usable:
+                frames = mono[:usable].reshape(-1, hop)
+                parts.append(np.sqrt(np.mean(frames * frames, axis=1)))
+            carry = mono[usable:]
+            if len(block) < BLOCK_FRAMES:
+                break
+        rate = f.samplerate / hop
+    rms = np.concatenate(parts) if parts else np.zeros(1, dtype=np.float32)
+    if rate != ENV_RATE:
+        rms = np.interp(np.arange(0, len(rms) / rate, 1 / ENV_RATE) * rate, np.arange(len(rms)), rms)
+    level = np.log10(rms + 1e-5)
+    return np.maximum(np.diff(level, prepend=level[:1]), 0).astype(np.float64)
+
+
+def _correlate(windows: np.ndarray, segments: np.ndarray) -> np.ndarray:
+    """NCC of each window (zero mean, unit norm) at every position of its segment."""
+    w = windows.shape[1]
+    nfft = 1 << int(np.ceil(np.log2(segments.shape[1] + w)))
+    corr = np.fft.irfft(np.fft.rfft(segments, nfft) * np.conj(np.fft.rfft(windows, nfft)), nfft)
+    corr = corr[:, :segments.shape[1] - w + 1]
+    # Energy of each segment slice around its own mean (the window is zero-mean)
+    cs = np.pad(np.cumsum(segments, axis=1), ((0, 0), (1, 0)))
+    cs2 = np.pad(np.cumsum(segments * segments, axis=1), ((0, 0), (1, 0)))
+    sums = cs[:, w:] - cs[:, :-w]
+    energy = (cs2[:, w:] - cs2[:, :-w]) - sums * sums / w
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ncc = np.where(energy > 1e-9, corr / np.sqrt(energy), 0.0)
+    return np.clip(ncc, -1, 1)
+
+
+def anchors(old: np.ndarray, new: np.ndarray) -> list[Anchor]:
+    """Locate each window of the ``new`` envelope in the ``old`` one."""
+    w = int(WINDOW * ENV_RATE)
+    shift = int(MAX_SHIFT * ENV_RATE)
+    starts = list(range(0, max(1, len(new) - w + 1), int(STEP * ENV_RATE)))
+    padded = np.pad(old, (shift, shift + w + max(0, len(new) - len(old))))
+    lags = (np.arange(2 * shift + 1) - shift) / ENV_RATE
+    result = []
+    prior = 0.0
+    for i in range(0, len(starts), BATCH):
+        batch = starts[i:i + BATCH]
+        windows = np.stack([np.pad(new[s:s + w], (0, max(0, s + w - len(new)))) for s in batch])
+        windows -= windows.mean(axis=1, keepdims=True)
+        norms = np.linalg.norm(windows, axis=1)
+        windows /= np.where(norms > 0, norms, 1)[:, None]
+        segments = np.stack([padded[s:s + w + 2 * shift] for s in batch])
+        ncc = _correlate(windows, segments)
+        for s, norm, row in zip(batch, norms, ncc):
+            if norm == 0:  # silence: nothing to match
+                continue
+            k = int(np.argmax(row - DRIFT_PENALTY * np.abs(lags - prior)))
+            confidence = float(max(row[k], 0.0))
+            if confidence >= MIN_CONFIDENCE:
+                prior = lags[k]
+            result.append(Anchor(s / ENV_RATE, s / ENV_RATE + float(lags[k]), confidence))
+    return result
+
+
+class TimeMap:
+    """Maps old timecodes to new ones through the confident anchors."""
+
+    def __init__(self, anchors: list[Anchor], new_duration: float):
+        self.anchors = [a for a in anchors if a.confidence >= MIN_CONFIDENCE]
+        self.new_duration = new_duration
+
+    def map(self, t: float) -> tuple[float, float]:
+        """(new timecode, confidence) for old timecode ``t``."""
+        if not self.anchors:
+            return min(t, self.new_duration), 0.0
+        containing = [a for a in self.anchors if a.old_start <= t < a.old_start + WINDOW]
+        if containing:
+            best = max(containing, key=lambda a: a.confidence)
+            confidence = best.confidence
+        else:
+            # Material that isn't in the new version (cut): nearest anchor, less sure
+            def distance(a: Anchor) -> float:
+                return a.old_start - t if t < a.old_start else t - a.old_start - WINDOW
+            best = min(self.anchors, key=distance)
+            confidence = best.confidence * max(0.0, 1 - distance(best) / WINDOW)
+        return round(min(max(t - best.offset, 0.0), self.new_duration), 3), round(float(confidence), 3)
+
+    def segments(self) -> list[Segment]:
+        """Runs of consecutive anchors with the same offset, in new-version order."""
+        result: list[Segment] = []
+        run: list[Anchor] = []
+        for a in sorted(self.anchors, key=lambda a: a.new_start) + [None]:
+            if run and (a is None or abs(a.offset - run[-1].offset) > 2 / ENV_RATE or a.new_start > run[-1].new_start + WINDOW):
+                result.append(Segment(
+                    run[0].new_start, min(run[-1].new_start + WINDOW, self.new_duration),
+                    round(float(np.median([r.offset for r in run])), 3),
+                    round(float(np.mean([r.confidence for r in run])), 3),
+                ))
+                run = []
+            if a is not None:
+                run.append(a)
+        # Windows overlap; let each segment end where the next one starts
+        return [
+            seg._replace(new_end=min(seg.new_end, nxt.new_start)) if nxt else seg
+            for seg, nxt in zip(result, result[1:] + [None])
+        ]
+
+
+def align(old_path: str, new_path: str) -> TimeMap:
+    old, new = envelope(old_path), envelope(new_path)
+    return TimeMap(anchors(old, new), len(new) / ENV_RATE)
@@ -0,0 +1,184 @@
+"""Listening analytics: how much of each version the share-link visitors heard.
+
+The client page batches its play/seek/complete events and posts them every
+half minute. Each worker adds them up in memory per version, share link and
+listener (a random id the browser keeps) and writes the totals to
+``ListeningRollup`` every ``MIXREVIEW_ANALYTICS_FLUSH_SECONDS`` (default 60)
+as one upsert statement, so no request waits on SQLite and a roomful of
+listeners costs one small transaction per worker and interval.
+
+The upsert adds to the stored counters and ORs in the coverage bits, so
+rollups from several workers (or several flushes) merge without a read
+first. A slice of the track counts as heard once at least half of it was
+played. Events still buffered when a worker is killed are lost; they are
+statistics, not data.
+"""
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+from sqlalchemy.dialects.sqlite import insert
+
+from .database import SessionLocal
+from .models import ListeningRollup, Version
+from .schemas import ListeningEvent
+
+log = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = float(os.environ.get("MIXREVIEW_ANALYTICS_FLUSH_SECONDS", "60"))
+SLICES = 50  # coverage resolution; fits the 64-bit coverage column
+MAX_KEYS = 10000  # flush early rather than grow without bound
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+@dataclass
+class Tally:
+    seconds: float = 0.0
+    seeks: int = 0
+    completes: int = 0
+    heard: list[float] = field(default_factory=lambda: [0.0] * SLICES)  # share of each slice played
+    first_at: datetime = field(default_factory=_now)
+    last_at: datetime = field(default_factory=_now)
+
+    def add(self, event: ListeningEvent):
+        self.last_at = _now()
+        if event.type == "seek":
+            self.seeks += 1
+        elif event.type == "complete":
+            self.completes += 1
+        else:
+            start, end = min(event.start, event.duration), min(event.end, event.duration)
+            if end <= start:
+                return
+            self.seconds += end - start
+            width = event.duration / SLICES
+            for i in range(int(start / width), min(SLICES, int(end / width) + 1)):
+                overlap = min(end, (i + 1) * width) - max(start, i * width)
+                if overlap > 0:
+                    self.heard[i] += overlap / width
+
+    def merge(self, other: "Tally"):
+        self.seconds += other.seconds
+        self.seeks += other.seeks
+        self.completes += other.completes
+        self.heard = [a + b for a, b in zip(self.heard, other.heard)]
+        self.first_at = min(self.first_at, other.first_at)
+        self.last_at = max(self.last_at, other.last_at)
+
+    @property
+    def coverage(self) -> int:
+        return sum(1 << i for i, share in enumerate(self.heard) if share >= 0.5)
+
+
+Key = tuple[int, str, str]  # version_id, share_link, listener
+
+
+class ListeningBuffer:
+    def __init__(self, interval: float = FLUSH_INTERVAL):
+        self.interval = interval
+        self._tallies: dict[Key, Tally] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._early_flush = False  # an early flush thread is running
+
+    def _ensure_flusher(self):
+        # Started lazily so it runs in the worker process, not the pre-fork master.
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="listening-flush", daemon=True)
+                self._thread.start()
+
+    def add(self, share_link: str, listener: str, events: list[ListeningEvent]) -> int:
+        self._ensure_flusher()
+        with self._lock:
+            for event in events:
+                key = (event.version_id, share_link, listener)
+                tally = self._tallies.get(key)
+                if tally is None:
+                    tally = self._tallies[key] = Tally()
+                tally.add(event)
+            full = len(self._tallies) >= MAX_KEYS and not self._early_flush
+            if full:
+                self._early_flush = True
+        if full:
+            threading.Thread(target=self._flush_early, daemon=True).start()
+        return len(events)
+
+    def _flush_early(self):
+        try:
+            self.flush()
+        finally:
+            self._early_flush = False
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def flush(self) -> int:
+        """Write what this worker has buffered; returns the number of rollups touched."""
+        with self._flush_lock:
+            with self._lock:
+                tallies, self._tallies = self._tallies, {}
+            if not tallies:
+                return 0
+            try:
+                self._write(tallies)
+            except Exception:
+                log.exception("Writing %d listening rollups failed, keeping them for the next flush", len(tallies))
+                with self._lock:
+                    for key, tally in tallies.items():
+                        if key in self._tallies:
+                            tally.merge(self._tallies[key])
+                        self._tallies[key] = tally
+                return 0
+            return len(tallies)
+
+    @staticmethod
+    def _write(tallies: dict[Key, Tally]):
+        db = SessionLocal()
+        try:
+            # Versions deleted since their events arrived are dropped here.
+            live = {vid for (vid,) in db.query(Version.id).filter(Version.id.in_({k[0] for k in tallies}))}
+            rows = [
+                {
+                    "version_id": version_id, "share_link": share_link, "listener": listener,
+                    "seconds": tally.seconds, "seeks": tally.seeks, "completes": tally.completes,
+                    "coverage": tally.coverage, "first_at": tally.first_at, "last_at": tally.last_at,
+                }
+                for (version_id, share_link, listener), tally in tallies.items()
+                if version_id in live
+            ]
+            if rows:
+                stmt = insert(ListeningRollup)
+                new = stmt.excluded
+                db.execute(stmt.on_conflict_do_update(
+                    index_elements=["version_id", "share_link", "listener"],
+                    set_={
+                        "seconds": ListeningRollup.seconds + new.seconds,
+                        "seeks": ListeningRollup.seeks + new.seeks,
+                        "completes": ListeningRollup.completes + new.completes,
+                        "coverage": ListeningRollup.coverage.op("|")(new.coverage),
+                        "last_at": new.last_at,
+                    },
+                ), rows)
+                db.commit()
+        finally:
+            db.close()
+
+    def stop(self):
+        """Stop the flusher and write out what is left (call on shutdown)."""
+        self._stop.set()
+        self.flush()
+
+
+buffer = ListeningBuffer()
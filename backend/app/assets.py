@@ -0,0 +1,147 @@
+"""Static frontend assets: build step and cache-aware serving.
+
+``build()`` copies each app's JS into ``frontend/<app>/dist/`` under
+content-hashed names, rewrites ``index.html`` to reference them and writes
+gzip/brotli variants next to every text file. Run it with
+``python -m app.assets`` (``app.startup.prepare`` does it on deploy).
+
+Hashed files never change, so they are served with year-long ``immutable``
+caching; HTML keeps a short lifetime so new hashes are picked up quickly.
+"""
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import shutil
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+try:
+    import brotli
+except ImportError:  # brotli variants are optional; gzip always works
+    brotli = None
+
+log = logging.getLogger(__name__)
+
+FRONTEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "frontend"))
+DIST_DIR = "dist"
+
+# Files per app that get fingerprinted, relative to frontend/<app>/.
+APP_ASSETS = {
+    "admin": ["js/admin.js"],
+    "client": ["js/client.js"],
+}
+
+HASH_LENGTH = 10
+COMPRESSIBLE_EXTENSIONS = {".html", ".js", ".css", ".svg", ".json"}
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+HTML_CACHE_CONTROL = "public, max-age=60, must-revalidate"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+_HASHED_NAME = re.compile(r"\.[0-9a-f]{%d}\.[^./]+$" % HASH_LENGTH)
+# Preferred first when the client accepts both.
+_ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+
+# --- Build ---
+
+def _write_variants(path: str, data: bytes):
+    with open(path, "wb") as f:
+        f.write(data)
+    if os.path.splitext(path)[1] not in COMPRESSIBLE_EXTENSIONS:
+        return
+    with open(path + ".gz", "wb") as f:
+        # mtime=0 keeps the output byte-identical across builds
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + ".br", "wb") as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+def _build_app(app_name: str, frontend_dir: str):
+    src_root = os.path.join(frontend_dir, app_name)
+    dist = os.path.join(src_root, DIST_DIR)
+    staging = dist + ".tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    with open(os.path.join(src_root, "index.html"), encoding="utf-8") as f:
+        html = f.read()
+
+    for rel in APP_ASSETS[app_name]:
+        with open(os.path.join(src_root, rel), "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+        stem, ext = os.path.splitext(rel)
+        hashed_rel = f"{stem}.{digest}{ext}"
+        os.makedirs(os.path.dirname(os.path.join(staging, hashed_rel)), exist_ok=True)
+        _write_variants(os.path.join(staging, hashed_rel), data)
+        html = html.replace(f"/{app_name}-static/{rel}", f"/{app_name}-static/{DIST_DIR}/{hashed_rel}")
+
+    _write_variants(os.path.join(staging, "index.html"), html.encode("utf-8"))
+
+    shutil.rmtree(dist, ignore_errors=True)
+    os.replace(staging, dist)
+
+
+def build(frontend_dir: str = FRONTEND_DIR):
+    for app_name in APP_ASSETS:
+        _build_app(app_name, frontend_dir)
+    log.info("Built frontend assets in %s (brotli: %s)", frontend_dir, brotli is not None)
+
+
+# --- Serving ---
+
+def _pick_variant(full_path: str, accept_encoding: str) -> tuple[str, str | None]:
+    accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+    for encoding, suffix in _ENCODINGS:
+        if encoding in accepted and os.path.isfile(full_path + suffix):
+            return full_path + suffix, encoding
+    return full_path, None
+
+
+def file_response(full_path: str, request_headers: Headers, cache_control: str, status_code: int = 200) -> Response:
+    """Serve ``full_path``, using a precompressed variant when the client accepts one."""
+    path, encoding = _pick_variant(full_path, request_headers.get("accept-encoding", ""))
+    headers = {"Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    media_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+    response = FileResponse(
+        path, status_code=status_code, headers=headers, media_type=media_type, stat_result=os.stat(path),
+    )
+
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match and response.headers["etag"] in [t.strip(" W/") for t in if_none_match.split(",")]:
+        return NotModifiedResponse(response.headers)
+    return response
+
+
+def page_path(app_name: str) -> str:
+    """The built index.html of an app, or the source one if no build exists."""
+    built = os.path.join(FRONTEND_DIR, app_name, DIST_DIR, "index.html")
+    if os.path.isfile(built):
+        return built
+    return os.path.join(FRONTEND_DIR, app_name, "index.html")
+
+
+def page_response(app_name: str, request_headers: Headers) -> Response:
+    return file_response(page_path(app_name), request_headers, HTML_CACHE_CONTROL)
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that serves .br/.gz siblings and long-caches hashed names."""
+
+    def file_response(self, full_path, stat_result, scope, status_code=200) -> Response:
+        full_path = str(full_path)
+        cache_control = IMMUTABLE_CACHE_CONTROL if _HASHED_NAME.search(full_path) else REVALIDATE_CACHE_CONTROL
+        return file_response(full_path, Headers(scope=scope), cache_control, status_code)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    build()
@@ -1,7 +1,7 @@
 import os
 from datetime import datetime, timedelta, timezone
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, Request, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
@@ -13,9 +13,11 @@ from .models import AdminUser, Project
 SECRET_KEY = os.environ.get("MIXREVIEW_SECRET_KEY", "dev-secret-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_HOURS = 24
+DOWNLOAD_TOKEN_EXPIRE_MINUTES = 5
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 bearer_scheme = HTTPBearer()
+optional_bearer_scheme = HTTPBearer(auto_error=False)
 
 
 def hash_password(password: str) -> str:
@@ -31,14 +33,18 @@ def create_access_token(username: str) -> str:
     return jwt.encode({"sub": username, "exp": expire}, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def get_current_admin(
-    creds: HTTPAuthorizationCredentials = Depends(bearer_scheme),
-    db: Session = Depends(get_db),
-) -> AdminUser:
+def create_download_token(username: str, scope: str) -> str:
+    """Short-lived token for one download URL, for links that can't send headers."""
+    expire = datetime.now(timezone.utc) + timedelta(minutes=DOWNLOAD_TOKEN_EXPIRE_MINUTES)
+    return jwt.encode({"sub": username, "scope": scope, "exp": expire}, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def _admin_from_token(token: str, db: Session, scope: str | None = None) -> AdminUser:
+    """Resolve a token to its admin; ``scope`` None accepts only full access tokens."""
     try:
-        payload = jwt.decode(creds.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
-        if username is None:
+        if username is None or payload.get("scope") != scope:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
@@ -49,6 +55,33 @@ def get_current_admin(
     return user
 
 
+def get_current_admin(
+    creds: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+    db: Session = Depends(get_db),
+) -> AdminUser:
+    return _admin_from_token(creds.credentials, db)
+
+
+def admin_or_download_token(scope: str):
+    """Dependency accepting a Bearer access token or ``?token=`` for ``scope``.
+
+    ``scope`` may reference path parameters, e.g. ``"export:{project_id}"``.
+    """
+    def dependency(
+        request: Request,
+        token: str | None = Query(None),
+        creds: HTTPAuthorizationCredentials | None = Depends(optional_bearer_scheme),
+        db: Session = Depends(get_db),
+    ) -> AdminUser:
+        if creds is not None:
+            return _admin_from_token(creds.credentials, db)
+        if token:
+            return _admin_from_token(token, db, scope.format(**request.path_params))
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+
+    return dependency
+
+
 def get_project_by_share_link(share_link: str, db: Session = Depends(get_db)) -> Project:
     project = db.query(Project).filter(Project.share_link == share_link).first()
     if project is None:
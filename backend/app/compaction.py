@@ -0,0 +1,255 @@
+"""Lossless cold storage: old WAV versions are re-encoded to FLAC.
+
+``run()`` picks WAV versions uploaded more than ``MIXREVIEW_COMPACT_AFTER_DAYS``
+days ago (default 90, 0 turns compaction off), encodes each to FLAC block by
+block, decodes the FLAC again and compares every sample with the WAV, and
+only then swaps ``Version.file_path`` and deletes the WAV. The swap is a
+compare-and-swap on the old path, so a version deleted or replaced meanwhile
+keeps its state and the new FLAC is discarded.
+
+``Version.compacted_from`` records the WAV's sample format and
+``Version.compacted_fmt`` its ``fmt `` chunk, so ``wav_chunks`` can re-wrap
+the FLAC as WAV on demand: the same samples under the same format tag and
+channel mask, though extra RIFF chunks of the original (``bext``, ``iXML``...)
+are not kept. Only 16/24-bit integer PCM is compacted; FLAC can't hold float
+samples.
+
+The job scheduler (app.jobs) runs this every ``MIXREVIEW_COMPACT_INTERVAL_HOURS``
+(default 24); ``python -m app.compaction`` runs it once.
+"""
+import io
+import logging
+import os
+import struct
+import tempfile
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import BinaryIO, Iterator
+
+import numpy as np
+import soundfile as sf
+from sqlalchemy import func
+
+from .database import SessionLocal
+from .models import Version
+from .storage import get_storage
+
+log = logging.getLogger(__name__)
+
+AFTER_DAYS = int(os.environ.get("MIXREVIEW_COMPACT_AFTER_DAYS", "90"))
+INTERVAL = float(os.environ.get("MIXREVIEW_COMPACT_INTERVAL_HOURS", "24")) * 3600 if AFTER_DAYS > 0 else 0
+BLOCK_FRAMES = 65536
+SAMPLE_BYTES = {"PCM_16": 2, "PCM_24": 3}
+SUBTYPES = {8 * n: subtype for subtype, n in SAMPLE_BYTES.items()}
+MAX_FMT_BYTES = 64
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+# KSDATAFORMAT_SUBTYPE_PCM after its leading format tag
+PCM_GUID_TAIL = bytes.fromhex("000000001000800000aa00389b71")
+
+
+def _skip(f: BinaryIO, n: int):
+    if getattr(f, "seekable", lambda: False)():
+        f.seek(n, io.SEEK_CUR)
+        return
+    while n > 0:
+        chunk = f.read(min(n, 1 << 20))
+        if not chunk:
+            break
+        n -= len(chunk)
+
+
+def read_fmt(f: BinaryIO) -> bytes | None:
+    """The ``fmt `` chunk of a RIFF/WAVE stream, walking past any chunks before it."""
+    head = f.read(12)
+    if len(head) < 12 or head[:4] != b"RIFF" or head[8:] != b"WAVE":
+        return None
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            return None
+        chunk_id, size = struct.unpack("<4sI", header)
+        if chunk_id == b"fmt ":
+            body = f.read(size)
+            return body if len(body) == size else None
+        if chunk_id == b"data":  # fmt must come before the samples
+            return None
+        _skip(f, size + (size & 1))
+
+
+def _wav_format(key: str) -> tuple[str, bytes] | None:
+    """The sample format and fmt chunk of a compactable WAV, read from its header only."""
+    with get_storage().open(key) as f:
+        fmt = read_fmt(f)
+    if fmt is None or not 16 <= len(fmt) <= MAX_FMT_BYTES:
+        return None
+    tag, channels, _rate, _byte_rate, block_align, bits = struct.unpack_from("<HHIIHH", fmt)
+    if tag == WAVE_FORMAT_EXTENSIBLE:
+        if len(fmt) < 40 or fmt[26:40] != PCM_GUID_TAIL:
+            return None
+        tag = struct.unpack_from("<H", fmt, 24)[0]
+    if tag != WAVE_FORMAT_PCM or bits not in SUBTYPES or block_align != channels * bits // 8:
+        return None
+    return SUBTYPES[bits], fmt
+
+
+def encode_flac(src: str, dest: str, subtype: str):
+    with sf.SoundFile(src) as wav, sf.SoundFile(dest, "w", wav.samplerate, wav.channels, subtype, format="FLAC") as flac:
+        for block in wav.blocks(BLOCK_FRAMES, dtype="int32"):
+            flac.write(block)
+
+
+def same_samples(a_path: str, b_path: str) -> bool:
+    """True if both files decode to exactly the same samples."""
+    with sf.SoundFile(a_path) as a, sf.SoundFile(b_path) as b:
+        if (a.frames, a.channels, a.samplerate) != (b.frames, b.channels, b.samplerate):
+            return False
+        while True:
+            x = a.read(BLOCK_FRAMES, dtype="int32")
+            y = b.read(BLOCK_FRAMES, dtype="int32")
+            if not np.array_equal(x, y):
+                return False
+            if not len(x):
+                return True
+
+
+def _flac_key(wav_key: str) -> str:
+    base = os.path.splitext(wav_key)[0]
+    if get_storage().exists(base + ".flac"):
+        return f"{base}-{uuid.uuid4().hex[:8]}.flac"
+    return base + ".flac"
+
+
+def compact(version_id: int) -> int:
+    """Compact one version; returns the bytes saved (0 if it was left as is)."""
+    db = SessionLocal()
+    try:
+        version = db.get(Version, version_id)
+        if version is None or version.compacted_from or not version.file_path.lower().endswith(".wav"):
+            return 0
+        old_key = version.file_path
+    finally:
+        db.close()
+    wav_format = _wav_format(old_key)
+    if wav_format is None:
+        return 0
+    subtype, fmt = wav_format
+
+    storage = get_storage()
+    new_key = _flac_key(old_key)
+    with storage.local_copy(old_key) as src, tempfile.TemporaryDirectory() as tmp:
+        flac_path = os.path.join(tmp, "compacted.flac")
+        encode_flac(src, flac_path, subtype)
+        if not same_samples(src, flac_path):
+            log.error("FLAC of version %d does not decode to the original samples; keeping the WAV", version_id)
+            return 0
+        saved = os.path.getsize(src) - os.path.getsize(flac_path)
+        if saved <= 0:
+            return 0
+        with open(flac_path, "rb") as f:
+            storage.save(new_key, f, "audio/flac")
+
+    db = SessionLocal()
+    try:
+        swapped = (
+            db.query(Version)
+            .filter(Version.id == version_id, Version.file_path == old_key)
+            .update(
+                {"file_path": new_key, "compacted_from": subtype, "compacted_fmt": fmt.hex()},
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+    finally:
+        db.close()
+    if not swapped:
+        storage.delete(new_key)
+        return 0
+    storage.delete(old_key)
+    log.info("Compacted version %d to FLAC, saved %.1f MB", version_id, saved / 1e6)
+    return saved
+
+
+def run(after_days: int = AFTER_DAYS) -> int:
+    """Compact every eligible version; returns the total bytes saved."""
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=after_days)
+    db = SessionLocal()
+    try:
+        ids = [
+            vid for (vid,) in db.query(Version.id).filter(
+                Version.compacted_from.is_(None),
+                func.lower(Version.file_path).like("%.wav"),
+                Version.created_at < cutoff,
+            )
+        ]
+    finally:
+        db.close()
+    saved = 0
+    for vid in ids:
+        try:
+            saved += compact(vid)
+        except Exception:
+            log.exception("Compacting version %d failed", vid)
+    if ids:
+        log.info("Compaction: %d candidates, %.1f MB saved", len(ids), saved / 1e6)
+    return saved
+
+
+# --- WAV re-wrapping ---
+
+def fmt_chunk(channels: int, samplerate: int, sample_bytes: int) -> bytes:
+    """A fmt chunk for versions compacted before theirs was recorded: plain PCM
+    for 16-bit mono/stereo, WAVE_FORMAT_EXTENSIBLE with a default channel mask
+    otherwise, as the WAV spec asks for."""
+    block_align = channels * sample_bytes
+    basic = (channels, samplerate, samplerate * block_align, block_align, sample_bytes * 8)
+    if channels <= 2 and sample_bytes == 2:
+        return struct.pack("<HHIIHH", WAVE_FORMAT_PCM, *basic)
+    mask = (1 << channels) - 1 if channels <= 18 else 0
+    return (
+        struct.pack("<HHIIHHHHIH", WAVE_FORMAT_EXTENSIBLE, *basic, 22, sample_bytes * 8, mask, WAVE_FORMAT_PCM)
+        + PCM_GUID_TAIL
+    )
+
+
+def wav_header(frames: int, fmt: bytes) -> bytes:
+    block_align = struct.unpack_from("<H", fmt, 12)[0]
+    data_size = frames * block_align
+    padded_fmt = fmt + b"\0" * (len(fmt) & 1)
+    riff_size = 4 + 8 + len(padded_fmt) + 8 + data_size + (data_size & 1)
+    return (
+        struct.pack("<4sI4s4sI", b"RIFF", riff_size, b"WAVE", b"fmt ", len(fmt))
+        + padded_fmt
+        + struct.pack("<4sI", b"data", data_size)
+    )
+
+
+def _fmt(fmt_hex: str | None, channels: int, samplerate: int, subtype: str) -> bytes:
+    return bytes.fromhex(fmt_hex) if fmt_hex else fmt_chunk(channels, samplerate, SAMPLE_BYTES[subtype])
+
+
+def wav_size(path: str, subtype: str, fmt_hex: str | None = None) -> int:
+    info = sf.info(path)
+    header = wav_header(info.frames, _fmt(fmt_hex, info.channels, info.samplerate, subtype))
+    data_size = info.frames * info.channels * SAMPLE_BYTES[subtype]
+    return len(header) + data_size + (data_size & 1)
+
+
+def wav_chunks(key: str, subtype: str, fmt_hex: str | None = None) -> Iterator[bytes]:
+    """The compacted file at ``key`` as a PCM WAV in ``subtype``, streamed."""
+    sample_bytes = SAMPLE_BYTES[subtype]
+    with get_storage().local_copy(key) as path, sf.SoundFile(path) as flac:
+        yield wav_header(flac.frames, _fmt(fmt_hex, flac.channels, flac.samplerate, subtype))
+        for block in flac.blocks(BLOCK_FRAMES, dtype="int16" if sample_bytes == 2 else "int32"):
+            if sample_bytes == 2:
+                yield block.astype("<i2", copy=False).tobytes()
+            else:
+                # 24-bit samples come back in the top three bytes of each int32
+                yield block.astype("<i4", copy=False).view(np.uint8).reshape(-1, 4)[:, 1:].tobytes()
+        if flac.frames * flac.channels * sample_bytes & 1:
+            yield b"\0"  # RIFF chunks are padded to an even length
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run()
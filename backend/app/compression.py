@@ -0,0 +1,144 @@
+"""Response compression middleware (brotli/gzip) for API payloads.
+
+Unlike Starlette's GZipMiddleware this negotiates brotli, skips audio/image
+routes and binary content types outright, and leaves responses that already
+carry a Content-Encoding (the precompressed static assets) untouched.
+"""
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "application/x-ndjson",
+    "image/svg+xml",
+)
+
+
+def _negotiate(accept_encoding: str) -> str | None:
+    accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        if encoding == "br":
+            self._obj = brotli.Compressor(quality=brotli_quality)
+            self._finish = self._obj.finish
+            self._process = self._obj.process
+        else:
+            # wbits=31 -> gzip container
+            self._obj = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+            self._finish = self._obj.flush
+            self._process = self._obj.compress
+
+    def process(self, data: bytes) -> bytes:
+        return self._process(data)
+
+    def finish(self) -> bytes:
+        return self._finish()
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        exclude_paths: tuple[str, ...] = (),
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.exclude_paths = exclude_paths
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exclude_paths):
+            await self.app(scope, receive, send)
+            return
+        encoding = _negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _Responder(send, encoding, self)
+        await self.app(scope, receive, responder.send)
+
+
+class _Responder:
+    def __init__(self, send: Send, encoding: str, config: CompressionMiddleware):
+        self._send = send
+        self._encoding = encoding
+        self._config = config
+        self._start: Message | None = None
+        self._compressor: _Compressor | None = None
+        self._passthrough = False
+
+    def _new_compressor(self) -> _Compressor:
+        return _Compressor(self._encoding, self._config.gzip_level, self._config.brotli_quality)
+
+    def _eligible(self, headers: Headers) -> bool:
+        if "content-encoding" in headers:
+            return False
+        return headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+
+    async def send(self, message: Message):
+        if message["type"] == "http.response.start":
+            self._start = message
+            return
+
+        if self._passthrough or message["type"] != "http.response.body":
+            await self._flush_start()
+            self._passthrough = True
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self._compressor is None:
+            headers = MutableHeaders(raw=self._start["headers"])
+            if not self._eligible(headers) or (not more_body and len(body) < self._config.minimum_size):
+                self._passthrough = True
+                await self._flush_start()
+                await self._send(message)
+                return
+
+            self._compressor = self._new_compressor()
+            headers["Content-Encoding"] = self._encoding
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                # Streaming body: length is unknown until the end.
+                del headers["Content-Length"]
+            else:
+                data = self._compressor.process(body) + self._compressor.finish()
+                headers["Content-Length"] = str(len(data))
+                await self._flush_start()
+                await self._send({"type": "http.response.body", "body": data})
+                return
+            await self._flush_start()
+
+        data = self._compressor.process(body)
+        if not more_body:
+            data += self._compressor.finish()
+        await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+    async def _flush_start(self):
+        if self._start is not None:
+            await self._send(self._start)
+            self._start = None
+
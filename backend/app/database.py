@@ -1,5 +1,7 @@
+import logging
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, literal
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import DeclarativeBase, sessionmaker
 
 DATABASE_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "data", "database")
@@ -9,11 +11,59 @@ DATABASE_URL = f"sqlite:///{os.path.join(DATABASE_DIR, 'mixreaview.db')}"
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(bind=engine)
 
+log = logging.getLogger(__name__)
+
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_conn, _record):
+    # Several worker processes share the file: WAL lets readers run alongside
+    # the single writer, and busy_timeout makes writers wait instead of failing.
+    cursor = dbapi_conn.cursor()
+    # Takes effect on a new database file only, and only before journal_mode=WAL
+    # writes its first page; app.maintenance converts older ones.
+    cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
 
 class Base(DeclarativeBase):
     pass
 
 
+def _sync_schema(conn):
+    """Add columns and indexes that models gained after their table was created.
+
+    create_all() only creates whole tables. New columns are added with their
+    scalar default (so existing rows get it) and without NOT NULL.
+    """
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column.type.compile(conn.dialect)}'
+            if column.default is not None and column.default.is_scalar:
+                default = literal(column.default.arg, column.type)
+                ddl += " DEFAULT " + str(default.compile(conn, compile_kwargs={"literal_binds": True}))
+            conn.exec_driver_sql(ddl)
+        for index in table.indexes:
+            try:
+                index.create(conn, checkfirst=True)
+            except IntegrityError:  # a unique index over rows that aren't unique yet
+                log.warning("Could not create %s: %s has duplicate rows; fix them and restart", index.name, table.name)
+
+
+def init_db():
+    """Create missing tables/columns/indexes. Run once per deployment, not per worker."""
+    from . import models  # noqa: F401  (registers the tables on Base.metadata)
+
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        _sync_schema(conn)
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -0,0 +1,319 @@
+"""Streaming exports: project ZIP archives and comment lists (CSV, JSON Lines, REAPER markers).
+
+Everything here yields bytes for a StreamingResponse, so memory stays flat
+however large the project is: audio is copied through in storage-sized
+chunks, comments are read from the database in pages, and the ZIP is
+written to a sink that is drained after every chunk (no temp files).
+
+Archives store audio uncompressed (it doesn't deflate meaningfully, and
+copying is far cheaper than compressing) and deflate the comment files.
+"""
+import csv
+import io
+import json
+import re
+import zipfile
+from datetime import datetime, timezone
+from itertools import groupby
+from operator import attrgetter
+from typing import Iterable, Iterator, NamedTuple
+
+from sqlalchemy import case
+from sqlalchemy.orm import Session, selectinload
+
+from .database import SessionLocal
+from .models import Comment
+from .storage import CHUNK_SIZE, get_storage, stored_filename
+
+PAGE_SIZE = 500
+TEXT_CHUNK_SIZE = 64 * 1024
+
+COMMENT_FIELDS = [
+    "song", "version", "comment_id", "reply_id", "timecode", "time",
+    "author", "text", "solved", "created_at",
+]
+REAPER_FIELDS = ["#", "Name", "Start", "End", "Length"]
+COMMENT_FORMATS = {"csv": "text/csv", "jsonl": "application/x-ndjson", "reaper": "text/csv"}
+
+
+def format_time(seconds: float) -> str:
+    """``m:ss.mmm`` (or ``h:mm:ss.mmm``), the way REAPER displays positions."""
+    millis = round(seconds * 1000)
+    hours, millis = divmod(millis, 3_600_000)
+    minutes, millis = divmod(millis, 60_000)
+    secs, millis = divmod(millis, 1000)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}.{millis:03d}"
+    return f"{minutes}:{secs:02d}.{millis:03d}"
+
+
+def safe_name(name: str) -> str:
+    """A path component that is valid on Windows, macOS and Linux."""
+    return re.sub(r'[\\/:*?"<>|\x00-\x1f]+', "_", name).strip(" .") or "untitled"
+
+
+class ExportVersion(NamedTuple):
+    """The plain values an export needs, detached from the request's session."""
+    id: int
+    song_title: str
+    song_position: int
+    version_number: int
+    label: str
+    file_path: str
+    original_filename: str
+    created_at: datetime
+
+    @property
+    def display(self) -> str:
+        return f"v{self.version_number} - {self.label}" if self.label else f"v{self.version_number}"
+
+    @classmethod
+    def of(cls, version) -> "ExportVersion":
+        song = version.song
+        return cls(
+            version.id, song.title, song.position, version.version_number, version.label,
+            version.file_path, version.original_filename, version.created_at,
+        )
+
+
+# --- Comments ---
+
+def iter_comments(db: Session, version_ids: list[int]) -> Iterator[Comment]:
+    """Comments (replies loaded) of the given versions, version by version in
+    the order given and in timeline order within each, paged."""
+    position = case({vid: i for i, vid in enumerate(version_ids)}, value=Comment.version_id) if version_ids else None
+    query = (
+        db.query(Comment)
+        .options(selectinload(Comment.replies))
+        .filter(Comment.version_id.in_(version_ids))
+        .order_by(position, Comment.timecode, Comment.id)
+    )
+    return query.yield_per(PAGE_SIZE)
+
+
+def comment_rows(comments: Iterable[Comment], versions: dict[int, ExportVersion]) -> Iterator[list]:
+    """COMMENT_FIELDS rows: each comment followed by its replies."""
+    for c in comments:
+        v = versions[c.version_id]
+        yield [
+            v.song_title, v.display, c.id, "", f"{c.timecode:.3f}", format_time(c.timecode),
+            c.author_name, c.text, int(c.solved), c.created_at.isoformat(),
+        ]
+        for r in c.replies:
+            yield [
+                v.song_title, v.display, c.id, r.id, f"{c.timecode:.3f}", format_time(c.timecode),
+                r.author_name, r.text, "", r.created_at.isoformat(),
+            ]
+
+
+def with_header(header: list, rows: Iterable[list]) -> Iterator[list]:
+    yield header
+    yield from rows
+
+
+def csv_chunks(rows: Iterable[list]) -> Iterator[str]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow(row)
+        if buf.tell() >= TEXT_CHUNK_SIZE:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def _comment_json(c: Comment) -> dict:
+    return {
+        "id": c.id,
+        "timecode": c.timecode,
+        "author_name": c.author_name,
+        "text": c.text,
+        "solved": c.solved,
+        "created_at": c.created_at.isoformat(),
+        "replies": [
+            {"id": r.id, "author_name": r.author_name, "text": r.text, "created_at": r.created_at.isoformat()}
+            for r in c.replies
+        ],
+    }
+
+
+def reaper_rows(comments: Iterable[Comment], offset: float = 0.0, region_length: float = 0.0) -> Iterator[list]:
+    """Rows for REAPER's Region/Marker Manager import (REAPER_FIELDS).
+
+    ``offset`` is the project position the mix starts at (the script's
+    calibration offset). With ``region_length`` each comment becomes a region
+    of that many seconds instead of a marker.
+    """
+    for i, c in enumerate(comments, start=1):
+        name = " ".join(f"{c.author_name}: {c.text}".split())
+        start = offset + c.timecode
+        if region_length > 0:
+            yield [f"R{i}", name, format_time(start), format_time(start + region_length), format_time(region_length)]
+        else:
+            yield [f"M{i}", name, format_time(start), "", ""]
+
+
+def jsonl_chunks(comments: Iterable[Comment], versions: dict[int, ExportVersion]) -> Iterator[str]:
+    lines = []
+    size = 0
+    for c in comments:
+        v = versions[c.version_id]
+        doc = {"song": v.song_title, "version_id": v.id, "version": v.display, **_comment_json(c)}
+        lines.append(json.dumps(doc, ensure_ascii=False) + "\n")
+        size += len(lines[-1])
+        if size >= TEXT_CHUNK_SIZE:
+            yield "".join(lines)
+            lines.clear()
+            size = 0
+    if lines:
+        yield "".join(lines)
+
+
+def comment_export(
+    fmt: str, versions: list[ExportVersion], offset: float = 0.0, region_length: float = 0.0,
+) -> Iterator[bytes]:
+    """The comments of ``versions`` as one of COMMENT_FORMATS, read with the generator's own session."""
+    db = SessionLocal()
+    try:
+        by_id = {v.id: v for v in versions}
+        comments = iter_comments(db, list(by_id))
+        if fmt == "jsonl":
+            chunks = jsonl_chunks(comments, by_id)
+        elif fmt == "reaper":
+            chunks = csv_chunks(with_header(REAPER_FIELDS, reaper_rows(comments, offset, region_length)))
+        else:
+            chunks = csv_chunks(with_header(COMMENT_FIELDS, comment_rows(comments, by_id)))
+        yield from _encoded(chunks)
+    finally:
+        db.close()
+
+
+# --- ZIP ---
+
+class _Sink:
+    """Write-only, unseekable file object drained by the generator after each write.
+
+    zipfile detects the missing seek() and writes data descriptors after
+    each member instead of patching its local header afterwards.
+    """
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> Iterator[bytes]:
+        if self._chunks:
+            data = b"".join(self._chunks)
+            self._chunks.clear()
+            yield data
+
+
+class ZipMember(NamedTuple):
+    name: str
+    chunks: Iterable[bytes]
+    compress: bool
+    modified: datetime | None = None
+    size: int | None = None  # lets zipfile pick ZIP64 up front for huge files
+
+
+def stream_zip(members: Iterable[ZipMember]) -> Iterator[bytes]:
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w") as zf:
+        for member in members:
+            modified = member.modified or datetime.now(timezone.utc)
+            info = zipfile.ZipInfo(member.name, date_time=modified.timetuple()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED if member.compress else zipfile.ZIP_STORED
+            info.external_attr = 0o644 << 16
+            if member.size is not None:
+                info.file_size = member.size
+            with zf.open(info, "w") as dest:
+                for chunk in member.chunks:
+                    dest.write(chunk)
+                    yield from sink.drain()
+            yield from sink.drain()
+    yield from sink.drain()
+
+
+def _file_chunks(key: str) -> Iterator[bytes]:
+    with get_storage().open(key) as f:
+        while chunk := f.read(CHUNK_SIZE):
+            yield chunk
+
+
+def _encoded(chunks: Iterable[str]) -> Iterator[bytes]:
+    for chunk in chunks:
+        yield chunk.encode("utf-8")
+
+
+def _audio_name(v: ExportVersion) -> str:
+    folder = f"{v.song_position:02d} - {safe_name(v.song_title)}"
+    return f"{folder}/{safe_name(v.display)} - {safe_name(stored_filename(v.original_filename, v.file_path))}"
+
+
+def _comments_json(project_title: str, versions: list[ExportVersion], files: dict[int, str | None]) -> Iterator[str]:
+    """The JSON document, written one comment at a time."""
+    db = SessionLocal()
+    try:
+        yield '{"project": %s, "exported_at": %s, "versions": [' % (
+            json.dumps(project_title, ensure_ascii=False), json.dumps(datetime.now(timezone.utc).isoformat()),
+        )
+        # One query for all versions; its groups come in the order of ``versions``.
+        groups = groupby(iter_comments(db, [v.id for v in versions]), key=attrgetter("version_id"))
+        group = next(groups, None)
+        for i, v in enumerate(versions):
+            head = {
+                "song": v.song_title, "version_number": v.version_number, "label": v.label,
+                "original_filename": v.original_filename, "file": files.get(v.id),
+            }
+            yield ("," if i else "") + json.dumps(head, ensure_ascii=False)[:-1] + ', "comments": ['
+            if group is not None and group[0] == v.id:
+                for j, c in enumerate(group[1]):
+                    yield ("," if j else "") + json.dumps(_comment_json(c), ensure_ascii=False)
+                group = next(groups, None)
+            yield "]}"
+        yield "]}\n"
+    finally:
+        db.close()
+
+
+def _comments_csv(versions: list[ExportVersion]) -> Iterator[str]:
+    db = SessionLocal()
+    try:
+        by_id = {v.id: v for v in versions}
+        rows = comment_rows(iter_comments(db, list(by_id)), by_id)
+        yield from csv_chunks(with_header(COMMENT_FIELDS, rows))
+    finally:
+        db.close()
+
+
+def project_archive(project_title: str, versions: list[ExportVersion]) -> Iterator[bytes]:
+    """ZIP with each version's audio in a per-song folder plus comments.csv/.json.
+
+    Audio files missing from storage are skipped (``"file": null`` in the JSON).
+    The database is read with the generator's own sessions, since the
+    request's session is closed before the body is streamed.
+    """
+    storage = get_storage()
+    files: dict[int, str | None] = {}
+
+    def members() -> Iterator[ZipMember]:
+        for v in versions:
+            try:
+                size = storage.size(v.file_path)
+            except FileNotFoundError:
+                files[v.id] = None
+                continue
+            files[v.id] = _audio_name(v)
+            yield ZipMember(files[v.id], _file_chunks(v.file_path), compress=False, modified=v.created_at, size=size)
+        yield ZipMember("comments.csv", _encoded(_comments_csv(versions)), compress=True)
+        yield ZipMember("comments.json", _encoded(_comments_json(project_title, versions, files)), compress=True)
+
+    return stream_zip(members())
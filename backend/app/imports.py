@@ -0,0 +1,192 @@
+"""Bulk comment import from CSV or JSON Lines.
+
+CSV columns are matched by name (case-insensitive), so the files this app
+exports, REAPER's Region/Marker Manager export (``#,Name,Start,...``) and
+hand-made spreadsheets all work:
+
+- time: ``timecode``, ``time``, ``start`` or ``position``; seconds or
+  ``[h:]m:ss.mmm``
+- text: ``text``, ``comment``, ``note`` or ``name``
+- author: ``author`` or ``author_name`` (falls back to the form's default)
+- optional ``solved``, and ``comment_id``/``reply_id`` to attach reply rows
+  to an earlier comment row, as in the CSV export
+
+JSON Lines take one CommentImport object per line (the JSONL export's extra
+keys are ignored). Every row is validated before anything is written; any
+error rejects the whole file with the offending line numbers.
+"""
+import csv
+import io
+import json
+import math
+from typing import BinaryIO, Iterator
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+from .models import Comment, Reply
+from .schemas import CommentImport, ReplyCreate
+
+MAX_IMPORT_BYTES = 10 * 1024 * 1024
+MAX_IMPORT_ROWS = 20_000
+MAX_REPORTED_ERRORS = 50
+
+TIME_COLUMNS = ("timecode", "time", "start", "position")
+TEXT_COLUMNS = ("text", "comment", "note", "name")
+AUTHOR_COLUMNS = ("author_name", "author")
+TRUE_VALUES = {"1", "true", "yes", "y", "x"}
+FALSE_VALUES = {"", "0", "false", "no", "n"}
+
+
+class RowError(ValueError):
+    pass
+
+
+def parse_time(value) -> float:
+    """Seconds from a number, ``"12.5"``, ``"1:02.5"`` or ``"1:00:02.500"``."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        seconds = float(value)
+    else:
+        parts = str(value).strip().split(":")
+        if len(parts) > 3 or not all(p.isdigit() for p in parts[:-1]):
+            raise RowError(f"unrecognised time {value!r}")
+        seconds = 0.0
+        try:
+            for part in parts:
+                seconds = seconds * 60 + float(part)
+        except ValueError:
+            raise RowError(f"unrecognised time {value!r} (use seconds or m:ss.mmm)")
+    if not math.isfinite(seconds):
+        raise RowError(f"unrecognised time {value!r}")
+    return seconds
+
+
+def _first(row: dict, names: tuple[str, ...]) -> str | None:
+    for name in names:
+        if name in row:
+            return row[name]
+    return None
+
+
+def _csv_records(text: str) -> Iterator[tuple[int, dict]]:
+    first_line = text.split("\n", 1)[0]
+    try:
+        dialect = csv.Sniffer().sniff(first_line, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(io.StringIO(text, newline=""), dialect)
+    header = [h.strip().lower() for h in next(reader, [])]
+    if not set(header) & set(TIME_COLUMNS) or not set(header) & set(TEXT_COLUMNS):
+        raise HTTPException(
+            status_code=400,
+            detail=f"CSV needs a time column ({', '.join(TIME_COLUMNS)}) and a text column ({', '.join(TEXT_COLUMNS)})",
+        )
+    for row in reader:
+        if any(cell.strip() for cell in row):
+            yield reader.line_num, dict(zip(header, (cell.strip() for cell in row)))
+
+
+def _jsonl_records(text: str) -> Iterator[tuple[int, dict]]:
+    for line_num, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            obj = json.loads(line)
+        except json.JSONDecodeError as exc:
+            yield line_num, RowError(f"invalid JSON ({exc.msg})")
+            continue
+        yield line_num, obj if isinstance(obj, dict) else RowError("expected a JSON object")
+
+
+def _from_csv_row(row: dict, offset: float, default_author: str) -> dict:
+    solved = (row.get("solved") or "").lower()
+    if solved not in TRUE_VALUES | FALSE_VALUES:
+        raise RowError(f"solved: unrecognised value {row['solved']!r}")
+    return {
+        "timecode": parse_time(_first(row, TIME_COLUMNS)) - offset,
+        "author_name": _first(row, AUTHOR_COLUMNS) or default_author,
+        "text": _first(row, TEXT_COLUMNS),
+        "solved": solved in TRUE_VALUES,
+    }
+
+
+def _from_json(obj: dict, offset: float, default_author: str) -> dict:
+    data = dict(obj)
+    if "timecode" not in data:
+        raise RowError("timecode: field required")
+    data["timecode"] = parse_time(data["timecode"]) - offset
+    data["author_name"] = data.get("author_name") or default_author
+    for reply in data.get("replies") or []:
+        if isinstance(reply, dict) and not reply.get("author_name"):
+            reply["author_name"] = default_author
+    return data
+
+
+def _error(line_num: int, exc: Exception) -> dict:
+    if isinstance(exc, ValidationError):
+        msg = "; ".join(f"{'.'.join(map(str, e['loc'])) or 'row'}: {e['msg']}" for e in exc.errors())
+    else:
+        msg = str(exc)
+    return {"loc": ["line", line_num], "msg": f"Line {line_num}: {msg}"}
+
+
+def parse_comments(fileobj: BinaryIO, filename: str | None, offset: float = 0.0, default_author: str = "") -> list[Comment]:
+    """Validate an uploaded file and build (unsaved) Comments with their replies.
+
+    ``offset`` is subtracted from every time, e.g. the REAPER project
+    position the mix starts at. Raises 413 for oversized files, 400 for files
+    that can't be read as a whole and 422 listing every invalid row.
+    """
+    data = fileobj.read(MAX_IMPORT_BYTES + 1)
+    if len(data) > MAX_IMPORT_BYTES:
+        raise HTTPException(status_code=413, detail=f"Import files are limited to {MAX_IMPORT_BYTES // (1024 * 1024)} MB")
+    try:
+        text = data.decode("utf-8-sig")  # Excel prepends a BOM
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Import file must be UTF-8 encoded")
+
+    jsonl = (filename or "").lower().endswith((".jsonl", ".ndjson", ".json")) or text.lstrip().startswith("{")
+    records = _jsonl_records(text) if jsonl else _csv_records(text)
+
+    comments: list[Comment] = []
+    by_source_id: dict[str, Comment] = {}
+    errors: list[dict] = []
+    for line_num, record in records:
+        if len(comments) >= MAX_IMPORT_ROWS:
+            raise HTTPException(status_code=413, detail=f"Imports are limited to {MAX_IMPORT_ROWS} comments")
+        try:
+            if isinstance(record, Exception):
+                raise record
+            if not jsonl and record.get("reply_id"):
+                parent = by_source_id.get(record.get("comment_id", ""))
+                if parent is None:
+                    raise RowError(f"reply to comment {record.get('comment_id')!r}, which is not earlier in the file")
+                reply = ReplyCreate(
+                    author_name=_first(record, AUTHOR_COLUMNS) or default_author,
+                    text=_first(record, TEXT_COLUMNS),
+                )
+                parent.replies.append(Reply(author_name=reply.author_name, text=reply.text))
+                continue
+            fields = _from_json(record, offset, default_author) if jsonl else _from_csv_row(record, offset, default_author)
+            item = CommentImport.model_validate(fields)
+        except (RowError, ValidationError) as exc:
+            errors.append(_error(line_num, exc))
+            if len(errors) >= MAX_REPORTED_ERRORS:
+                break
+            continue
+        comment = Comment(
+            timecode=item.timecode,
+            author_name=item.author_name,
+            text=item.text,
+            solved=item.solved,
+            replies=[Reply(author_name=r.author_name, text=r.text) for r in item.replies],
+        )
+        comments.append(comment)
+        if not jsonl and record.get("comment_id"):
+            by_source_id[record["comment_id"]] = comment
+
+    if errors:
+        raise HTTPException(status_code=422, detail=errors)
+    if not comments:
+        raise HTTPException(status_code=400, detail="No comments found in the file")
+    return comments
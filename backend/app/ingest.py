@@ -0,0 +1,278 @@
+"""Watch-folder ingest: renders dropped into a directory become new versions.
+
+    python -m app.ingest [DIR]      (default: $MIXREVIEW_INGEST_DIR)
+
+The directory is watched recursively (inotify through watchfiles; set
+``MIXREVIEW_INGEST_POLL=1`` where events don't arrive, e.g. network shares).
+A file is only picked up once its size and mtime have stayed the same for
+``MIXREVIEW_INGEST_SETTLE`` seconds, so renders still being written are left
+alone. Files present at startup are checked too.
+
+Each file's path relative to the directory is matched against
+``MIXREVIEW_INGEST_PATTERN`` (named groups ``project``, ``song`` and optionally
+``version``/``label``); by default ``<project title>/<song title>[ v<n>].wav``.
+A sidecar ``<file>.json`` or ``<name>.json`` with any of ``project``, ``song``,
+``label`` and ``version`` overrides what the name says. Projects are looked up
+by id, share link or (unique) title and are never created; missing songs are
+added at the end of the project.
+
+Files go through the same ``_store_version`` as uploads (storage key, version
+numbering, spectrogram) on ``MIXREVIEW_INGEST_WORKERS`` threads; files for the
+same song are stored one at a time here, and the unique version number index
+settles races with uploads through the web app. A file whose sha256 matches a
+version of its song already (a repeat render) is skipped for good. Files that
+fail or can't be placed yet (e.g. their project is created later) are retried
+after ``RETRY_BASE`` seconds, doubling up to ``RETRY_MAX``, or as soon as they
+change.
+"""
+import json
+import logging
+import os
+import re
+import signal
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from sqlalchemy import func
+from watchfiles import watch
+
+from .database import SessionLocal
+from .models import Project, Song, Version
+from .routers.admin import ALLOWED_EXTENSIONS, _file_hash, _store_version
+
+log = logging.getLogger(__name__)
+
+INGEST_DIR = os.environ.get("MIXREVIEW_INGEST_DIR", "")
+WORKERS = int(os.environ.get("MIXREVIEW_INGEST_WORKERS", "2"))
+SETTLE = float(os.environ.get("MIXREVIEW_INGEST_SETTLE", "5"))
+POLL = os.environ.get("MIXREVIEW_INGEST_POLL", "0") == "1"
+RETRY_BASE = 30.0  # seconds before a failed or skipped file is tried again
+RETRY_MAX = 3600.0
+PATTERN = re.compile(os.environ.get(
+    "MIXREVIEW_INGEST_PATTERN",
+    r"(?P<project>[^/]+)/(?P<song>[^/]+?)(?:[ _-]+v(?P<version>\d+))?\.\w+",
+), re.IGNORECASE)
+
+
+class Target(NamedTuple):
+    project: str
+    song: str
+    label: str = ""
+    version_number: int | None = None
+
+
+class Skipped(Exception):
+    """The file can't be placed yet (no project/song in its name, or no such project)."""
+
+
+class Failure(NamedTuple):
+    signature: tuple[int, int]  # (size, mtime) of the file that failed
+    attempts: int
+    retry_at: float  # time.monotonic()
+
+
+def _sidecar(path: str) -> dict:
+    for candidate in (path + ".json", os.path.splitext(path)[0] + ".json"):
+        try:
+            with open(candidate, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            continue
+        if not isinstance(data, dict):
+            raise ValueError(f"{candidate}: expected a JSON object")
+        return data
+    return {}
+
+
+def target_for(path: str, root: str) -> Target | None:
+    """Project, song and version details for a render, from its sidecar and name."""
+    relative = os.path.relpath(path, root).replace(os.sep, "/")
+    match = PATTERN.fullmatch(relative)
+    fields = {k: v for k, v in match.groupdict().items() if v} if match else {}
+    fields.update({k: str(v) for k, v in _sidecar(path).items() if v not in (None, "")})
+    if not fields.get("project") or not fields.get("song"):
+        return None
+    version = fields.get("version")
+    return Target(
+        fields["project"].strip(), fields["song"].strip(), fields.get("label", ""),
+        int(version) if version and version.isdigit() else None,
+    )
+
+
+def _find_project(db, ref: str) -> Project | None:
+    project = db.query(Project).filter((Project.id == ref) | (Project.share_link == ref)).first()
+    if project is not None:
+        return project
+    matches = db.query(Project).filter(func.lower(Project.title) == ref.lower()).limit(2).all()
+    if len(matches) > 1:
+        log.warning("Several projects are called %r; use its id in a sidecar", ref)
+        return None
+    return matches[0] if matches else None
+
+
+def _find_or_add_song(db, project: Project, title: str) -> Song:
+    song = (
+        db.query(Song)
+        .filter(Song.project_id == project.id, func.lower(Song.title) == title.lower())
+        .order_by(Song.position)
+        .first()
+    )
+    if song is None:
+        max_pos = db.query(func.max(Song.position)).filter(Song.project_id == project.id).scalar() or 0
+        song = Song(project_id=project.id, title=title, position=max_pos + 1)
+        db.add(song)
+        db.commit()
+        log.info("Added song %r to %r", title, project.title)
+    return song
+
+
+_song_locks: defaultdict[tuple[str, str], threading.Lock] = defaultdict(threading.Lock)
+
+
+def ingest_file(path: str, root: str) -> Version | None:
+    """Add the render at ``path`` as a new version; None if its song has it already.
+
+    Raises ``Skipped`` if the file can't be placed (yet).
+    """
+    target = target_for(path, root)
+    if target is None:
+        raise Skipped("no project/song in its name or sidecar")
+    db = SessionLocal()
+    try:
+        project = _find_project(db, target.project)
+        if project is None:
+            raise Skipped(f"no project {target.project!r}")
+        with open(path, "rb") as f:
+            digest = _file_hash(f)
+            with _song_locks[(project.id, target.song.lower())]:
+                song = _find_or_add_song(db, project, target.song)
+                duplicate = (
+                    db.query(Version.version_number)
+                    .filter(Version.song_id == song.id, Version.content_hash == digest)
+                    .first()
+                )
+                if duplicate is not None:
+                    log.info("Skipping %s: same audio as %s v%d", path, song.title, duplicate.version_number)
+                    return None
+                number = target.version_number
+                if number and db.query(Version.id).filter(Version.song_id == song.id, Version.version_number == number).first():
+                    log.info("%s: %s already has a v%d, numbering it after the latest", path, song.title, number)
+                    number = None
+                version = _store_version(
+                    song, f, os.path.basename(path), target.label, number, db, content_hash=digest,
+                )
+        log.info("Ingested %s as %s / %s v%d", path, project.title, song.title, version.version_number)
+        return version
+    finally:
+        db.close()
+
+
+class Watcher:
+    """Tracks files until they have settled and hands them to the worker pool."""
+
+    def __init__(self, root: str, workers: int = WORKERS, settle: float = SETTLE):
+        self.root = os.path.abspath(root)
+        self.settle = settle
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+        self.pending: dict[str, tuple[tuple[int, int], float] | None] = {}
+        self.handled: dict[str, tuple[int, int]] = {}  # path -> (size, mtime) it was ingested at
+        self.failed: dict[str, Failure] = {}
+        self.active: set[str] = set()
+
+    @staticmethod
+    def wanted(path: str) -> bool:
+        name = os.path.basename(path)
+        return not name.startswith(".") and os.path.splitext(name)[1].lower() in ALLOWED_EXTENSIONS
+
+    def touch(self, path: str):
+        if self.wanted(path):
+            self.pending.setdefault(path, None)
+
+    def scan(self):
+        for folder, _dirs, files in os.walk(self.root):
+            for name in files:
+                self.touch(os.path.join(folder, name))
+
+    def check(self):
+        """Submit every pending file that hasn't changed for ``settle`` seconds."""
+        now = time.monotonic()
+        for path, failure in list(self.failed.items()):
+            if not os.path.exists(path):
+                del self.failed[path]
+            elif now >= failure.retry_at and path not in self.active:
+                self.pending.setdefault(path, None)
+        for path, seen in list(self.pending.items()):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                del self.pending[path]
+                continue
+            signature = (st.st_size, st.st_mtime_ns)
+            if seen is None or seen[0] != signature:
+                self.pending[path] = (signature, now)
+            elif now - seen[1] >= self.settle and path not in self.active:
+                del self.pending[path]
+                failure = self.failed.get(path)
+                if failure is not None and failure.signature == signature and now < failure.retry_at:
+                    continue  # unchanged since it failed; picked up again when its retry is due
+                if self.handled.get(path) != signature:
+                    self.active.add(path)
+                    self.executor.submit(self._run, path, signature)
+
+    def _run(self, path: str, signature: tuple[int, int]):
+        try:
+            ingest_file(path, self.root)
+        except Skipped as exc:
+            self._retry_later(path, signature, f"Skipping {path} for now: {exc}")
+        except Exception:
+            log.exception("Ingesting %s failed", path)
+            self._retry_later(path, signature)
+        else:
+            self.handled[path] = signature
+            self.failed.pop(path, None)
+        finally:
+            self.active.discard(path)
+
+    def _retry_later(self, path: str, signature: tuple[int, int], message: str | None = None):
+        previous = self.failed.get(path)
+        attempts = previous.attempts + 1 if previous is not None and previous.signature == signature else 1
+        delay = min(RETRY_MAX, RETRY_BASE * 2 ** (attempts - 1))
+        self.failed[path] = Failure(signature, attempts, time.monotonic() + delay)
+        if message:
+            log.warning("%s (retrying in %ds)", message, delay)
+
+    def run(self, stop: threading.Event):
+        self.scan()
+        for changes in watch(
+            self.root, watch_filter=lambda _change, path: self.wanted(path) or os.path.isdir(path),
+            stop_event=stop, rust_timeout=1000, yield_on_timeout=True, force_polling=POLL or None,
+        ):
+            for _change, path in changes:
+                if os.path.isdir(path):
+                    for folder, _dirs, files in os.walk(path):  # a folder moved in
+                        for name in files:
+                            self.touch(os.path.join(folder, name))
+                else:
+                    self.touch(path)
+            self.check()
+        self.executor.shutdown(wait=True)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    root = sys.argv[1] if len(sys.argv) > 1 else INGEST_DIR
+    if not root or not os.path.isdir(root):
+        sys.exit("Usage: python -m app.ingest DIR (or set MIXREVIEW_INGEST_DIR)")
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    log.info("Watching %s", os.path.abspath(root))
+    Watcher(root).run(stop)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Periodic background jobs.
+
+Every worker starts a scheduler thread, but jobs only run in the one that
+holds an exclusive ``flock`` on ``data/jobs/jobs.lock``; the others keep
+trying, so another worker takes over if that one exits. Each job's last run
+is recorded as the mtime of ``data/jobs/<name>.stamp``, so restarts and
+redeploys don't rerun a job before its interval is up.
+
+``request()`` asks for a job to run now, from any worker: it leaves a
+``data/jobs/<name>.request`` file that the runner picks up within
+``REQUEST_POLL`` seconds, so long jobs never run inside a request.
+
+Set ``MIXREVIEW_JOBS=0`` to disable the scheduler (e.g. when jobs run from
+cron via ``python -m app.<module>`` instead).
+"""
+import fcntl
+import logging
+import os
+import threading
+import time
+from typing import Callable, NamedTuple
+
+from . import compaction, maintenance
+
+log = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("MIXREVIEW_JOBS", "1") == "1"
+JOBS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "data", "jobs"))
+POLL_INTERVAL = 60.0  # seconds between attempts to become the runner
+REQUEST_POLL = 5.0  # seconds between the runner's checks for due and requested jobs
+
+
+class Job(NamedTuple):
+    name: str
+    interval: float  # seconds; 0 disables the job
+    run: Callable[[], object]
+
+
+JOBS = [
+    Job("compaction", compaction.INTERVAL, compaction.run),
+    Job("backup", maintenance.BACKUP_INTERVAL, maintenance.backup),
+    Job("optimize", maintenance.OPTIMIZE_INTERVAL, maintenance.optimize),
+    Job("integrity-check", maintenance.INTEGRITY_INTERVAL, maintenance.integrity_check),
+    Job("convert-auto-vacuum", 0, maintenance.convert_auto_vacuum),  # blocks writers: on request only
+]
+
+
+def _stamp(name: str) -> str:
+    return os.path.join(JOBS_DIR, f"{name}.stamp")
+
+
+def last_run(name: str) -> float | None:
+    try:
+        return os.path.getmtime(_stamp(name))
+    except FileNotFoundError:
+        return None
+
+
+def mark_run(name: str):
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    with open(_stamp(name), "w"):
+        pass
+
+
+def _request(name: str) -> str:
+    return os.path.join(JOBS_DIR, f"{name}.request")
+
+
+def request(name: str):
+    """Have the runner start ``name`` soon; it then counts as the scheduled run."""
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    with open(_request(name), "w"):
+        pass
+
+
+def requested() -> list[str]:
+    """Jobs asked for with request() that haven't finished yet."""
+    return [job.name for job in JOBS if os.path.exists(_request(job.name))]
+
+
+def _requested_at(name: str) -> float | None:
+    try:
+        return os.path.getmtime(_request(name))
+    except FileNotFoundError:
+        return None
+
+
+def _due(job: Job, now: float) -> bool:
+    last = last_run(job.name)
+    return job.interval > 0 and (last is None or now - last >= job.interval)
+
+
+def run_pending():
+    for job in JOBS:
+        now = time.time()
+        asked = _requested_at(job.name)
+        if asked is None and not _due(job, now):
+            continue
+        started = time.monotonic()
+        try:
+            job.run()
+        except Exception:
+            log.exception("Job %s failed", job.name)
+        else:
+            log.info("Job %s finished in %.1fs", job.name, time.monotonic() - started)
+        # Stamped even on failure, so a broken job doesn't retry every minute.
+        mark_run(job.name)
+        if asked is not None and _requested_at(job.name) == asked:  # not asked again meanwhile
+            try:
+                os.remove(_request(job.name))
+            except FileNotFoundError:
+                pass
+
+
+def _scheduler(stop: threading.Event):
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    with open(os.path.join(JOBS_DIR, "jobs.lock"), "w") as lock:
+        while not stop.is_set():
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                stop.wait(POLL_INTERVAL)  # another worker is the runner
+                continue
+            try:
+                while not stop.is_set():
+                    run_pending()
+                    stop.wait(REQUEST_POLL)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+_stop = threading.Event()
+
+
+def start():
+    """Start this process's scheduler thread (call from the app's lifespan)."""
+    if not ENABLED:
+        return
+    _stop.clear()
+    threading.Thread(target=_scheduler, args=(_stop,), name="jobs", daemon=True).start()
+
+
+def stop():
+    _stop.set()
@@ -1,16 +1,45 @@
 import os
 
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
+from fastapi import Depends, FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import HTMLResponse, JSONResponse, ORJSONResponse
+from sqlalchemy import text
+from sqlalchemy.orm import Session
 
-from .database import Base, engine
+from .assets import (
+    FRONTEND_DIR,
+    REVALIDATE_CACHE_CONTROL,
+    PrecompressedStaticFiles,
+    file_response,
+    page_path,
+    page_response,
+)
+from . import analytics, jobs
+from .compression import CompressionMiddleware
+from .database import engine, get_db
 from .routers import admin, comments, projects, settings
+from .startup import already_prepared, prepare
+from .storage import get_storage
+
+# Single-process dev mode (plain `uvicorn app.main:app`) still sets up the
+# schema on import; gunicorn does it once in the master before forking.
+if not already_prepared():
+    prepare()
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # Per worker, after the fork; jobs.py makes sure only one of them runs jobs.
+    jobs.start()
+    yield
+    jobs.stop()
+    analytics.buffer.stop()
 
-Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Mix Reaview", version="0.1.0")
+app = FastAPI(title="Mix Reaview", version="0.1.0", default_response_class=ORJSONResponse, lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,32 +47,86 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Audio and the logo are already compressed; static assets ship precompressed.
+app.add_middleware(CompressionMiddleware, minimum_size=1024, exclude_paths=("/api/audio", "/api/logo"))
 
 app.include_router(admin.router)
 app.include_router(projects.router)
 app.include_router(comments.router)
 app.include_router(settings.router)
 
-FRONTEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "frontend"))
-
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
 
+def _check_database() -> bool:
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        return True
+    except Exception:
+        return False
+
+
+@app.get("/ready")
+def ready():
+    """Readiness probe: the DB answers and upload storage is writable."""
+    checks = {"database": _check_database(), "storage": get_storage().check_writable()}
+    if not all(checks.values()):
+        return JSONResponse(status_code=503, content={"status": "unavailable", "checks": checks})
+    return {"status": "ok", "checks": checks}
+
+
 @app.get("/admin")
 @app.get("/admin/{path:path}")
-def admin_page(path: str = ""):
-    return FileResponse(os.path.join(FRONTEND_DIR, "admin", "index.html"))
+def admin_page(request: Request, path: str = ""):
+    return page_response("admin", request.headers)
+
+
+# Embed the bootstrap payload in the share-link page so the first paint needs
+# no extra API round trips (the page then can't be shared-cached).
+INLINE_BOOTSTRAP = os.environ.get("MIXREVIEW_INLINE_BOOTSTRAP", "0") == "1"
+BOOTSTRAP_MARKER = '<script src="/client-static/'
+
+
+@lru_cache(maxsize=4)
+def _read_page(path: str, _mtime: float) -> str:
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def _inline_bootstrap_page(share_link: str, db: Session) -> HTMLResponse | None:
+    payload = projects._bootstrap(share_link, db)
+    if payload is None:
+        return None
+    path = page_path("client")
+    html = _read_page(path, os.path.getmtime(path))
+    # "<" escaped so comment text can never close the script element
+    data = payload.model_dump_json().replace("<", "\\u003c")
+    script = f"<script>window.__MIXREVIEW_BOOTSTRAP__ = {data};</script>\n  "
+    html = html.replace(BOOTSTRAP_MARKER, script + BOOTSTRAP_MARKER, 1)
+    return HTMLResponse(html, headers={"Cache-Control": "private, no-cache"})
+
+
+# Served from the root so its scope covers the share-link pages; browsers
+# revalidate it on every navigation anyway, so it isn't fingerprinted.
+@app.get("/sw.js")
+def service_worker(request: Request):
+    return file_response(os.path.join(FRONTEND_DIR, "client", "sw.js"), request.headers, REVALIDATE_CACHE_CONTROL)
 
 
 # Client share link page (must be after all /api and /admin routes)
 @app.get("/{share_link}")
-def client_page(share_link: str):
-    return FileResponse(os.path.join(FRONTEND_DIR, "client", "index.html"))
+def client_page(request: Request, share_link: str, db: Session = Depends(get_db)):
+    if INLINE_BOOTSTRAP:
+        response = _inline_bootstrap_page(share_link, db)
+        if response is not None:
+            return response
+    return page_response("client", request.headers)
 
 
-# Serve static frontend files (js, css)
-app.mount("/admin-static", StaticFiles(directory=os.path.join(FRONTEND_DIR, "admin")), name="admin-static")
-app.mount("/client-static", StaticFiles(directory=os.path.join(FRONTEND_DIR, "client")), name="client-static")
+# Serve static frontend files (js, css); hashed builds live under */dist/
+app.mount("/admin-static", PrecompressedStaticFiles(directory=os.path.join(FRONTEND_DIR, "admin")), name="admin-static")
+app.mount("/client-static", PrecompressedStaticFiles(directory=os.path.join(FRONTEND_DIR, "client")), name="client-static")
@@ -0,0 +1,181 @@
+"""Online database maintenance: backups, vacuum/ANALYZE and integrity checks.
+
+``backup()`` copies the live database to ``data/backups`` with SQLite's
+backup API, ``MIXREVIEW_BACKUP_STEP_PAGES`` pages per step with a short
+sleep in between. The source connection holds one read transaction for the
+whole copy, so the result is a consistent snapshot and, the database being in
+WAL mode, writers carry on meanwhile (a backup that saw other connections
+write would otherwise restart from the first page). The copy is checked with
+``quick_check`` before it replaces the ``.part`` file, and only the newest
+``MIXREVIEW_BACKUP_KEEP`` (default 7) are kept. Names carry a random suffix
+after the time, so two backups in the same second don't overwrite each other.
+
+``optimize()`` reclaims free pages with ``incremental_vacuum`` and refreshes
+the planner statistics with a bounded ``ANALYZE``; it never blocks writers.
+Databases created before incremental auto-vacuum was enabled keep their free
+pages until an admin runs ``convert_auto_vacuum()``, one full ``VACUUM`` that
+does block writers while it rewrites the file, so it is never scheduled.
+``integrity_check()`` runs ``PRAGMA integrity_check`` and records the result
+in ``data/jobs/integrity.json``.
+
+The job scheduler (app.jobs) runs them every ``MIXREVIEW_BACKUP_INTERVAL_HOURS``
+(24), ``MIXREVIEW_OPTIMIZE_INTERVAL_HOURS`` (24) and
+``MIXREVIEW_INTEGRITY_INTERVAL_HOURS`` (168); 0 turns one off.
+``python -m app.maintenance backup|optimize|integrity-check|convert-auto-vacuum``
+runs one by hand.
+"""
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import uuid
+from contextlib import closing
+from datetime import datetime, timezone
+from typing import NamedTuple
+
+from .database import SessionLocal
+
+log = logging.getLogger(__name__)
+
+BACKUP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "data", "backups"))
+STATE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "data", "jobs"))  # as app.jobs
+BACKUP_INTERVAL = float(os.environ.get("MIXREVIEW_BACKUP_INTERVAL_HOURS", "24")) * 3600
+OPTIMIZE_INTERVAL = float(os.environ.get("MIXREVIEW_OPTIMIZE_INTERVAL_HOURS", "24")) * 3600
+INTEGRITY_INTERVAL = float(os.environ.get("MIXREVIEW_INTEGRITY_INTERVAL_HOURS", "168")) * 3600
+KEEP = int(os.environ.get("MIXREVIEW_BACKUP_KEEP", "7"))
+STEP_PAGES = int(os.environ.get("MIXREVIEW_BACKUP_STEP_PAGES", "256"))
+STEP_SLEEP = 0.01  # seconds between backup steps
+ANALYSIS_LIMIT = 1000  # rows ANALYZE samples per index
+BUSY_TIMEOUT = 30.0
+MAX_ERRORS = 20  # integrity_check messages kept
+
+_backup_lock = threading.Lock()
+
+
+class Backup(NamedTuple):
+    name: str
+    size: int
+    created_at: datetime
+
+
+def database_path() -> str:
+    return SessionLocal.kw["bind"].url.database
+
+
+def _connect() -> sqlite3.Connection:
+    return sqlite3.connect(database_path(), timeout=BUSY_TIMEOUT, isolation_level=None)
+
+
+def backups() -> list[Backup]:
+    """Finished backups, newest first."""
+    try:
+        names = [n for n in os.listdir(BACKUP_DIR) if n.startswith("mixreaview-") and n.endswith(".db")]
+    except FileNotFoundError:
+        return []
+    result = []
+    for name in names:
+        st = os.stat(os.path.join(BACKUP_DIR, name))
+        result.append(Backup(name, st.st_size, datetime.fromtimestamp(st.st_mtime, timezone.utc)))
+    return sorted(result, key=lambda b: b.name, reverse=True)
+
+
+def backup() -> Backup:
+    """Snapshot the database into ``BACKUP_DIR`` and prune old snapshots."""
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    with _backup_lock:
+        name = f"mixreaview-{datetime.now(timezone.utc):%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}.db"
+        final = os.path.join(BACKUP_DIR, name)
+        part = final + ".part"
+        try:
+            with closing(_connect()) as src, closing(sqlite3.connect(part)) as dest:
+                src.execute("BEGIN")
+                src.execute("SELECT 1 FROM sqlite_master LIMIT 1")  # starts the read transaction
+                src.backup(dest, pages=STEP_PAGES, sleep=STEP_SLEEP)
+                src.execute("COMMIT")
+                check = dest.execute("PRAGMA quick_check").fetchone()[0]
+            if check != "ok":
+                raise RuntimeError(f"Backup failed quick_check: {check}")
+            os.replace(part, final)
+        finally:
+            if os.path.exists(part):
+                os.remove(part)
+        for old in backups()[KEEP:]:
+            os.remove(os.path.join(BACKUP_DIR, old.name))
+    result = next(b for b in backups() if b.name == name)
+    log.info("Backed up the database to %s (%.1f MB)", name, result.size / 1e6)
+    return result
+
+
+def needs_conversion(conn) -> bool:
+    """True until the database is in incremental auto-vacuum mode."""
+    return conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2
+
+
+def optimize():
+    """Return free pages to the filesystem and refresh the query planner statistics."""
+    with closing(_connect()) as conn:
+        free = 0
+        if needs_conversion(conn):
+            log.info("Free pages are kept until the database is converted (convert-auto-vacuum)")
+        else:
+            free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if free:
+                conn.execute("PRAGMA incremental_vacuum").fetchall()
+        conn.execute(f"PRAGMA analysis_limit={ANALYSIS_LIMIT}")
+        conn.execute("ANALYZE")
+    log.info("Optimized the database, %d free pages reclaimed", free)
+
+
+def convert_auto_vacuum():
+    """Switch an older database to incremental auto-vacuum: one full VACUUM, writers wait."""
+    with closing(_connect()) as conn:
+        if not needs_conversion(conn):
+            return
+        log.info("Switching the database to incremental auto-vacuum (one full VACUUM)")
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+    log.info("The database now uses incremental auto-vacuum")
+
+
+def _integrity_file() -> str:
+    return os.path.join(STATE_DIR, "integrity.json")
+
+
+def integrity_check() -> dict:
+    with closing(_connect()) as conn:
+        messages = [row[0] for row in conn.execute(f"PRAGMA integrity_check({MAX_ERRORS})")]
+    ok = messages == ["ok"]
+    result = {"checked_at": datetime.now(timezone.utc).isoformat(), "ok": ok, "errors": [] if ok else messages}
+    os.makedirs(STATE_DIR, exist_ok=True)
+    with open(_integrity_file(), "w") as f:
+        json.dump(result, f)
+    if ok:
+        log.info("Database integrity check passed")
+    else:
+        log.error("Database integrity check failed: %s", "; ".join(messages))
+    return result
+
+
+def last_integrity_check() -> dict | None:
+    try:
+        with open(_integrity_file()) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+TASKS = {
+    "backup": backup,
+    "optimize": optimize,
+    "integrity-check": integrity_check,
+    "convert-auto-vacuum": convert_auto_vacuum,
+}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) != 2 or sys.argv[1] not in TASKS:
+        sys.exit(f"Usage: python -m app.maintenance {'|'.join(TASKS)}")
+    TASKS[sys.argv[1]]()
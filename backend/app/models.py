@@ -1,8 +1,9 @@
+import hashlib
 import secrets
 import uuid
 from datetime import datetime, timezone
 
-from sqlalchemy import Boolean, Float, ForeignKey, Integer, String, Text, DateTime
+from sqlalchemy import BigInteger, Boolean, Float, ForeignKey, Index, Integer, String, Text, DateTime, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .database import Base
@@ -56,6 +57,8 @@ class Song(Base):
 
 class Version(Base):
     __tablename__ = "versions"
+    # Numbers are unique per song, so concurrent uploaders (web, ingest) can't both take one
+    __table_args__ = (Index("uq_versions_song_number", "song_id", "version_number", unique=True),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     song_id: Mapped[int] = mapped_column(Integer, ForeignKey("songs.id", ondelete="CASCADE"), index=True)
@@ -64,21 +67,43 @@ class Version(Base):
     file_path: Mapped[str] = mapped_column(String(500), nullable=False)
     original_filename: Mapped[str] = mapped_column(String(255), nullable=False)
     favourite: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    # sha256 of the uploaded file, to recognise repeat uploads of the same render
+    content_hash: Mapped[str | None] = mapped_column(String(64), nullable=True, index=True)
+    # Sample format of the uploaded WAV once it has been compacted to FLAC
+    compacted_from: Mapped[str | None] = mapped_column(String(20), nullable=True)
+    # Its fmt chunk (hex), so the re-wrapped WAV gets the same format tag and channel mask
+    compacted_fmt: Mapped[str | None] = mapped_column(String(128), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=_now)
 
     song: Mapped["Song"] = relationship(back_populates="versions")
     comments: Mapped[list["Comment"]] = relationship(back_populates="version", cascade="all, delete-orphan", order_by="Comment.timecode")
 
+    @property
+    def audio_url(self) -> str:
+        """Stream URL with a tag that changes whenever the stored file does, so
+        browser and service-worker caches can keep it forever."""
+        tag = hashlib.sha1(f"{self.file_path}|{self.created_at:%Y%m%d%H%M%S%f}".encode()).hexdigest()[:10]
+        return f"/api/audio/{self.id}?v={tag}"
+
+    @property
+    def download_url(self) -> str:
+        """Compacted versions download as the WAV that was uploaded."""
+        return f"/api/audio/{self.id}?format=wav" if self.compacted_from else self.audio_url
+
 
 class Comment(Base):
     __tablename__ = "comments"
+    # Serves both per-version lookups and time-window scans/histograms
+    __table_args__ = (Index("ix_comments_version_timecode", "version_id", "timecode"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    version_id: Mapped[int] = mapped_column(Integer, ForeignKey("versions.id", ondelete="CASCADE"), index=True)
+    version_id: Mapped[int] = mapped_column(Integer, ForeignKey("versions.id", ondelete="CASCADE"))
     timecode: Mapped[float] = mapped_column(Float, nullable=False)
     author_name: Mapped[str] = mapped_column(String(100), nullable=False)
     text: Mapped[str] = mapped_column(Text, nullable=False)
     solved: Mapped[bool] = mapped_column(Boolean, default=False)
+    # The comment this one was carried over from (see carry_comments), so it isn't copied twice
+    carried_from_id: Mapped[int | None] = mapped_column(Integer, nullable=True, index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=_now)
 
     version: Mapped["Version"] = relationship(back_populates="comments")
@@ -97,6 +122,24 @@ class Reply(Base):
     comment: Mapped["Comment"] = relationship(back_populates="replies")
 
 
+class ListeningRollup(Base):
+    """Listening per version, share link and browser, summed by app.analytics."""
+    __tablename__ = "listening_rollups"
+    __table_args__ = (UniqueConstraint("version_id", "share_link", "listener"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    version_id: Mapped[int] = mapped_column(Integer, ForeignKey("versions.id", ondelete="CASCADE"), index=True)
+    share_link: Mapped[str] = mapped_column(String(12), nullable=False)
+    listener: Mapped[str] = mapped_column(String(32), nullable=False)
+    seconds: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    seeks: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    completes: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # Bit i set: the listener heard slice i of analytics.SLICES equal slices of the track
+    coverage: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    first_at: Mapped[datetime] = mapped_column(DateTime, default=_now)
+    last_at: Mapped[datetime] = mapped_column(DateTime, default=_now)
+
+
 class AppSettings(Base):
     __tablename__ = "app_settings"
 
@@ -121,4 +164,10 @@ class AppSettings(Base):
     logo_path: Mapped[str | None] = mapped_column(String(500), nullable=True, default=None)
     logo_height: Mapped[int] = mapped_column(Integer, default=32)
     clients_can_resolve: Mapped[bool] = mapped_column(Boolean, default=False)
+    # Share-link write quotas per client and minute (0 = unlimited), see app.ratelimit
+    rate_limit_comments: Mapped[int] = mapped_column(Integer, default=20)
+    rate_limit_replies: Mapped[int] = mapped_column(Integer, default=20)
+    rate_limit_favourites: Mapped[int] = mapped_column(Integer, default=30)
+    rate_limit_resolve: Mapped[int] = mapped_column(Integer, default=60)
+    rate_limit_listening: Mapped[int] = mapped_column(Integer, default=10)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=_now, onupdate=_now)
@@ -0,0 +1,103 @@
+"""Sparse fieldsets (``?fields=``) and the compact row format for read endpoints.
+
+Field names map straight to columns, so a projected request SELECTs only the
+requested columns instead of loading and serializing whole ORM objects.
+Nested collections are addressed with a dotted prefix, e.g.
+``fields=id,timecode,replies.author_name,replies.text``; a bare ``replies``
+selects every reply field.
+
+``format=compact`` returns ``{"fields": [...], "nested": {...}, "rows": [[...]]}``
+where each row lists values in ``fields`` order and nested collections are
+themselves lists of rows in ``nested[name]`` order.
+"""
+from fastapi import HTTPException
+
+from .models import Comment, Reply, Song, Version
+
+COMMENT_COLUMNS = {
+    "id": Comment.id,
+    "version_id": Comment.version_id,
+    "timecode": Comment.timecode,
+    "author_name": Comment.author_name,
+    "text": Comment.text,
+    "solved": Comment.solved,
+    "created_at": Comment.created_at,
+}
+REPLY_COLUMNS = {
+    "id": Reply.id,
+    "comment_id": Reply.comment_id,
+    "author_name": Reply.author_name,
+    "text": Reply.text,
+    "created_at": Reply.created_at,
+}
+SONG_COLUMNS = {
+    "id": Song.id,
+    "title": Song.title,
+    "position": Song.position,
+    "created_at": Song.created_at,
+}
+# Aggregates computed per song with one grouped query, only when requested.
+SONG_COUNTS = ("version_count", "comment_count", "open_count")
+VERSION_COLUMNS = {
+    "id": Version.id,
+    "version_number": Version.version_number,
+    "label": Version.label,
+    "original_filename": Version.original_filename,
+    "favourite": Version.favourite,
+    "created_at": Version.created_at,
+}
+
+FORMATS = ("full", "compact")
+
+
+class FieldSet:
+    def __init__(self, top: list[str], nested: dict[str, list[str]]):
+        self.top = top
+        self.nested = nested
+
+
+def parse_fields(raw: str | None, allowed: list[str], nested_allowed: dict[str, list[str]]) -> FieldSet:
+    """Parse ``?fields=``; no value selects everything, in declaration order."""
+    if raw is None or not raw.strip():
+        return FieldSet(list(allowed) + list(nested_allowed), {k: list(v) for k, v in nested_allowed.items()})
+
+    top: list[str] = []
+    nested: dict[str, list[str]] = {}
+    for name in (part.strip() for part in raw.split(",")):
+        if not name:
+            continue
+        prefix, _, sub = name.partition(".")
+        if prefix in nested_allowed:
+            if sub and sub not in nested_allowed[prefix]:
+                raise HTTPException(status_code=400, detail=f"Unknown field: {name}")
+            if prefix not in top:
+                top.append(prefix)
+            chosen = nested.setdefault(prefix, [])
+            for field in ([sub] if sub else nested_allowed[prefix]):
+                if field not in chosen:
+                    chosen.append(field)
+        elif name in allowed:
+            if name not in top:
+                top.append(name)
+        else:
+            raise HTTPException(status_code=400, detail=f"Unknown field: {name}")
+    return FieldSet(top, nested)
+
+
+def check_format(fmt: str):
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format: {fmt}. Use: {', '.join(FORMATS)}")
+
+
+def shape(rows: list[list], fieldset: FieldSet, fmt: str) -> dict | list[dict]:
+    """Turn value rows (``fieldset.top`` order, nested values already row lists) into a body."""
+    if fmt == "compact":
+        return {"fields": fieldset.top, "nested": fieldset.nested, "rows": rows}
+
+    def as_dict(row):
+        item = dict(zip(fieldset.top, row))
+        for name, sub_fields in fieldset.nested.items():
+            item[name] = [dict(zip(sub_fields, sub)) for sub in item[name]]
+        return item
+
+    return [as_dict(row) for row in rows]
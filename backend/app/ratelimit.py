@@ -0,0 +1,160 @@
+"""Rate limiting and backpressure for the unauthenticated share-link writes.
+
+Each client (``X-Real-IP`` set by nginx, else the socket peer) gets a token
+bucket per share link and route: ``quota`` requests per minute, refilled
+continuously and bursting up to ``quota``. Quotas live in ``AppSettings``
+(0 disables a limit) and are re-read every few seconds.
+
+Buckets are kept in process memory by default, i.e. per gunicorn worker.
+Set ``MIXREVIEW_REDIS_URL`` to share them between workers and hosts.
+
+Independently, each worker admits at most ``MIXREVIEW_MAX_PENDING_WRITES``
+public writes at once and answers 503 beyond that, so a burst from many
+clients queues in nginx instead of piling up on the SQLite writer.
+"""
+import math
+import os
+import threading
+import time
+
+from fastapi import Depends, HTTPException, Request
+from sqlalchemy.orm import Session
+
+from .database import get_db
+from .models import AppSettings
+
+SETTINGS_TTL = 10.0
+MAX_PENDING_WRITES = int(os.environ.get("MIXREVIEW_MAX_PENDING_WRITES", "16"))
+
+# Route scope -> AppSettings column with its per-minute quota.
+QUOTA_COLUMNS = {
+    "comments": "rate_limit_comments",
+    "replies": "rate_limit_replies",
+    "favourites": "rate_limit_favourites",
+    "resolve": "rate_limit_resolve",
+    "listening": "rate_limit_listening",
+}
+
+
+class MemoryBuckets:
+    """Token buckets in a dict; full (idle) buckets are dropped periodically."""
+
+    def __init__(self, prune_every: int = 1000):
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._prune_every = prune_every
+        self._calls = 0
+
+    def take(self, key: str, capacity: int, rate: float) -> float:
+        """Take one token; returns 0 if allowed, else seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, stamp = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - stamp) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                wait = 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (1 - tokens) / rate
+            self._calls += 1
+            if self._calls % self._prune_every == 0:
+                # Quotas are per minute, so a bucket idle that long is full again.
+                self._buckets = {k: v for k, v in self._buckets.items() if now - v[1] < 60}
+        return wait
+
+
+# KEYS[1] bucket; ARGV capacity, rate (tokens/s), now (s). Returns wait in ms.
+_REDIS_TAKE = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'stamp')
+local tokens = tonumber(state[1]) or capacity
+local stamp = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - stamp) * rate)
+local wait = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+else
+  wait = math.ceil((1 - tokens) / rate * 1000)
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'stamp', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return wait
+"""
+
+
+class RedisBuckets:
+    """Same algorithm, evaluated atomically in Redis so all workers share buckets."""
+
+    def __init__(self, url: str):
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+        self._take = self._client.register_script(_REDIS_TAKE)
+
+    def take(self, key: str, capacity: int, rate: float) -> float:
+        wait_ms = self._take(keys=[f"mixreview:rl:{key}"], args=[capacity, rate, time.time()])
+        return int(wait_ms) / 1000
+
+
+def _make_buckets():
+    url = os.environ.get("MIXREVIEW_REDIS_URL")
+    return RedisBuckets(url) if url else MemoryBuckets()
+
+
+buckets = _make_buckets()
+_write_slots = threading.BoundedSemaphore(MAX_PENDING_WRITES)
+_quota_cache: tuple[float, dict[str, int]] = (0.0, {})
+
+
+def _quotas(db: Session) -> dict[str, int]:
+    global _quota_cache
+    expires, quotas = _quota_cache
+    if time.monotonic() < expires:
+        return quotas
+    settings = db.query(AppSettings).filter(AppSettings.id == 1).first()
+    quotas = {}
+    for scope, column in QUOTA_COLUMNS.items():
+        value = getattr(settings, column, None)
+        if value is None:  # settings row not created yet
+            value = AppSettings.__table__.c[column].default.arg
+        quotas[scope] = value
+    _quota_cache = (time.monotonic() + SETTINGS_TTL, quotas)
+    return quotas
+
+
+def invalidate_quotas():
+    """Pick up changed quotas immediately in this worker (others within SETTINGS_TTL)."""
+    global _quota_cache
+    _quota_cache = (0.0, {})
+
+
+def client_ip(request: Request) -> str:
+    return request.headers.get("x-real-ip") or (request.client.host if request.client else "unknown")
+
+
+def rate_limited(scope: str):
+    """Dependency for a share-link write route, limited by the quota for ``scope``."""
+    if scope not in QUOTA_COLUMNS:
+        raise ValueError(f"Unknown rate limit scope: {scope}")
+
+    def dependency(share_link: str, request: Request, db: Session = Depends(get_db)):
+        quota = _quotas(db)[scope]
+        if quota > 0:
+            wait = buckets.take(f"{scope}:{share_link}:{client_ip(request)}", quota, quota / 60)
+            if wait > 0:
+                raise HTTPException(
+                    status_code=429,
+                    detail="Too many requests, slow down",
+                    headers={"Retry-After": str(max(1, math.ceil(wait)))},
+                )
+        if not _write_slots.acquire(blocking=False):
+            raise HTTPException(status_code=503, detail="Server busy, try again", headers={"Retry-After": "1"})
+        try:
+            yield
+        finally:
+            _write_slots.release()
+
+    return dependency
@@ -0,0 +1,21 @@
+from functools import lru_cache
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+
+@lru_cache(maxsize=None)
+def _adapter(schema) -> TypeAdapter:
+    return TypeAdapter(schema)
+
+
+def model_json_response(schema, data, status_code: int = 200) -> Response:
+    """Validate ``data`` (ORM objects or dicts) as ``schema`` and dump it straight to JSON bytes.
+
+    Returning a Response bypasses FastAPI's response_model round trip
+    (validate -> dump to Python -> json.dumps); pydantic-core writes the bytes
+    in one pass. Keep ``response_model`` on the route for the OpenAPI docs.
+    """
+    adapter = _adapter(schema)
+    body = adapter.dump_json(adapter.validate_python(data, from_attributes=True))
+    return Response(content=body, status_code=status_code, media_type="application/json")
@@ -1,22 +1,45 @@
+import hashlib
 import os
-import shutil
+import re
 import uuid
-
-from fastapi import APIRouter, Depends, Form, HTTPException, UploadFile, File, status
-from sqlalchemy import func
-from sqlalchemy.orm import Session, joinedload
-
+from datetime import datetime, timezone
+from itertools import groupby
+from operator import attrgetter
+from typing import Literal
+from urllib.parse import quote
+
+from fastapi import APIRouter, Depends, Form, HTTPException, Query, UploadFile, File, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+from .. import alignment, analytics, jobs, maintenance, spectrogram
 from ..auth import (
+    admin_or_download_token,
     create_access_token,
+    create_download_token,
     get_current_admin,
     hash_password,
     verify_password,
 )
 from ..database import get_db
-from ..models import AdminUser, Comment, Project, Song, Version
+from ..exports import ExportVersion, project_archive, safe_name
+from ..imports import parse_comments
+from ..models import AdminUser, Comment, ListeningRollup, Project, Reply, Song, Version
 from ..schemas import (
+    BackupOut,
+    CarriedCommentOut,
+    CarryCommentsRequest,
+    CarryCommentsResult,
+    CommentImportResult,
     CommentOut,
     CommentUpdate,
+    DatabaseStatusOut,
+    DirectUploadComplete,
+    DirectUploadOut,
+    DirectUploadRequest,
+    ListeningOut,
     LoginRequest,
     ProjectCreate,
     ProjectDetail,
@@ -25,13 +48,14 @@ from ..schemas import (
     SetupRequest,
     SongCreate,
     SongOut,
+    TimeSegmentOut,
     TokenResponse,
     VersionOut,
 )
+from ..storage import get_storage, media_type
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
-UPLOAD_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "..", "data", "uploads")
 ALLOWED_EXTENSIONS = {".wav", ".mp3", ".flac"}
 
 
@@ -69,22 +93,21 @@ def list_projects(
     db: Session = Depends(get_db),
 ):
     projects = db.query(Project).order_by(Project.updated_at.desc()).all()
-    result = []
-    for p in projects:
-        song_count = db.query(func.count(Song.id)).filter(Song.project_id == p.id).scalar()
-        comment_count = (
-            db.query(func.count(Comment.id))
-            .join(Version)
-            .join(Song)
-            .filter(Song.project_id == p.id)
-            .scalar()
-        )
-        result.append(ProjectSummary(
+    song_counts = dict(db.query(Song.project_id, func.count(Song.id)).group_by(Song.project_id))
+    comment_counts = dict(
+        db.query(Song.project_id, func.count(Comment.id))
+        .join(Version, Version.song_id == Song.id)
+        .join(Comment, Comment.version_id == Version.id)
+        .group_by(Song.project_id)
+    )
+    return [
+        ProjectSummary(
             id=p.id, title=p.title, share_link=p.share_link,
-            song_count=song_count, comment_count=comment_count,
+            song_count=song_counts.get(p.id, 0), comment_count=comment_counts.get(p.id, 0),
             created_at=p.created_at, updated_at=p.updated_at,
-        ))
-    return result
+        )
+        for p in projects
+    ]
 
 
 @router.post("/projects", response_model=ProjectDetail, status_code=status.HTTP_201_CREATED)
@@ -135,8 +158,33 @@ def update_project(
         raise HTTPException(status_code=404, detail="Project not found")
     project.title = req.title
     db.commit()
-    db.refresh(project)
-    return project
+    # Reload with the tree in two queries; refresh + lazy loads would query per song
+    return db.query(Project).options(
+        selectinload(Project.songs).selectinload(Song.versions)
+    ).filter(Project.id == project_id).populate_existing().one()
+
+
+def _delete_versions(db: Session, *criteria) -> list[tuple[int, str]]:
+    """Delete the matching versions with their comments, replies and listening
+    stats, in a fixed number of statements (the ORM cascade would load every
+    comment and each comment's replies first). Returns (id, file_path) of the
+    deleted versions."""
+    files = [(vid, key) for vid, key in db.query(Version.id, Version.file_path).filter(*criteria)]
+    version_ids = select(Version.id).where(*criteria)
+    comment_ids = select(Comment.id).where(Comment.version_id.in_(version_ids))
+    db.query(Reply).filter(Reply.comment_id.in_(comment_ids)).delete(synchronize_session=False)
+    db.query(Comment).filter(Comment.version_id.in_(version_ids)).delete(synchronize_session=False)
+    db.query(ListeningRollup).filter(ListeningRollup.version_id.in_(version_ids)).delete(synchronize_session=False)
+    db.query(Version).filter(*criteria).delete(synchronize_session=False)
+    return files
+
+
+def _delete_files(files: list[tuple[int, str]]):
+    """Remove audio and spectrograms once the rows are gone."""
+    storage = get_storage()
+    for version_id, key in files:
+        storage.delete(key)
+        spectrogram.delete(version_id)
 
 
 @router.delete("/projects/{project_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -145,11 +193,163 @@ def delete_project(
     _admin: AdminUser = Depends(get_current_admin),
     db: Session = Depends(get_db),
 ):
-    project = db.query(Project).filter(Project.id == project_id).first()
-    if project is None:
+    if db.query(Project.id).filter(Project.id == project_id).first() is None:
         raise HTTPException(status_code=404, detail="Project not found")
-    db.delete(project)
+    song_ids = select(Song.id).where(Song.project_id == project_id)
+    files = _delete_versions(db, Version.song_id.in_(song_ids))
+    db.query(Song).filter(Song.project_id == project_id).delete(synchronize_session=False)
+    db.query(Project).filter(Project.id == project_id).delete(synchronize_session=False)
     db.commit()
+    _delete_files(files)
+
+
+# --- Export ---
+
+@router.post("/projects/{project_id}/export-token")
+def create_export_token(
+    project_id: str,
+    admin: AdminUser = Depends(get_current_admin),
+    db: Session = Depends(get_db),
+):
+    """A short-lived ``?token=`` so the browser can download the export via a plain link."""
+    if db.query(Project.id).filter(Project.id == project_id).first() is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    token = create_download_token(admin.username, f"export:{project_id}")
+    return {"token": token, "url": f"/admin/projects/{project_id}/export?token={token}"}
+
+
+@router.get("/projects/{project_id}/export")
+def export_project(
+    project_id: str,
+    version_ids: str | None = Query(None, description="Comma-separated; default: each song's favourite or latest"),
+    _admin: AdminUser = Depends(admin_or_download_token("export:{project_id}")),
+    db: Session = Depends(get_db),
+):
+    """Stream a ZIP of the selected versions' audio plus all their comments (CSV and JSON)."""
+    project = db.query(Project).options(
+        joinedload(Project.songs).joinedload(Song.versions)
+    ).filter(Project.id == project_id).first()
+    if project is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    if version_ids:
+        try:
+            wanted = {int(v) for v in version_ids.split(",") if v.strip()}
+        except ValueError:
+            raise HTTPException(status_code=400, detail="version_ids must be comma-separated integers")
+        selected = [v for s in project.songs for v in s.versions if v.id in wanted]
+        if len(selected) != len(wanted):
+            raise HTTPException(status_code=400, detail="Some versions are not part of this project")
+    else:
+        selected = [
+            next((v for v in s.versions if v.favourite), s.versions[-1])
+            for s in project.songs if s.versions
+        ]
+
+    versions = [ExportVersion.of(v) for v in selected]
+    filename = f"{safe_name(project.title)}.zip"
+    return StreamingResponse(
+        project_archive(project.title, versions),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}"},
+    )
+
+
+# --- Listening ---
+
+@router.get("/projects/{project_id}/listening", response_model=list[ListeningOut])
+def get_listening(
+    project_id: str,
+    _admin: AdminUser = Depends(get_current_admin),
+    db: Session = Depends(get_db),
+):
+    """Per version: listeners, time played and which parts were heard (see app.analytics)."""
+    if db.query(Project.id).filter(Project.id == project_id).first() is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    analytics.buffer.flush()  # include what this worker still holds
+    rows = (
+        db.query(ListeningRollup)
+        .join(Version, Version.id == ListeningRollup.version_id)
+        .join(Song, Song.id == Version.song_id)
+        .filter(Song.project_id == project_id)
+        .order_by(ListeningRollup.version_id)
+    )
+    result = []
+    for version_id, group in groupby(rows, key=attrgetter("version_id")):
+        group = list(group)
+        result.append(ListeningOut(
+            version_id=version_id,
+            listeners=len(group),
+            seconds=round(sum(r.seconds for r in group), 1),
+            completes=sum(r.completes for r in group),
+            seeks=sum(r.seeks for r in group),
+            heard=max(r.coverage.bit_count() for r in group) / analytics.SLICES,
+            coverage=[sum(r.coverage >> i & 1 for r in group) for i in range(analytics.SLICES)],
+            last_at=max(r.last_at for r in group),
+        ))
+    return result
+
+
+# --- Maintenance ---
+
+AUTO_VACUUM_MODES = {0: "none", 1: "full", 2: "incremental"}
+
+
+def _file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+
+def _database_status(db: Session) -> DatabaseStatusOut:
+    page_count, free_pages, page_size, auto_vacuum = db.execute(text(
+        "SELECT * FROM pragma_page_count(), pragma_freelist_count(), pragma_page_size(), pragma_auto_vacuum()"
+    )).one()
+    path = maintenance.database_path()
+    backups = maintenance.backups()
+    last_optimize = jobs.last_run("optimize")
+    return DatabaseStatusOut(
+        size=_file_size(path),
+        wal_size=_file_size(path + "-wal"),
+        page_size=page_size,
+        page_count=page_count,
+        free_pages=free_pages,
+        fragmentation=round(free_pages / page_count, 4) if page_count else 0.0,
+        auto_vacuum=AUTO_VACUUM_MODES.get(auto_vacuum, str(auto_vacuum)),
+        last_backup=backups[0].created_at if backups else None,
+        backups=[BackupOut(**b._asdict()) for b in backups],
+        last_optimize=datetime.fromtimestamp(last_optimize, timezone.utc) if last_optimize else None,
+        integrity=maintenance.last_integrity_check(),
+        needs_conversion=auto_vacuum != 2,
+        pending=jobs.requested(),
+    )
+
+
+@router.get("/maintenance", response_model=DatabaseStatusOut)
+def get_maintenance_status(
+    _admin: AdminUser = Depends(get_current_admin),
+    db: Session = Depends(get_db),
+):
+    """Database size, fragmentation, backups, the last optimize/integrity runs and queued jobs."""
+    return _database_status(db)
+
+
+@router.post("/maintenance/{task}", response_model=DatabaseStatusOut, status_code=status.HTTP_202_ACCEPTED)
+def run_maintenance(
+    task: Literal["backup", "optimize", "integrity-check", "convert-auto-vacuum"],
+    _admin: AdminUser = Depends(get_current_admin),
+    db: Session = Depends(get_db),
+):
+    """Queue a maintenance job for the background job runner (it then counts as
+    the scheduled run); poll GET /maintenance until it has left ``pending``."""
+    if not jobs.ENABLED:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Background jobs are off (MIXREVIEW_JOBS=0); run python -m app.maintenance {task}",
+        )
+    jobs.request(task)
+    return _database_status(db)
 
 
 # --- Songs ---
@@ -174,6 +374,89 @@ def create_song(
 
 # --- Versions (upload) ---
 
+def _audio_extension(filename: str | None) -> str:
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext not in ALLOWED_EXTENSIONS:
+        raise HTTPException(status_code=400, detail=f"File type not allowed. Use: {', '.join(ALLOWED_EXTENSIONS)}")
+    return ext
+
+
+def _next_version_number(song_id: int, requested: int | None, db: Session) -> int:
+    if requested and requested > 0:
+        return requested
+    max_ver = db.query(func.max(Version.version_number)).filter(Version.song_id == song_id).scalar() or 0
+    return max_ver + 1
+
+
+NUMBERING_ATTEMPTS = 5
+
+
+def _insert_version(
+    song: Song, key: str, filename: str, label: str, requested: int | None, db: Session,
+    content_hash: str | None = None, number: int | None = None,
+) -> Version:
+    """Add the stored file ``key`` to ``song`` as version ``requested`` or the next number
+    (``number``, if the caller already looked it up).
+
+    The unique index on (song, number) settles races with other workers and the
+    ingest service: if the next number was taken meanwhile, the one after is tried.
+    """
+    for attempt in range(NUMBERING_ATTEMPTS):
+        if number is None:
+            number = _next_version_number(song.id, requested, db)
+        version = Version(
+            song_id=song.id,
+            version_number=number,
+            label=label.strip() or f"Version {number}",
+            file_path=key,
+            original_filename=filename,
+            content_hash=content_hash,
+        )
+        db.add(version)
+        try:
+            db.commit()
+            break
+        except IntegrityError:
+            db.rollback()
+            if (requested and requested > 0) or attempt == NUMBERING_ATTEMPTS - 1:
+                raise HTTPException(status_code=409, detail=f"Version {number} already exists")
+            number = None
+    db.refresh(version)
+    spectrogram.schedule(version.id, key)
+    return version
+
+
+def _file_hash(fileobj) -> str:
+    """sha256 of a seekable file, leaving it at the start."""
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    while chunk := fileobj.read(1024 * 1024):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def _store_version(
+    song: Song, fileobj, filename: str | None, label: str, version_number: int | None, db: Session,
+    content_hash: str | None = None,
+) -> Version:
+    """Save an audio file to storage and add it to ``song`` as a new version."""
+    ext = _audio_extension(filename)
+    content_hash = content_hash or _file_hash(fileobj)
+    number = _next_version_number(song.id, version_number, db)
+    # Suffixed: another process may pick the same number before the insert settles it
+    key = f"{song.project_id}/{song.id}/v{number}-{uuid.uuid4().hex[:8]}{ext}"
+    storage = get_storage()
+    storage.save(key, fileobj, media_type(key))
+    try:
+        return _insert_version(
+            song, key, filename or f"v{number}{ext}", label, version_number, db, content_hash, number,
+        )
+    except HTTPException:
+        storage.delete(key)
+        raise
+
+
 @router.post("/songs/{song_id}/versions", response_model=VersionOut, status_code=status.HTTP_201_CREATED)
 def upload_version(
     song_id: int,
@@ -186,33 +469,55 @@ def upload_version(
     song = db.query(Song).filter(Song.id == song_id).first()
     if song is None:
         raise HTTPException(status_code=404, detail="Song not found")
+    return _store_version(song, file.file, file.filename, label, version_number, db)
 
-    ext = os.path.splitext(file.filename or "")[1].lower()
-    if ext not in ALLOWED_EXTENSIONS:
-        raise HTTPException(status_code=400, detail=f"File type not allowed. Use: {', '.join(ALLOWED_EXTENSIONS)}")
 
-    max_ver = db.query(func.max(Version.version_number)).filter(Version.song_id == song_id).scalar() or 0
-    next_ver = version_number if version_number and version_number > 0 else max_ver + 1
-
-    dest_dir = os.path.join(UPLOAD_DIR, str(song.project_id), str(song_id))
-    os.makedirs(dest_dir, exist_ok=True)
-    filename = f"v{next_ver}{ext}"
-    dest_path = os.path.join(dest_dir, filename)
-
-    with open(dest_path, "wb") as f:
-        shutil.copyfileobj(file.file, f)
-
-    version = Version(
-        song_id=song_id,
-        version_number=next_ver,
-        label=label.strip() or f"Version {next_ver}",
-        file_path=dest_path,
-        original_filename=file.filename or filename,
+@router.post("/songs/{song_id}/versions/upload-url", response_model=DirectUploadOut)
+def create_upload_url(
+    song_id: int,
+    req: DirectUploadRequest,
+    _admin: AdminUser = Depends(get_current_admin),
+    db: Session = Depends(get_db),
+):
+    """Presigned PUT so the browser uploads straight to the bucket."""
+    storage = get_storage()
+    if not storage.supports_presigned:
+        raise HTTPException(status_code=409, detail="Direct uploads need object storage; use the regular upload")
+    song = db.query(Song).filter(Song.id == song_id).first()
+    if song is None:
+        raise HTTPException(status_code=404, detail="Song not found")
+
+    ext = _audio_extension(req.filename)
+    # Random name: the version number is only assigned on completion.
+    key = f"{song.project_id}/{song_id}/{uuid.uuid4().hex}{ext}"
+    content_type = media_type(key)
+    return DirectUploadOut(
+        upload_url=storage.presigned_put(key, content_type),
+        key=key,
+        headers={"Content-Type": content_type},
     )
-    db.add(version)
-    db.commit()
-    db.refresh(version)
-    return version
+
+
+@router.post("/songs/{song_id}/versions/complete", response_model=VersionOut, status_code=status.HTTP_201_CREATED)
+def complete_upload(
+    song_id: int,
+    req: DirectUploadComplete,
+    _admin: AdminUser = Depends(get_current_admin),
+    db: Session = Depends(get_db),
+):
+    song = db.query(Song).filter(Song.id == song_id).first()
+    if song is None:
+        raise HTTPException(status_code=404, detail="Song not found")
+
+    pattern = rf"{re.escape(song.project_id)}/{song_id}/[0-9a-f]{{32}}\.[a-z0-9]+"
+    if not re.fullmatch(pattern, req.key) or os.path.splitext(req.key)[1] not in ALLOWED_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="Invalid upload key")
+    if db.query(Version.id).filter(Version.file_path == req.key).first() is not None:
+        raise HTTPException(status_code=409, detail="Upload already completed")
+    if not get_storage().exists(req.key):
+        raise HTTPException(status_code=400, detail="Uploaded file not found")
+
+    return _insert_version(song, req.key, req.filename, req.label, req.version_number, db)
 
 
 @router.put("/songs/{song_id}")
@@ -271,15 +576,12 @@ def delete_song(
     _admin: AdminUser = Depends(get_current_admin),
     db: Session = Depends(get_db),
 ):
-    song = db.query(Song).filter(Song.id == song_id).first()
-    if song is None:
+    if db.query(Song.id).filter(Song.id == song_id).first() is None:
         raise HTTPException(status_code=404, detail="Song not found")
-    # Delete audio files
-    for v in song.versions:
-        if os.path.isfile(v.file_path):
-            os.remove(v.file_path)
-    db.delete(song)
+    files = _delete_versions(db, Version.song_id == song_id)
+    db.query(Song).filter(Song.id == song_id).delete(synchronize_session=False)
     db.commit()
+    _delete_files(files)
 
 
 @router.delete("/versions/{version_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -288,16 +590,120 @@ def delete_version(
     _admin: AdminUser = Depends(get_current_admin),
     db: Session = Depends(get_db),
 ):
+    files = _delete_versions(db, Version.id == version_id)
+    if not files:
+        raise HTTPException(status_code=404, detail="Version not found")
+    db.commit()
+    _delete_files(files)
+
+
+# --- Comments (admin) ---
+
+@router.post(
+    "/versions/{version_id}/comments/import",
+    response_model=CommentImportResult,
+    status_code=status.HTTP_201_CREATED,
+)
+def import_comments(
+    version_id: int,
+    file: UploadFile = File(...),
+    offset: float = Form(0.0),
+    author_name: str = Form(""),
+    _admin: AdminUser = Depends(get_current_admin),
+    db: Session = Depends(get_db),
+):
+    """Add comments from a CSV/JSON Lines file (see app.imports), all or nothing, in one transaction."""
     version = db.query(Version).filter(Version.id == version_id).first()
     if version is None:
         raise HTTPException(status_code=404, detail="Version not found")
-    if os.path.isfile(version.file_path):
-        os.remove(version.file_path)
-    db.delete(version)
+    comments = parse_comments(file.file, file.filename, offset, author_name.strip())
+    for comment in comments:
+        comment.version_id = version.id
+    result = CommentImportResult(comments=len(comments), replies=sum(len(c.replies) for c in comments))
+    db.add_all(comments)
     db.commit()
+    return result
 
 
-# --- Comments (admin) ---
+@router.post("/versions/{version_id}/carry-comments", response_model=CarryCommentsResult)
+def carry_comments(
+    version_id: int,
+    req: CarryCommentsRequest,
+    _admin: AdminUser = Depends(get_current_admin),
+    db: Session = Depends(get_db),
+):
+    """Copy unresolved comments (with replies) of an earlier version of the song
+    onto this one, at timecodes mapped through an alignment of the two mixes
+    (see app.alignment). Each comes with the confidence of its mapping; comments
+    carried here before are reported but not copied again."""
+    target = db.query(Version).filter(Version.id == version_id).first()
+    if target is None:
+        raise HTTPException(status_code=404, detail="Version not found")
+    sources = db.query(Version).filter(Version.song_id == target.song_id, Version.id != target.id)
+    if req.from_version_id is None:
+        source = (
+            sources.filter(Version.version_number < target.version_number)
+            .order_by(Version.version_number.desc())
+            .first()
+        )
+        if source is None:
+            raise HTTPException(status_code=400, detail="No earlier version to carry comments from")
+    else:
+        source = sources.filter(Version.id == req.from_version_id).first()
+        if source is None:
+            raise HTTPException(status_code=404, detail="Version not found in this song")
+
+    query = (
+        db.query(Comment)
+        .options(selectinload(Comment.replies))
+        .filter(Comment.version_id == source.id, Comment.solved == False)
+    )
+    if req.comment_ids is not None:
+        query = query.filter(Comment.id.in_(req.comment_ids))
+    comments = query.order_by(Comment.timecode).all()
+    if req.comment_ids is not None and len(comments) != len(set(req.comment_ids)):
+        raise HTTPException(status_code=400, detail="Only unresolved comments of the source version can be carried")
+
+    storage = get_storage()
+    try:
+        with storage.local_copy(source.file_path) as old_path, storage.local_copy(target.file_path) as new_path:
+            time_map = alignment.align(old_path, new_path)
+    except RuntimeError as exc:  # libsndfile can't read one of them
+        raise HTTPException(status_code=422, detail=f"Could not align the audio: {getattr(exc, 'error_string', exc)}")
+
+    existing = dict(
+        db.query(Comment.carried_from_id, Comment.id)
+        .filter(Comment.version_id == target.id, Comment.carried_from_id.in_([c.id for c in comments]))
+        .all()
+    )
+    carried = []
+    for c in comments:
+        timecode, confidence = time_map.map(c.timecode)
+        copy = None
+        if c.id not in existing and not req.dry_run and confidence >= req.min_confidence:
+            copy = Comment(
+                version_id=target.id, timecode=timecode, author_name=c.author_name, text=c.text,
+                created_at=c.created_at, carried_from_id=c.id,
+                replies=[Reply(author_name=r.author_name, text=r.text, created_at=r.created_at) for r in c.replies],
+            )
+            db.add(copy)
+        carried.append((c, timecode, confidence, copy))
+    db.flush()
+    result = CarryCommentsResult(
+        from_version_id=source.id,
+        segments=[TimeSegmentOut(**seg._asdict()) for seg in time_map.segments()],
+        comments=[
+            CarriedCommentOut(
+                comment_id=c.id, timecode=c.timecode, new_timecode=timecode, confidence=confidence,
+                new_comment_id=copy.id if copy is not None else existing.get(c.id),
+                already_carried=c.id in existing,
+            )
+            for c, timecode, confidence, copy in carried
+        ],
+    )
+    db.commit()
+    return result
+
 
 @router.put("/comments/{comment_id}", response_model=CommentOut)
 def update_comment(
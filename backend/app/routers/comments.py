@@ -1,9 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from urllib.parse import quote
 
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy import Integer, case, cast, func
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+from .. import writequeue
 from ..auth import get_current_admin
 from ..database import get_db
+from ..exports import COMMENT_FORMATS, ExportVersion, comment_export, safe_name
 from ..models import AppSettings, Comment, Project, Reply, Song, Version
+from ..projection import COMMENT_COLUMNS, REPLY_COLUMNS, check_format, parse_fields, shape
+from ..ratelimit import rate_limited
+from ..responses import model_json_response
 from ..schemas import CommentCreate, CommentOut, ReplyCreate, ReplyOut
 
 router = APIRouter(tags=["comments"])
@@ -29,13 +38,47 @@ def _get_comment_in_project(comment_id: int, project: Project, db: Session) -> C
     return comment
 
 
+def _projected_comments(query, fields: str | None, fmt: str, db: Session) -> ORJSONResponse:
+    """SELECT only the requested comment/reply columns and shape them without ORM objects."""
+    check_format(fmt)
+    fieldset = parse_fields(fields, list(COMMENT_COLUMNS), {"replies": list(REPLY_COLUMNS)})
+    columns = [COMMENT_COLUMNS[f] for f in fieldset.top if f != "replies"]
+    # Comment.id always comes first so replies can be attached, even if not requested
+    rows = query.with_entities(Comment.id, *columns).order_by(Comment.timecode).all()
+
+    replies: dict[int, list] = {}
+    reply_fields = fieldset.nested.get("replies")
+    if reply_fields is not None:
+        reply_rows = (
+            db.query(Reply.comment_id, *[REPLY_COLUMNS[f] for f in reply_fields])
+            .filter(Reply.comment_id.in_(query.with_entities(Comment.id).statement))
+            .order_by(Reply.created_at)
+        )
+        for comment_id, *values in reply_rows:
+            replies.setdefault(comment_id, []).append(values)
+
+    out = []
+    for comment_id, *values in rows:
+        it = iter(values)
+        out.append([replies.get(comment_id, []) if f == "replies" else next(it) for f in fieldset.top])
+    return ORJSONResponse(shape(out, fieldset, fmt))
+
+
 @router.get("/api/projects/{share_link}/comments", response_model=list[CommentOut])
 def get_comments(
     share_link: str,
     version_id: int | None = None,
     song_id: int | None = None,
+    time_from: float | None = Query(None, alias="from", ge=0),
+    time_to: float | None = Query(None, alias="to", ge=0),
+    fields: str | None = None,
+    fmt: str = Query("full", alias="format"),
     db: Session = Depends(get_db),
 ):
+    """Comments with replies. ``fields``/``format=compact`` select a subset (see app.projection).
+
+    ``from``/``to`` (seconds) restrict them to the window ``from <= timecode < to``.
+    """
     _validate_share_link(share_link, db)
     query = (
         db.query(Comment)
@@ -48,10 +91,123 @@ def get_comments(
         query = query.filter(Comment.version_id == version_id)
     if song_id is not None:
         query = query.filter(Song.id == song_id)
-    return query.order_by(Comment.timecode).all()
+    if time_from is not None:
+        query = query.filter(Comment.timecode >= time_from)
+    if time_to is not None:
+        query = query.filter(Comment.timecode < time_to)
+    if fields is not None or fmt != "full":
+        return _projected_comments(query, fields, fmt, db)
+    comments = query.options(selectinload(Comment.replies)).order_by(Comment.timecode).all()
+    return model_json_response(list[CommentOut], comments)
+
 
+@router.get("/api/projects/{share_link}/comments/export")
+def export_comments(
+    share_link: str,
+    version_id: int | None = None,
+    song_id: int | None = None,
+    fmt: str = Query("csv", alias="format"),
+    offset: float = Query(0.0, ge=0, description="REAPER project position the mix starts at"),
+    region_length: float = Query(0.0, ge=0, description="Export regions of this length instead of markers"),
+    db: Session = Depends(get_db),
+):
+    """Stream a version's or song's comments as CSV, JSON Lines or a REAPER marker/region list.
 
-@router.post("/api/projects/{share_link}/comments", response_model=CommentOut, status_code=201)
+    ``format=reaper`` is the CSV REAPER's Region/Marker Manager imports; it
+    needs a single ``version_id`` since all markers share one timeline.
+    """
+    if fmt not in COMMENT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(COMMENT_FORMATS)}")
+    if fmt == "reaper" and version_id is None:
+        raise HTTPException(status_code=400, detail="format=reaper needs a version_id")
+    project = _validate_share_link(share_link, db)
+    query = (
+        db.query(Version)
+        .options(joinedload(Version.song))
+        .join(Song)
+        .filter(Song.project_id == project.id)
+        .order_by(Song.position, Version.version_number)
+    )
+    if version_id is not None:
+        query = query.filter(Version.id == version_id)
+    if song_id is not None:
+        query = query.filter(Song.id == song_id)
+    versions = [ExportVersion.of(v) for v in query.all()]
+    if (version_id is not None or song_id is not None) and not versions:
+        raise HTTPException(status_code=404, detail="Version not found in this project")
+
+    name = safe_name(project.title)
+    if len(versions) == 1:
+        name = f"{name} - {safe_name(versions[0].song_title)} - {safe_name(versions[0].display)}"
+    elif song_id is not None:
+        name = f"{name} - {safe_name(versions[0].song_title)}"
+    filename = f"{name}{' markers' if fmt == 'reaper' else ''}.{'jsonl' if fmt == 'jsonl' else 'csv'}"
+    return StreamingResponse(
+        comment_export(fmt, versions, offset, region_length),
+        media_type=f"{COMMENT_FORMATS[fmt]}; charset=utf-8",
+        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}"},
+    )
+
+
+@router.get("/api/versions/{version_id}/comment-histogram")
+def comment_histogram(
+    version_id: int,
+    buckets: int = Query(100, ge=1, le=2000),
+    time_from: float = Query(0.0, alias="from", ge=0),
+    time_to: float | None = Query(None, alias="to", gt=0, description="Default: the last comment"),
+    db: Session = Depends(get_db),
+):
+    """Open/resolved comment counts in ``buckets`` equal slices of [from, to], from one GROUP BY.
+
+    Pass the track length as ``to`` so the buckets line up with the waveform.
+    """
+    if db.query(Version.id).filter(Version.id == version_id).first() is None:
+        raise HTTPException(status_code=404, detail="Version not found")
+    if time_to is None:
+        time_to = db.query(func.max(Comment.timecode)).filter(Comment.version_id == version_id).scalar() or 0.0
+        if time_to <= time_from:  # nothing after 'from' (or no comments at all)
+            return {
+                "from": time_from,
+                "to": time_from,
+                "bucket_seconds": 0.0,
+                "open": [0] * buckets,
+                "resolved": [0] * buckets,
+            }
+    if time_to <= time_from:
+        raise HTTPException(status_code=400, detail="'to' must be after 'from'")
+    width = (time_to - time_from) / buckets
+    bucket = cast((Comment.timecode - time_from) / width, Integer)
+    rows = (
+        db.query(
+            bucket,
+            func.sum(case((Comment.solved == False, 1), else_=0)),
+            func.sum(case((Comment.solved == True, 1), else_=0)),
+        )
+        .filter(Comment.version_id == version_id, Comment.timecode >= time_from, Comment.timecode <= time_to)
+        .group_by(bucket)
+        .all()
+    )
+    open_counts = [0] * buckets
+    resolved_counts = [0] * buckets
+    for index, n_open, n_resolved in rows:
+        index = min(index, buckets - 1)  # timecode == to belongs to the last bucket
+        open_counts[index] += n_open
+        resolved_counts[index] += n_resolved
+    return {
+        "from": time_from,
+        "to": time_to,
+        "bucket_seconds": width,
+        "open": open_counts,
+        "resolved": resolved_counts,
+    }
+
+
+@router.post(
+    "/api/projects/{share_link}/comments",
+    response_model=CommentOut,
+    status_code=201,
+    dependencies=[Depends(rate_limited("comments"))],
+)
 def create_comment(
     share_link: str,
     req: CommentCreate,
@@ -74,14 +230,17 @@ def create_comment(
         timecode=req.timecode,
         author_name=req.author_name,
         text=req.text,
+        replies=[],  # new comment; nothing to lazy-load once returned from the write queue
     )
-    db.add(comment)
-    db.commit()
-    db.refresh(comment)
-    return comment
+    return writequeue.insert(comment, db)
 
 
-@router.post("/api/projects/{share_link}/comments/{comment_id}/reply", response_model=ReplyOut, status_code=201)
+@router.post(
+    "/api/projects/{share_link}/comments/{comment_id}/reply",
+    response_model=ReplyOut,
+    status_code=201,
+    dependencies=[Depends(rate_limited("replies"))],
+)
 def reply_to_comment(
     share_link: str,
     comment_id: int,
@@ -96,10 +255,7 @@ def reply_to_comment(
         author_name=req.author_name,
         text=req.text,
     )
-    db.add(reply)
-    db.commit()
-    db.refresh(reply)
-    return reply
+    return writequeue.insert(reply, db)
 
 
 @router.patch("/api/projects/{share_link}/comments/{comment_id}/resolve", response_model=CommentOut)
@@ -118,7 +274,11 @@ def resolve_comment(
     return comment
 
 
-@router.patch("/api/projects/{share_link}/comments/{comment_id}/resolve-client", response_model=CommentOut)
+@router.patch(
+    "/api/projects/{share_link}/comments/{comment_id}/resolve-client",
+    response_model=CommentOut,
+    dependencies=[Depends(rate_limited("resolve"))],
+)
 def resolve_comment_client(
     share_link: str,
     comment_id: int,
@@ -1,62 +1,172 @@
 import os
+from urllib.parse import quote
 
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import FileResponse
-from sqlalchemy import func
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse, ORJSONResponse, RedirectResponse, StreamingResponse
+from sqlalchemy import case, distinct, func
+from sqlalchemy.orm import Session, joinedload, selectinload
 
+from .. import analytics, compaction, spectrogram
 from ..auth import get_project_by_share_link
 from ..database import get_db
 from ..models import Comment, Project, Song, Version
-from ..schemas import ClientProjectOut, SongOut
+from ..projection import SONG_COLUMNS, SONG_COUNTS, VERSION_COLUMNS, check_format, parse_fields, shape
+from ..ratelimit import rate_limited
+from ..responses import model_json_response
+from ..schemas import BootstrapOut, ClientProjectOut, ListeningBatch, SongOut
+from ..storage import PRESIGN_EXPIRES, get_storage, media_type, stored_filename
+from .settings import _get_or_create_settings, _to_settings_out
 
 router = APIRouter(tags=["client"])
 
 
 def _enrich_songs(songs, db):
     """Add version_count and comment_count to each song."""
+    counts = _song_counts(songs[0].project_id, db) if songs else {}
     result = []
     for s in songs:
-        ver_count = len(s.versions)
-        comment_count = (
-            db.query(func.count(Comment.id))
-            .join(Version)
-            .filter(Version.song_id == s.id)
-            .scalar()
-        )
-        open_count = (
-            db.query(func.count(Comment.id))
-            .join(Version)
-            .filter(Version.song_id == s.id, Comment.solved == False)
-            .scalar()
-        )
+        _, comment_count, open_count = counts.get(s.id, (0, 0, 0))
         song_data = SongOut(
             id=s.id, title=s.title, position=s.position,
             created_at=s.created_at, versions=s.versions,
-            version_count=ver_count, comment_count=comment_count,
+            version_count=len(s.versions), comment_count=comment_count,
             open_count=open_count,
         )
         result.append(song_data)
     return result
 
 
-@router.get("/api/projects/{share_link}")
+def _song_counts(project_id: str, db: Session) -> dict[int, tuple[int, int, int]]:
+    """(version_count, comment_count, open_count) per song id, from one grouped query."""
+    rows = (
+        db.query(
+            Version.song_id,
+            func.count(distinct(Version.id)),
+            func.count(Comment.id),
+            func.coalesce(func.sum(case((Comment.solved == False, 1), else_=0)), 0),
+        )
+        .join(Song, Song.id == Version.song_id)
+        .outerjoin(Comment, Comment.version_id == Version.id)
+        .filter(Song.project_id == project_id)
+        .group_by(Version.song_id)
+    )
+    return {song_id: (versions, comments, open_) for song_id, versions, comments, open_ in rows}
+
+
+def _projected_project(project_id: str, title: str, fields: str | None, fmt: str, db: Session) -> ORJSONResponse:
+    """SELECT only the requested song/version columns; counts only if asked for."""
+    check_format(fmt)
+    fieldset = parse_fields(fields, list(SONG_COLUMNS) + list(SONG_COUNTS), {"versions": list(VERSION_COLUMNS)})
+    columns = [SONG_COLUMNS[f] for f in fieldset.top if f in SONG_COLUMNS]
+    songs = db.query(Song.id, *columns).filter(Song.project_id == project_id).order_by(Song.position).all()
+
+    versions: dict[int, list] = {}
+    version_fields = fieldset.nested.get("versions")
+    if version_fields is not None:
+        version_rows = (
+            db.query(Version.song_id, *[VERSION_COLUMNS[f] for f in version_fields])
+            .join(Song, Song.id == Version.song_id)
+            .filter(Song.project_id == project_id)
+            .order_by(Version.version_number)
+        )
+        for song_id, *values in version_rows:
+            versions.setdefault(song_id, []).append(values)
+
+    counts = _song_counts(project_id, db) if any(f in SONG_COUNTS for f in fieldset.top) else {}
+
+    out = []
+    for song_id, *values in songs:
+        it = iter(values)
+        row = []
+        for f in fieldset.top:
+            if f == "versions":
+                row.append(versions.get(song_id, []))
+            elif f in SONG_COUNTS:
+                row.append(counts.get(song_id, (0, 0, 0))[SONG_COUNTS.index(f)])
+            else:
+                row.append(next(it))
+        out.append(row)
+
+    body = shape(out, fieldset, fmt)
+    if fmt == "compact":
+        return ORJSONResponse({"title": title, **body})
+    return ORJSONResponse({"title": title, "songs": body})
+
+
+@router.get("/api/projects/{share_link}", response_model=ClientProjectOut)
 def get_project_by_link(
     share_link: str,
+    fields: str | None = None,
+    fmt: str = Query("full", alias="format"),
     db: Session = Depends(get_db),
 ):
+    """Project tree. ``fields``/``format=compact`` select a subset (see app.projection)."""
+    if fields is not None or fmt != "full":
+        found = db.query(Project.id, Project.title).filter(Project.share_link == share_link).first()
+        if found is None:
+            raise HTTPException(status_code=404, detail="Project not found")
+        return _projected_project(found.id, found.title, fields, fmt, db)
+
     project = db.query(Project).options(
         joinedload(Project.songs).joinedload(Song.versions)
     ).filter(Project.share_link == share_link).first()
     if project is None:
         raise HTTPException(status_code=404, detail="Project not found")
-    return {
+    return model_json_response(ClientProjectOut, {
         "title": project.title,
         "songs": _enrich_songs(project.songs, db),
-    }
+    })
+
+
+def _default_version(songs) -> Version | None:
+    """The version the client opens first: favourite of the first song, else its latest."""
+    for s in songs:
+        if s.versions:
+            return next((v for v in s.versions if v.favourite), s.versions[-1])
+    return None
+
 
+def _bootstrap(share_link: str, db: Session) -> BootstrapOut | None:
+    project = db.query(Project).options(
+        joinedload(Project.songs).joinedload(Song.versions)
+    ).filter(Project.share_link == share_link).first()
+    if project is None:
+        return None
+    version = _default_version(project.songs)
+    comments = []
+    if version is not None:
+        comments = (
+            db.query(Comment)
+            .options(selectinload(Comment.replies))
+            .filter(Comment.version_id == version.id)
+            .order_by(Comment.timecode)
+            .all()
+        )
+    return BootstrapOut(
+        settings=_to_settings_out(_get_or_create_settings(db)),
+        project=ClientProjectOut(title=project.title, songs=_enrich_songs(project.songs, db)),
+        song_id=version.song_id if version else None,
+        version_id=version.id if version else None,
+        comments=comments,
+    )
 
-@router.patch("/api/projects/{share_link}/versions/{version_id}/favourite")
+
+@router.get("/api/projects/{share_link}/bootstrap", response_model=BootstrapOut)
+def get_bootstrap(
+    share_link: str,
+    db: Session = Depends(get_db),
+):
+    """Settings, project tree and the default version's comments in one round trip."""
+    payload = _bootstrap(share_link, db)
+    if payload is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return model_json_response(BootstrapOut, payload)
+
+
+@router.patch(
+    "/api/projects/{share_link}/versions/{version_id}/favourite",
+    dependencies=[Depends(rate_limited("favourites"))],
+)
 def toggle_favourite_client(
     share_link: str,
     version_id: int,
@@ -79,23 +189,108 @@ def toggle_favourite_client(
     return {"ok": True, "favourite": version.favourite}
 
 
+@router.post(
+    "/api/projects/{share_link}/listening",
+    status_code=202,
+    dependencies=[Depends(rate_limited("listening"))],
+)
+def record_listening(
+    share_link: str,
+    batch: ListeningBatch,
+    db: Session = Depends(get_db),
+):
+    """Buffer a batch of playback events; written out later by app.analytics."""
+    project = get_project_by_share_link(share_link, db)
+    ids = {e.version_id for e in batch.events}
+    known = {
+        vid for (vid,) in db.query(Version.id)
+        .join(Song, Song.id == Version.song_id)
+        .filter(Song.project_id == project.id, Version.id.in_(ids))
+    } if ids else set()
+    events = [e for e in batch.events if e.version_id in known]
+    return {"accepted": analytics.buffer.add(share_link, batch.listener, events)}
+
+
 @router.get("/api/audio/{version_id}")
 def stream_audio(
     version_id: int,
+    v: str | None = None,
+    fmt: str | None = Query(None, alias="format", pattern="^wav$"),
     db: Session = Depends(get_db),
 ):
+    """The version's audio. Requested through its ``audio_url`` (with the
+    current ``?v=`` tag) it is the stored file and may be cached
+    indefinitely. A compacted version is otherwise (and with ``format=wav``)
+    re-wrapped as the WAV that was uploaded, under its original filename."""
     version = db.query(Version).filter(Version.id == version_id).first()
     if version is None:
         raise HTTPException(status_code=404, detail="Version not found")
-    if not os.path.isfile(version.file_path):
+    storage = get_storage()
+    filename = stored_filename(version.original_filename, version.file_path)
+    immutable = v is not None and version.audio_url.endswith(f"?v={v}")
+    if version.compacted_from and (fmt == "wav" or not immutable):
+        path = storage.local_path(version.file_path)
+        headers = {"Content-Disposition": f"attachment; filename*=UTF-8''{quote(version.original_filename)}"}
+        if path is not None:
+            if not os.path.isfile(path):
+                raise HTTPException(status_code=404, detail="Audio file not found")
+            headers["Content-Length"] = str(
+                compaction.wav_size(path, version.compacted_from, version.compacted_fmt)
+            )
+        return StreamingResponse(
+            compaction.wav_chunks(version.file_path, version.compacted_from, version.compacted_fmt),
+            media_type="audio/wav", headers=headers,
+        )
+    if fmt == "wav" and media_type(version.file_path) != "audio/wav":
+        raise HTTPException(status_code=400, detail="This version is not available as WAV")
+    media = media_type(version.file_path)
+    path = storage.local_path(version.file_path)
+    if path is None:
+        # Bytes come straight from the bucket. Each redirect signs a new URL,
+        # so let the browser reuse this one for a while to keep its cache warm.
+        url = storage.presigned_get(version.file_path, filename, media)
+        return RedirectResponse(
+            url, status_code=307, headers={"Cache-Control": f"private, max-age={PRESIGN_EXPIRES // 2}"},
+        )
+    if not os.path.isfile(path):
         raise HTTPException(status_code=404, detail="Audio file not found")
 
-    ext = os.path.splitext(version.file_path)[1].lower()
-    media_types = {".wav": "audio/wav", ".mp3": "audio/mpeg", ".flac": "audio/flac"}
-    media_type = media_types.get(ext, "application/octet-stream")
+    return FileResponse(
+        path,
+        media_type=media,
+        filename=filename,
+        headers={"Cache-Control": "private, max-age=31536000, immutable"} if immutable else None,
+    )
+
+
+@router.get("/api/versions/{version_id}/spectrogram")
+def spectrogram_metadata(version_id: int, db: Session = Depends(get_db)):
+    """Tile pyramid layout; 202 (with Retry-After) while the tiles are still being built."""
+    version = db.query(Version).filter(Version.id == version_id).first()
+    if version is None:
+        raise HTTPException(status_code=404, detail="Version not found")
+    meta = spectrogram.metadata(version_id)
+    if meta is None:
+        error = spectrogram.failure(version_id)
+        if error is not None:
+            raise HTTPException(status_code=422, detail=f"No spectrogram for this file: {error}")
+        spectrogram.schedule(version_id, version.file_path)
+        return ORJSONResponse({"status": "pending"}, status_code=202, headers={"Retry-After": "3"})
+    tiles = f"/api/versions/{version_id}/spectrogram/{{z}}/{{x}}?v={meta['build']}"
+    return ORJSONResponse({"status": "ready", **meta, "tiles": tiles}, headers={"Cache-Control": "no-cache"})
+
 
+@router.get("/api/versions/{version_id}/spectrogram/{z}/{x}")
+def spectrogram_tile(version_id: int, z: int, x: int, v: str | None = None):
+    """One PNG tile. Served straight from disk; with the ``?v=`` of the current build
+    (as in the metadata's URL) it may be cached indefinitely."""
+    path = spectrogram.tile_path(version_id, z, x)
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Tile not found")
+    meta = spectrogram.metadata(version_id) if v is not None else None
+    immutable = meta is not None and meta["build"] == v
     return FileResponse(
-        version.file_path,
-        media_type=media_type,
-        filename=version.original_filename,
+        path,
+        media_type="image/png",
+        headers={"Cache-Control": "public, max-age=31536000, immutable"} if immutable else None,
     )
@@ -1,18 +1,18 @@
 import os
-import shutil
 
 from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, RedirectResponse
 from sqlalchemy.orm import Session
 
 from ..auth import get_current_admin
 from ..database import get_db
 from ..models import AdminUser, AppSettings
-from ..schemas import SettingsOut, SettingsUpdate
+from ..ratelimit import invalidate_quotas
+from ..schemas import AdminSettingsOut, SettingsOut, SettingsUpdate
+from ..storage import get_storage, media_type
 
 router = APIRouter(tags=["settings"])
 
-LOGO_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "..", "data", "uploads", "logo")
 ALLOWED_IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg"}
 
 
@@ -26,8 +26,16 @@ def _get_or_create_settings(db: Session) -> AppSettings:
     return settings
 
 
+def _logo_available(key: str | None) -> bool:
+    if not key:
+        return False
+    path = get_storage().local_path(key)
+    # Remote logos are only removed through delete_logo, which clears the key.
+    return path is None or os.path.isfile(path)
+
+
 def _to_settings_out(settings: AppSettings) -> dict:
-    logo_url = "/api/logo" if settings.logo_path and os.path.isfile(settings.logo_path) else None
+    logo_url = "/api/logo" if _logo_available(settings.logo_path) else None
     return {
         "accent_color": settings.accent_color,
         "dark_900": settings.dark_900,
@@ -51,13 +59,32 @@ def _to_settings_out(settings: AppSettings) -> dict:
     }
 
 
+def _to_admin_settings_out(settings: AppSettings) -> dict:
+    return {
+        **_to_settings_out(settings),
+        "rate_limit_comments": settings.rate_limit_comments,
+        "rate_limit_replies": settings.rate_limit_replies,
+        "rate_limit_favourites": settings.rate_limit_favourites,
+        "rate_limit_resolve": settings.rate_limit_resolve,
+        "rate_limit_listening": settings.rate_limit_listening,
+    }
+
+
 @router.get("/api/settings", response_model=SettingsOut)
 def get_settings(db: Session = Depends(get_db)):
     settings = _get_or_create_settings(db)
     return _to_settings_out(settings)
 
 
-@router.put("/admin/settings", response_model=SettingsOut)
+@router.get("/admin/settings", response_model=AdminSettingsOut)
+def get_admin_settings(
+    _admin: AdminUser = Depends(get_current_admin),
+    db: Session = Depends(get_db),
+):
+    return _to_admin_settings_out(_get_or_create_settings(db))
+
+
+@router.put("/admin/settings", response_model=AdminSettingsOut)
 def update_settings(
     req: SettingsUpdate,
     _admin: AdminUser = Depends(get_current_admin),
@@ -70,16 +97,19 @@ def update_settings(
         "light_accent_color", "light_bg_900", "light_bg_800", "light_bg_700", "light_bg_600",
         "light_text_color", "light_waveform_color", "light_waveform_progress_color",
         "logo_height", "clients_can_resolve",
+        "rate_limit_comments", "rate_limit_replies", "rate_limit_favourites", "rate_limit_resolve",
+        "rate_limit_listening",
     ]:
         value = getattr(req, field)
         if value is not None:
             setattr(settings, field, value)
     db.commit()
     db.refresh(settings)
-    return _to_settings_out(settings)
+    invalidate_quotas()
+    return _to_admin_settings_out(settings)
 
 
-@router.post("/admin/settings/logo", response_model=SettingsOut)
+@router.post("/admin/settings/logo", response_model=AdminSettingsOut)
 def upload_logo(
     file: UploadFile = File(...),
     _admin: AdminUser = Depends(get_current_admin),
@@ -98,19 +128,18 @@ def upload_logo(
 
     settings = _get_or_create_settings(db)
 
+    storage = get_storage()
     # Delete old logo
-    if settings.logo_path and os.path.isfile(settings.logo_path):
-        os.remove(settings.logo_path)
+    if settings.logo_path:
+        storage.delete(settings.logo_path)
 
-    os.makedirs(LOGO_DIR, exist_ok=True)
-    dest = os.path.join(LOGO_DIR, f"logo{ext}")
-    with open(dest, "wb") as f:
-        shutil.copyfileobj(file.file, f)
+    key = f"logo/logo{ext}"
+    storage.save(key, file.file, media_type(key))
 
-    settings.logo_path = dest
+    settings.logo_path = key
     db.commit()
     db.refresh(settings)
-    return _to_settings_out(settings)
+    return _to_admin_settings_out(settings)
 
 
 @router.delete("/admin/settings/logo", status_code=status.HTTP_204_NO_CONTENT)
@@ -119,8 +148,8 @@ def delete_logo(
     db: Session = Depends(get_db),
 ):
     settings = _get_or_create_settings(db)
-    if settings.logo_path and os.path.isfile(settings.logo_path):
-        os.remove(settings.logo_path)
+    if settings.logo_path:
+        get_storage().delete(settings.logo_path)
     settings.logo_path = None
     db.commit()
 
@@ -128,8 +157,12 @@ def delete_logo(
 @router.get("/api/logo")
 def get_logo(db: Session = Depends(get_db)):
     settings = _get_or_create_settings(db)
-    if not settings.logo_path or not os.path.isfile(settings.logo_path):
+    if not _logo_available(settings.logo_path):
         raise HTTPException(status_code=404, detail="No logo set")
-    ext = os.path.splitext(settings.logo_path)[1].lower()
-    media = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg"}.get(ext, "image/png")
-    return FileResponse(settings.logo_path, media_type=media)
+    storage = get_storage()
+    media = media_type(settings.logo_path)
+    path = storage.local_path(settings.logo_path)
+    if path is None:
+        url = storage.presigned_get(settings.logo_path, os.path.basename(settings.logo_path), media)
+        return RedirectResponse(url, status_code=307)
+    return FileResponse(path, media_type=media)
@@ -1,4 +1,6 @@
 from datetime import datetime
+from typing import Literal
+
 from pydantic import BaseModel, Field
 
 
@@ -80,10 +82,30 @@ class VersionOut(BaseModel):
     original_filename: str
     favourite: bool
     created_at: datetime
+    audio_url: str = ""
+    download_url: str = ""
 
     model_config = {"from_attributes": True}
 
 
+class DirectUploadRequest(BaseModel):
+    filename: str = Field(min_length=1, max_length=255)  # the extension decides the stored Content-Type
+
+
+class DirectUploadOut(BaseModel):
+    upload_url: str
+    key: str
+    method: str = "PUT"
+    headers: dict[str, str]
+
+
+class DirectUploadComplete(BaseModel):
+    key: str
+    filename: str = Field(min_length=1, max_length=255)
+    label: str = ""
+    version_number: int | None = None
+
+
 # --- Comment ---
 
 class CommentCreate(BaseModel):
@@ -113,6 +135,52 @@ class ReplyOut(BaseModel):
     model_config = {"from_attributes": True}
 
 
+class CommentImport(BaseModel):
+    """One row of a bulk import (see app.imports)."""
+    timecode: float = Field(ge=0)
+    author_name: str = Field(min_length=1, max_length=100)
+    text: str = Field(min_length=1, max_length=5000)
+    solved: bool = False
+    replies: list[ReplyCreate] = []
+
+
+class CommentImportResult(BaseModel):
+    comments: int
+    replies: int
+
+
+MIN_CONFIDENCE = 0.3  # alignment anchors below this don't take part in the time map
+
+
+class CarryCommentsRequest(BaseModel):
+    from_version_id: int | None = None  # default: the song's previous version
+    comment_ids: list[int] | None = None  # default: all unresolved comments
+    min_confidence: float = Field(MIN_CONFIDENCE, ge=0, le=1)  # less sure placements are reported, not copied
+    dry_run: bool = False
+
+
+class TimeSegmentOut(BaseModel):
+    new_start: float
+    new_end: float
+    offset: float
+    confidence: float
+
+
+class CarriedCommentOut(BaseModel):
+    comment_id: int
+    timecode: float
+    new_timecode: float
+    confidence: float
+    new_comment_id: int | None = None  # None if not copied (dry run or below min_confidence)
+    already_carried: bool = False  # an earlier run copied it; new_comment_id is that copy
+
+
+class CarryCommentsResult(BaseModel):
+    from_version_id: int
+    segments: list[TimeSegmentOut]
+    comments: list[CarriedCommentOut]
+
+
 class CommentOut(BaseModel):
     id: int
     version_id: int
@@ -126,6 +194,63 @@ class CommentOut(BaseModel):
     model_config = {"from_attributes": True}
 
 
+# --- Listening analytics ---
+
+class ListeningEvent(BaseModel):
+    """``play``: [start, end] was heard without a break; ``seek``: jumped from start to end."""
+    type: Literal["play", "seek", "complete"]
+    version_id: int
+    start: float = Field(0.0, ge=0)
+    end: float = Field(0.0, ge=0)
+    duration: float = Field(gt=0, le=24 * 3600)
+
+
+class ListeningBatch(BaseModel):
+    listener: str = Field(pattern=r"^[A-Za-z0-9_-]{8,32}$")  # random id kept by the browser
+    events: list[ListeningEvent] = Field(max_length=500)
+
+
+class ListeningOut(BaseModel):
+    version_id: int
+    listeners: int
+    seconds: float
+    completes: int
+    seeks: int
+    heard: float  # largest share of the track any one listener heard, 0..1
+    coverage: list[int]  # listeners per slice of the track
+    last_at: datetime
+
+
+# --- Maintenance ---
+
+class BackupOut(BaseModel):
+    name: str
+    size: int
+    created_at: datetime
+
+
+class IntegrityOut(BaseModel):
+    checked_at: datetime
+    ok: bool
+    errors: list[str] = []
+
+
+class DatabaseStatusOut(BaseModel):
+    size: int  # bytes, main file
+    wal_size: int
+    page_size: int
+    page_count: int
+    free_pages: int
+    fragmentation: float  # share of pages on the freelist, 0..1
+    auto_vacuum: str
+    last_backup: datetime | None = None
+    backups: list[BackupOut]
+    last_optimize: datetime | None = None
+    integrity: IntegrityOut | None = None
+    needs_conversion: bool = False  # free pages stay until convert-auto-vacuum runs
+    pending: list[str] = []  # jobs queued through POST /admin/maintenance/{task}
+
+
 # --- Settings ---
 
 class SettingsUpdate(BaseModel):
@@ -147,6 +272,11 @@ class SettingsUpdate(BaseModel):
     light_waveform_progress_color: str | None = Field(default=None, pattern=r'^#[0-9A-Fa-f]{6}$')
     logo_height: int | None = Field(default=None, ge=16, le=120)
     clients_can_resolve: bool | None = None
+    rate_limit_comments: int | None = Field(default=None, ge=0, le=10000)
+    rate_limit_replies: int | None = Field(default=None, ge=0, le=10000)
+    rate_limit_favourites: int | None = Field(default=None, ge=0, le=10000)
+    rate_limit_resolve: int | None = Field(default=None, ge=0, le=10000)
+    rate_limit_listening: int | None = Field(default=None, ge=0, le=10000)
 
 
 class SettingsOut(BaseModel):
@@ -173,6 +303,15 @@ class SettingsOut(BaseModel):
     model_config = {"from_attributes": True}
 
 
+class AdminSettingsOut(SettingsOut):
+    """Settings as the admin sees them; the quotas stay out of the public copy."""
+    rate_limit_comments: int = 20
+    rate_limit_replies: int = 20
+    rate_limit_favourites: int = 30
+    rate_limit_resolve: int = 60
+    rate_limit_listening: int = 10
+
+
 # --- Client view ---
 
 class ClientProjectOut(BaseModel):
@@ -180,3 +319,12 @@ class ClientProjectOut(BaseModel):
     songs: list[SongOut]
 
     model_config = {"from_attributes": True}
+
+
+class BootstrapOut(BaseModel):
+    """Everything the share-link page needs for its first paint."""
+    settings: SettingsOut
+    project: ClientProjectOut
+    song_id: int | None = None
+    version_id: int | None = None
+    comments: list[CommentOut] = []
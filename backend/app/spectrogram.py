@@ -0,0 +1,308 @@
+"""Spectrogram tile pyramids, precomputed per version.
+
+A version's audio is read in blocks of ``BLOCK_FRAMES`` STFT hops, so
+memory stays flat for any length: each block is windowed, transformed
+with one vectorised ``rfft`` and mapped to ``TILE`` log-spaced frequency
+rows (20 Hz up to 20 kHz or Nyquist) as 8-bit levels over ``DB_RANGE``.
+Those columns are the finest zoom level; every coarser level halves the
+time resolution (max of column pairs, so transients survive) until the
+whole song fits into a single tile at zoom 0. Only one tile per level is
+held in memory while the pyramid is built.
+
+Tiles are palette PNGs (low levels transparent, for overlaying the
+waveform) in ``data/spectrograms/{version_id}/{z}/{x}.png`` next to a
+``meta.json``. A version's tiles never change, so they are served as
+immutable under the ``?v=`` of the metadata's tile URL; ``build`` in the
+metadata busts caches when a version id is reused after a delete.
+
+A file libsndfile can't decode is marked as failed for good. Other errors
+(storage, disk, a killed worker's leftovers) are retried ``RETRY_AFTER``
+seconds later.
+"""
+import json
+import logging
+import math
+import os
+import shutil
+import struct
+import time
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Iterator
+
+import numpy as np
+import soundfile as sf
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .storage import get_storage
+
+log = logging.getLogger(__name__)
+
+SPECTROGRAM_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "data", "spectrograms"))
+
+N_FFT = 4096
+HOP = 1024
+TILE = 256  # px; tiles are TILE frequency rows high and up to TILE columns wide
+BLOCK_FRAMES = 256
+MIN_FREQ = 20.0
+MAX_FREQ = 20000.0
+DB_RANGE = 96.0
+STALE_LOCK = 30 * 60  # seconds; a build that is still "running" after this has died
+RETRY_AFTER = 10 * 60  # seconds before a build that failed for reasons other than the audio is retried
+
+# "Inferno"-like colour map; alpha ramps up over the quietest quarter
+_ANCHORS = np.array([
+    (0, 0, 4), (40, 11, 84), (101, 21, 110), (159, 42, 99),
+    (212, 72, 66), (245, 125, 21), (250, 193, 39), (252, 255, 164),
+], dtype=float)
+_PALETTE = np.stack([
+    np.interp(np.linspace(0, len(_ANCHORS) - 1, 256), np.arange(len(_ANCHORS)), _ANCHORS[:, i])
+    for i in range(3)
+], axis=1).round().astype(np.uint8).tobytes()
+_ALPHA = bytes(min(255, i * 4) for i in range(256))
+
+
+# --- PNG ---
+
+def _png_chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+
+def encode_png(pixels: np.ndarray) -> bytes:
+    """8-bit palette PNG of a (height, width) array of palette indexes."""
+    height, width = pixels.shape
+    raw = np.zeros((height, width + 1), dtype=np.uint8)  # leading 0 = no filter on each scanline
+    raw[:, 1:] = pixels
+    return b"".join([
+        b"\x89PNG\r\n\x1a\n",
+        _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 3, 0, 0, 0)),
+        _png_chunk(b"PLTE", _PALETTE),
+        _png_chunk(b"tRNS", _ALPHA),
+        _png_chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)),
+        _png_chunk(b"IEND", b""),
+    ])
+
+
+# --- STFT ---
+
+class _FrequencyMap:
+    """Maps rfft magnitudes (dB) onto TILE log-spaced rows, highest frequency first.
+
+    Rows narrower than an FFT bin (the low end) interpolate between bins;
+    wider rows take the loudest bin they cover.
+    """
+
+    def __init__(self, samplerate: int):
+        bin_hz = samplerate / N_FFT
+        self.max_freq = min(MAX_FREQ, samplerate / 2)
+        edges = np.geomspace(MIN_FREQ, self.max_freq, TILE + 1) / bin_hz
+        centres = np.sqrt(edges[:-1] * edges[1:])
+        self.lo = np.floor(centres).astype(np.intp)
+        self.frac = (centres - self.lo).astype(np.float32)
+        self.starts = np.round(edges[:-1]).astype(np.intp)
+        self.stop = int(round(edges[-1]))
+        self.wide = np.append(self.starts[1:], self.stop) > self.starts
+
+    def __call__(self, db: np.ndarray) -> np.ndarray:
+        interpolated = db[:, self.lo] * (1 - self.frac) + db[:, self.lo + 1] * self.frac
+        peaks = np.maximum.reduceat(db[:, :self.stop], self.starts, axis=1)
+        rows = np.where(self.wide, peaks, interpolated)
+        return rows[:, ::-1]
+
+
+def _columns(path: str) -> Iterator[np.ndarray]:
+    """(n, TILE) uint8 spectrum columns; column j is centred on sample j * HOP."""
+    window = np.hanning(N_FFT).astype(np.float32)
+    scale = np.float32(2 / window.sum())  # full-scale sine = 0 dB
+    with sf.SoundFile(path) as f:
+        fmap = _FrequencyMap(f.samplerate)
+        carry = np.zeros(N_FFT // 2, dtype=np.float32)
+        while True:
+            block = f.read(HOP * BLOCK_FRAMES, dtype="float32", always_2d=True)
+            eof = len(block) < HOP * BLOCK_FRAMES
+            parts = [carry, block.mean(axis=1)]
+            if eof:
+                parts.append(np.zeros(N_FFT // 2, dtype=np.float32))
+            buf = np.concatenate(parts)
+            n = (len(buf) - N_FFT) // HOP + 1 if len(buf) >= N_FFT else 0
+            if n:
+                frames = sliding_window_view(buf, N_FFT)[::HOP][:n]
+                spectrum = np.abs(np.fft.rfft(frames * window, axis=1)) * scale
+                db = 20 * np.log10(np.maximum(spectrum, 1e-10))
+                yield np.clip((fmap(db) + DB_RANGE) * (255 / DB_RANGE), 0, 255).astype(np.uint8)
+                carry = buf[n * HOP:]
+            else:
+                carry = buf
+            if eof:
+                return
+
+
+# --- Pyramid ---
+
+class _Pyramid:
+    """Writes tiles level by level as columns stream in, finest level ``max_zoom``."""
+
+    def __init__(self, root: str, max_zoom: int):
+        self.root = root
+        self.max_zoom = max_zoom
+        self.pending = [np.empty((0, TILE), dtype=np.uint8) for _ in range(max_zoom + 1)]
+        self.next_x = [0] * (max_zoom + 1)
+
+    def add(self, columns: np.ndarray, z: int | None = None):
+        z = self.max_zoom if z is None else z
+        self.pending[z] = np.concatenate([self.pending[z], columns])
+        while len(self.pending[z]) >= TILE:
+            self._emit(z, self.pending[z][:TILE])
+            self.pending[z] = self.pending[z][TILE:]
+
+    def finish(self):
+        for z in range(self.max_zoom, -1, -1):
+            if len(self.pending[z]):
+                self._emit(z, self.pending[z])
+                self.pending[z] = self.pending[z][:0]
+
+    def _emit(self, z: int, columns: np.ndarray):
+        folder = os.path.join(self.root, str(z))
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f"{self.next_x[z]}.png"), "wb") as f:
+            f.write(encode_png(columns.T))
+        self.next_x[z] += 1
+        if z > 0:
+            if len(columns) % 2:
+                columns = np.concatenate([columns, columns[-1:]])
+            self.add(np.maximum(columns[0::2], columns[1::2]), z - 1)
+
+
+def render(path: str, dest: str) -> dict:
+    """Build the tile pyramid for the audio file at ``path`` into the directory ``dest``."""
+    info = sf.info(path)
+    total = info.frames // HOP + 1
+    max_zoom = max(0, math.ceil(math.log2(total / TILE)))
+    pyramid = _Pyramid(dest, max_zoom)
+    for columns in _columns(path):
+        pyramid.add(columns)
+    pyramid.finish()
+    meta = {
+        "build": uuid.uuid4().hex[:12],
+        "duration": info.frames / info.samplerate,
+        "sample_rate": info.samplerate,
+        "columns": total,
+        "max_zoom": max_zoom,
+        "tile_width": TILE,
+        "tile_height": TILE,
+        "seconds_per_column": HOP / info.samplerate,
+        "min_freq": MIN_FREQ,
+        "max_freq": min(MAX_FREQ, info.samplerate / 2),
+        "db_range": DB_RANGE,
+    }
+    with open(os.path.join(dest, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    return meta
+
+
+# --- Jobs ---
+
+def _dir(version_id: int) -> str:
+    return os.path.join(SPECTROGRAM_DIR, str(version_id))
+
+
+def tile_path(version_id: int, z: int, x: int) -> str:
+    return os.path.join(_dir(version_id), str(z), f"{x}.png")
+
+
+def _lock_path(version_id: int) -> str:
+    return _dir(version_id) + ".lock"
+
+
+def _failed_path(version_id: int) -> str:
+    return _dir(version_id) + ".failed"
+
+
+def metadata(version_id: int) -> dict | None:
+    try:
+        with open(os.path.join(_dir(version_id), "meta.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def failure(version_id: int) -> str | None:
+    """Why the last build failed, unless it is due for a retry."""
+    path = _failed_path(version_id)
+    try:
+        with open(path) as f:
+            marker = f.read()
+        failed_at = os.path.getmtime(path)
+    except FileNotFoundError:
+        return None
+    try:
+        marker = json.loads(marker)
+    except ValueError:  # plain message from before retries: try once more
+        marker = {"error": marker, "permanent": False}
+    if not marker["permanent"] and time.time() - failed_at >= RETRY_AFTER:
+        return None
+    return marker["error"]
+
+
+def _running(version_id: int) -> bool:
+    try:
+        return time.time() - os.path.getmtime(_lock_path(version_id)) < STALE_LOCK
+    except FileNotFoundError:
+        return False
+
+
+def _build(version_id: int, key: str):
+    os.makedirs(SPECTROGRAM_DIR, exist_ok=True)
+    lock = _lock_path(version_id)
+    if os.path.exists(lock) and not _running(version_id):
+        os.remove(lock)
+    try:
+        os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        return  # another worker is on it
+    tmp = f"{_dir(version_id)}.partial-{uuid.uuid4().hex}"
+    try:
+        if metadata(version_id) is not None:
+            return
+        started = time.monotonic()
+        with get_storage().local_copy(key) as path:
+            meta = render(path, tmp)
+        os.rename(tmp, _dir(version_id))
+        if os.path.exists(_failed_path(version_id)):
+            os.remove(_failed_path(version_id))
+        log.info("Spectrogram for version %d: %d levels in %.1fs", version_id, meta["max_zoom"] + 1, time.monotonic() - started)
+    except Exception as exc:
+        log.warning("Spectrogram for version %d failed: %s", version_id, exc)
+        with open(_failed_path(version_id), "w") as f:
+            json.dump({
+                # libsndfile's message without the (server-side) path
+                "error": getattr(exc, "error_string", None) or type(exc).__name__,
+                "permanent": isinstance(exc, sf.LibsndfileError),
+            }, f)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.remove(lock)
+
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = Lock()
+
+
+def schedule(version_id: int, key: str):
+    """Queue a build unless the tiles exist, failed recently or are being built."""
+    global _executor
+    if metadata(version_id) is not None or failure(version_id) is not None or _running(version_id):
+        return
+    with _executor_lock:
+        # Created lazily so it belongs to the worker process, not the pre-fork master.
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="spectrogram")
+    _executor.submit(_build, version_id, key)
+
+
+def delete(version_id: int):
+    shutil.rmtree(_dir(version_id), ignore_errors=True)
+    if os.path.exists(_failed_path(version_id)):
+        os.remove(_failed_path(version_id))
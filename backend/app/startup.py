@@ -0,0 +1,44 @@
+"""One-shot setup steps that must finish before any worker serves requests.
+
+Run ``python -m app.startup`` before starting the server. Under gunicorn the
+master process runs :func:`prepare` from the ``on_starting`` hook instead, so
+forked workers never race each other on schema creation.
+"""
+import logging
+import os
+
+from . import assets
+from .database import engine, init_db
+from .storage import get_storage
+
+log = logging.getLogger(__name__)
+
+# Set once prepare() has run; workers inherit it and skip the setup.
+PREPARED_ENV = "MIXREVIEW_SKIP_INIT_DB"
+
+
+def prepare():
+    init_db()
+    # Forked workers must not inherit the master's pooled SQLite connection.
+    engine.dispose()
+    try:
+        get_storage().prepare()
+    except Exception as exc:
+        # Not fatal: /ready reports storage as down until it recovers.
+        log.warning("Could not prepare upload storage: %s", exc)
+    # Forked workers must not share the master's S3 connection pool.
+    get_storage.cache_clear()
+    try:
+        assets.build()
+    except OSError as exc:
+        # e.g. a read-only frontend mount: pages fall back to the sources
+        log.warning("Skipping frontend asset build: %s", exc)
+    os.environ[PREPARED_ENV] = "1"
+
+
+def already_prepared() -> bool:
+    return os.environ.get(PREPARED_ENV) == "1"
+
+
+if __name__ == "__main__":
+    prepare()
@@ -0,0 +1,264 @@
+"""Where uploaded audio and the logo live: local disk or an S3-compatible bucket.
+
+Pick the driver with ``MIXREVIEW_STORAGE=local|s3``. Rows store a storage key
+such as ``<project_id>/<song_id>/v3.wav``; rows written before keys existed
+hold absolute paths, which the local driver still resolves.
+
+S3 settings (works with AWS, MinIO, Backblaze, ...):
+
+    MIXREVIEW_S3_BUCKET, MIXREVIEW_S3_ENDPOINT, MIXREVIEW_S3_REGION,
+    MIXREVIEW_S3_ACCESS_KEY, MIXREVIEW_S3_SECRET_KEY,
+    MIXREVIEW_S3_PUBLIC_ENDPOINT  (host browsers use, if it differs from the
+                                   one the backend talks to, e.g. in compose)
+"""
+import os
+import shutil
+import tempfile
+import uuid
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import BinaryIO, Iterator
+from urllib.parse import quote
+
+UPLOAD_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "data", "uploads"))
+PRESIGN_EXPIRES = int(os.environ.get("MIXREVIEW_PRESIGN_EXPIRES", "900"))
+CHUNK_SIZE = 1024 * 1024
+
+MEDIA_TYPES = {
+    ".wav": "audio/wav",
+    ".mp3": "audio/mpeg",
+    ".flac": "audio/flac",
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+}
+
+
+def media_type(key: str) -> str:
+    return MEDIA_TYPES.get(os.path.splitext(key)[1].lower(), "application/octet-stream")
+
+
+def stored_filename(original: str, key: str) -> str:
+    """The upload's filename with the extension of what is stored now (they
+    differ once a WAV has been compacted to FLAC)."""
+    stem, ext = os.path.splitext(original)
+    stored = os.path.splitext(key)[1]
+    return original if ext.lower() == stored.lower() else stem + stored
+
+
+def _content_disposition(filename: str) -> str:
+    return f"attachment; filename*=UTF-8''{quote(filename)}"
+
+
+class Storage:
+    """Interface shared by the drivers. Keys are '/'-separated relative paths."""
+
+    supports_presigned = False
+
+    def save(self, key: str, fileobj: BinaryIO, content_type: str | None = None):
+        raise NotImplementedError
+
+    def open(self, key: str) -> BinaryIO:
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        """Remove ``key``; a missing object is not an error."""
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def size(self, key: str) -> int:
+        raise NotImplementedError
+
+    def local_path(self, key: str) -> str | None:
+        """A filesystem path for ``key`` if the driver has one, else None."""
+        return None
+
+    @contextmanager
+    def local_copy(self, key: str) -> Iterator[str]:
+        """A readable filesystem path for ``key`` for the duration of the block."""
+        path = self.local_path(key)
+        if path is not None:
+            yield path
+            return
+        suffix = os.path.splitext(key)[1]
+        with tempfile.NamedTemporaryFile(suffix=suffix) as tmp:
+            with self.open(key) as src:
+                shutil.copyfileobj(src, tmp, CHUNK_SIZE)
+            tmp.flush()
+            yield tmp.name
+
+    def presigned_get(self, key: str, filename: str, content_type: str, expires: int = PRESIGN_EXPIRES) -> str:
+        raise NotImplementedError
+
+    def presigned_put(self, key: str, content_type: str, expires: int = PRESIGN_EXPIRES) -> str:
+        raise NotImplementedError
+
+    def prepare(self):
+        """One-shot setup at deploy time (create directories/buckets)."""
+
+    def check_writable(self) -> bool:
+        key = f".ready-{uuid.uuid4().hex}"
+        try:
+            self.save(key, tempfile.SpooledTemporaryFile())
+            self.delete(key)
+            return True
+        except Exception:
+            return False
+
+
+class LocalStorage(Storage):
+    def __init__(self, root: str = UPLOAD_DIR):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        if os.path.isabs(key):
+            return key
+        return os.path.join(self.root, *key.split("/"))
+
+    def save(self, key, fileobj, content_type=None):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write next to the target and rename, so readers never see half a file.
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                shutil.copyfileobj(fileobj, f, CHUNK_SIZE)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def open(self, key):
+        return open(self._path(key), "rb")
+
+    def delete(self, key):
+        path = self._path(key)
+        if os.path.isfile(path):
+            os.remove(path)
+
+    def exists(self, key):
+        return os.path.isfile(self._path(key))
+
+    def size(self, key):
+        return os.path.getsize(self._path(key))
+
+    def local_path(self, key):
+        return self._path(key)
+
+    def prepare(self):
+        os.makedirs(self.root, exist_ok=True)
+
+
+class S3Storage(Storage):
+    supports_presigned = True
+
+    def __init__(
+        self,
+        bucket: str,
+        endpoint_url: str | None = None,
+        region: str | None = None,
+        access_key: str | None = None,
+        secret_key: str | None = None,
+        public_endpoint_url: str | None = None,
+    ):
+        import boto3
+        from botocore.config import Config
+
+        self.bucket = bucket
+        options = dict(
+            region_name=region,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+            # Path-style addressing works with MinIO and AWS alike.
+            config=Config(signature_version="s3v4", s3={"addressing_style": "path"}),
+        )
+        self.client = boto3.client("s3", endpoint_url=endpoint_url, **options)
+        # Presigned URLs embed the host, so sign them for the one browsers reach.
+        if public_endpoint_url and public_endpoint_url != endpoint_url:
+            self.signer = boto3.client("s3", endpoint_url=public_endpoint_url, **options)
+        else:
+            self.signer = self.client
+
+    def _missing(self, exc) -> bool:
+        return exc.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+    def save(self, key, fileobj, content_type=None):
+        extra = {"ContentType": content_type} if content_type else None
+        self.client.upload_fileobj(fileobj, self.bucket, key, ExtraArgs=extra)
+
+    def open(self, key):
+        return self.client.get_object(Bucket=self.bucket, Key=key)["Body"]
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def _head(self, key) -> dict | None:
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as exc:
+            if self._missing(exc):
+                return None
+            raise
+
+    def exists(self, key):
+        return self._head(key) is not None
+
+    def size(self, key):
+        head = self._head(key)
+        if head is None:
+            raise FileNotFoundError(key)
+        return head["ContentLength"]
+
+    def presigned_get(self, key, filename, content_type, expires=PRESIGN_EXPIRES):
+        return self.signer.generate_presigned_url(
+            "get_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": key,
+                "ResponseContentType": content_type,
+                "ResponseContentDisposition": _content_disposition(filename),
+            },
+            ExpiresIn=expires,
+        )
+
+    def presigned_put(self, key, content_type, expires=PRESIGN_EXPIRES):
+        return self.signer.generate_presigned_url(
+            "put_object",
+            Params={"Bucket": self.bucket, "Key": key, "ContentType": content_type},
+            ExpiresIn=expires,
+        )
+
+    def prepare(self):
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_bucket(Bucket=self.bucket)
+        except ClientError as exc:
+            if not self._missing(exc):
+                raise
+            self.client.create_bucket(Bucket=self.bucket)
+
+
+@lru_cache(maxsize=1)
+def get_storage() -> Storage:
+    driver = os.environ.get("MIXREVIEW_STORAGE", "local")
+    if driver == "local":
+        return LocalStorage()
+    if driver == "s3":
+        bucket = os.environ.get("MIXREVIEW_S3_BUCKET")
+        if not bucket:
+            raise RuntimeError("MIXREVIEW_S3_BUCKET must be set when MIXREVIEW_STORAGE=s3")
+        return S3Storage(
+            bucket,
+            endpoint_url=os.environ.get("MIXREVIEW_S3_ENDPOINT") or None,
+            region=os.environ.get("MIXREVIEW_S3_REGION") or None,
+            access_key=os.environ.get("MIXREVIEW_S3_ACCESS_KEY") or None,
+            secret_key=os.environ.get("MIXREVIEW_S3_SECRET_KEY") or None,
+            public_endpoint_url=os.environ.get("MIXREVIEW_S3_PUBLIC_ENDPOINT") or None,
+        )
+    raise RuntimeError(f"Unknown MIXREVIEW_STORAGE: {driver}")
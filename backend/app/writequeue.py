@@ -0,0 +1,123 @@
+"""Write-behind queue that group-commits comment and reply inserts (opt-in).
+
+With ``MIXREVIEW_WRITE_QUEUE=1`` the share-link write routes still validate
+synchronously, then hand the new row to one writer thread per worker instead
+of committing it themselves. The writer collects whatever arrives within
+``MIXREVIEW_WRITE_QUEUE_WINDOW_MS`` (default 5 ms, at most
+``MIXREVIEW_WRITE_QUEUE_BATCH`` rows) and inserts the batch in a single
+transaction, so a room full of reviewers costs a handful of SQLite commits
+per second instead of one each. Callers block until their batch is
+committed and get the row back with its real id and ``created_at``.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from .database import Base, SessionLocal
+
+log = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("MIXREVIEW_WRITE_QUEUE", "0") == "1"
+WINDOW = int(os.environ.get("MIXREVIEW_WRITE_QUEUE_WINDOW_MS", "5")) / 1000
+MAX_BATCH = int(os.environ.get("MIXREVIEW_WRITE_QUEUE_BATCH", "200"))
+RESULT_TIMEOUT = 10.0
+
+
+class WriteQueue:
+    def __init__(self, window: float = WINDOW, max_batch: int = MAX_BATCH):
+        self.window = window
+        self.max_batch = max_batch
+        self._queue: queue.Queue[tuple[Base, Future]] = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_writer(self):
+        # Started lazily so it runs in the worker process, not the pre-fork master.
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+                self._thread.start()
+
+    def submit(self, row: Base) -> Future:
+        self._ensure_writer()
+        future: Future = Future()
+        self._queue.put((row, future))
+        return future
+
+    def insert(self, row: Base, timeout: float = RESULT_TIMEOUT) -> Base:
+        """Queue ``row`` and wait until its batch is committed."""
+        future = self.submit(row)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            # Only answer 503 if the row is guaranteed not to be written, or
+            # the client's retry would add it a second time.
+            if future.cancel():
+                raise HTTPException(status_code=503, detail="Database busy, try again", headers={"Retry-After": "1"})
+            return future.result()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            # Rows whose caller gave up (503) are dropped, the rest can no longer be cancelled.
+            batch = [(row, future) for row, future in batch if future.set_running_or_notify_cancel()]
+            if batch:
+                self._commit(batch)
+
+    def _commit(self, batch: list[tuple[Base, Future]]):
+        db = SessionLocal(expire_on_commit=False)
+        try:
+            db.add_all(row for row, _ in batch)
+            # The flush assigns id and created_at, so the rows need no reload
+            # after the commit; other attributes stay as constructed.
+            db.flush()
+            db.commit()
+        except Exception as exc:
+            db.rollback()
+            db.close()
+            if len(batch) > 1:
+                # Nothing was committed, so each row can be retried on its own
+                # without one bad row failing the others.
+                log.warning("Batch insert of %d rows failed (%s), retrying individually", len(batch), exc)
+                for item in batch:
+                    self._commit([item])
+                return
+            batch[0][1].set_exception(exc)
+            return
+        db.expunge_all()
+        db.close()
+        for row, future in batch:
+            future.set_result(row)
+
+
+write_queue = WriteQueue()
+
+
+def insert(row: Base, db: Session) -> Base:
+    """Persist a new row, through the write queue when it is enabled."""
+    if ENABLED:
+        # Hand the pooled connection back while we wait, or waiting requests
+        # can exhaust the pool the writer itself needs.
+        db.close()
+        return write_queue.insert(row)
+    db.add(row)
+    db.commit()
+    db.refresh(row)
+    return row
@@ -0,0 +1,170 @@
+"""Compaction round trip: compacted versions still download as the WAV that was uploaded.
+
+    cd backend && python -m benchmarks.compaction_check
+
+Writes WAVs in a throwaway database and upload directory (the real data/ is
+never touched): 16- and 24-bit, stereo and 5.1 with WAVE_FORMAT_EXTENSIBLE, an
+odd data size, a large chunk ahead of ``fmt `` and versions compacted before
+the chunk was recorded. Each is compacted with
+app.compaction, then fetched through ``download_url`` and the plain
+``/api/audio/{id}``, which must both return ``mix.wav`` with the original
+format chunk and samples (extra RIFF chunks are not kept), while
+``audio_url`` plays the FLAC. Exits with status 1 on any failure.
+"""
+import os
+import struct
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+
+os.environ["MIXREVIEW_SKIP_INIT_DB"] = "1"
+os.environ["MIXREVIEW_WRITE_QUEUE"] = "0"
+os.environ["MIXREVIEW_STORAGE"] = "local"
+
+import numpy as np
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+
+from app import compaction, database
+from app.main import app
+from app.models import Project, Song, Version
+from app.storage import get_storage
+
+FRAMES = 48000
+
+
+class Case(NamedTuple):
+    name: str
+    channels: int
+    sample_bytes: int
+    extensible: bool = False
+    frames: int = FRAMES
+    leading: int = 0  # bytes of a JUNK chunk before fmt
+    legacy: bool = False  # compacted before the fmt chunk was recorded
+
+
+CASES = [
+    Case("16-bit stereo", 2, 2),
+    Case("24-bit stereo", 2, 3),
+    Case("24-bit 5.1 EXTENSIBLE", 6, 3, extensible=True),
+    Case("24-bit mono, odd data size", 1, 3, frames=FRAMES + 1),
+    Case("16-bit stereo, 200 KB chunk before fmt", 2, 2, leading=200_000),
+    Case("24-bit 5.1, fmt not recorded", 6, 3, extensible=True, legacy=True),
+    Case("16-bit stereo, fmt not recorded", 2, 2, legacy=True),
+]
+
+
+def _fmt(case: Case) -> bytes:
+    block_align = case.channels * case.sample_bytes
+    basic = (case.channels, 44100, 44100 * block_align, block_align, case.sample_bytes * 8)
+    if not case.extensible:
+        return struct.pack("<HHIIHH", compaction.WAVE_FORMAT_PCM, *basic)
+    return struct.pack(
+        "<HHIIHHHHIH", compaction.WAVE_FORMAT_EXTENSIBLE, *basic,
+        22, case.sample_bytes * 8, 0x3F, compaction.WAVE_FORMAT_PCM,
+    ) + compaction.PCM_GUID_TAIL
+
+
+def _chunk(chunk_id: bytes, body: bytes) -> bytes:
+    return struct.pack("<4sI", chunk_id, len(body)) + body + b"\0" * (len(body) & 1)
+
+
+def _riff(*chunks: bytes) -> bytes:
+    body = b"WAVE" + b"".join(chunks)
+    return struct.pack("<4sI", b"RIFF", len(body)) + body
+
+
+def make_wav(case: Case) -> tuple[bytes, bytes]:
+    """The file as uploaded, and the WAV a faithful re-wrap must reproduce."""
+    # A quiet tone with a little noise: compressible, and every bit still has to survive
+    rng = np.random.default_rng(len(case.name))
+    top = 1 << (8 * case.sample_bytes - 1)
+    t = np.arange(case.frames * case.channels) / case.channels
+    samples = (np.sin(t * 2 * np.pi * 440 / 44100) * top / 4).astype(np.int32)
+    samples += rng.integers(-64, 64, size=samples.size, dtype=np.int32)
+    if case.sample_bytes == 2:
+        data = samples.astype("<i2").tobytes()
+    else:
+        data = samples.astype("<i4").view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+    fmt, data_chunk = _chunk(b"fmt ", _fmt(case)), _chunk(b"data", data)
+    leading = [_chunk(b"JUNK", bytes(case.leading))] if case.leading else []
+    return _riff(*leading, fmt, data_chunk), _riff(fmt, data_chunk)
+
+
+def _filename(response) -> str:
+    return response.headers.get("content-disposition", "").rpartition("''")[2]
+
+
+def check(client: TestClient, case: Case) -> list[str]:
+    uploaded, expected = make_wav(case)
+    key = f"check/{case.name.replace(' ', '-')}.wav"
+    with open(get_storage().local_path(key), "wb") as f:
+        f.write(uploaded)
+    db = database.SessionLocal()
+    try:
+        project = Project(title="Check")
+        song = Song(title=case.name, position=1)
+        version = Version(
+            version_number=1, file_path=key, original_filename="mix.wav",
+            created_at=datetime.now(timezone.utc) - timedelta(days=365),
+        )
+        song.versions.append(version)
+        project.songs.append(song)
+        db.add(project)
+        db.commit()
+        version_id = version.id
+    finally:
+        db.close()
+
+    if compaction.compact(version_id) <= 0:
+        return ["was not compacted"]
+    db = database.SessionLocal()
+    try:
+        version = db.get(Version, version_id)
+        if case.legacy:
+            version.compacted_fmt = None
+            db.commit()
+        urls = {"download_url": version.download_url, "/api/audio/{id}": f"/api/audio/{version_id}"}
+        audio_url = version.audio_url
+    finally:
+        db.close()
+
+    problems = []
+    for label, url in urls.items():
+        response = client.get(url)
+        if response.status_code != 200:
+            problems.append(f"{label}: status {response.status_code}")
+            continue
+        if _filename(response) != "mix.wav" or response.headers["content-type"] != "audio/wav":
+            problems.append(f"{label}: {response.headers['content-type']} as {_filename(response)!r}")
+        if response.content != expected:
+            problems.append(f"{label}: not the uploaded format and samples")
+        if int(response.headers.get("content-length", len(expected))) != len(expected):
+            problems.append(f"{label}: wrong Content-Length")
+    response = client.get(audio_url)
+    if response.headers.get("content-type") != "audio/flac":
+        problems.append(f"audio_url: {response.headers.get('content-type')}, expected the FLAC")
+    return problems
+
+
+def main():
+    failures = 0
+    with tempfile.TemporaryDirectory() as workdir:
+        engine = create_engine(f"sqlite:///{os.path.join(workdir, 'check.db')}")
+        database.Base.metadata.create_all(engine)
+        database.SessionLocal.configure(bind=engine)
+        get_storage().root = os.path.join(workdir, "uploads")
+        os.makedirs(os.path.join(workdir, "uploads", "check"))
+        client = TestClient(app)
+        for case in CASES:
+            problems = check(client, case)
+            print(f"{case.name:<44}{'FAIL: ' + '; '.join(problems) if problems else 'ok'}")
+            failures += bool(problems)
+        engine.dispose()
+    print(f"\n{len(CASES)} cases, {failures} failed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""SQL statements per route, checked against a budget.
+
+    cd backend && python -m benchmarks.query_budget [-v]
+
+Seeds a small and a large throwaway database (temporary directory; the real
+data/ is never touched) and calls every route in app.routers once against
+each, counting the statements that reach SQLite through SQLAlchemy's
+``before_cursor_execute``. A route fails if its count differs between the two
+datasets (something runs per row: an N+1) or exceeds its budget in ROUTES;
+the report then lists the statements the route issued on the large dataset.
+Exits with status 1 on any failure, including routes missing from ROUTES.
+"""
+import argparse
+import io
+import logging
+import os
+import sys
+import tempfile
+import uuid
+from collections import Counter
+from typing import NamedTuple
+
+# Before the app is imported: no schema/asset setup against the real data
+# dir, and comments written inline rather than by the writer thread.
+os.environ["MIXREVIEW_SKIP_INIT_DB"] = "1"
+os.environ["MIXREVIEW_WRITE_QUEUE"] = "0"
+os.environ["MIXREVIEW_STORAGE"] = "local"
+
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+
+from app import analytics, database, jobs, maintenance, ratelimit, spectrogram
+from app.auth import create_access_token, hash_password
+from app.main import app
+from app.models import AdminUser, AppSettings, Comment, ListeningRollup, Project, Reply, Song, Version
+from app.routers import admin, comments, projects, settings
+from app.storage import get_storage
+
+
+class Scale(NamedTuple):
+    projects: int
+    songs: int
+    versions: int
+    comments: int
+    replies: int
+    listeners: int
+
+
+SMALL = Scale(projects=2, songs=2, versions=2, comments=2, replies=1, listeners=1)
+LARGE = Scale(projects=5, songs=5, versions=4, comments=8, replies=3, listeners=3)
+
+CSV_IMPORT = b"timecode,author_name,text\n1.5,Ann,Kick\n3.0,Ann,Snare\n"
+
+
+class Call(NamedTuple):
+    method: str
+    path: str  # route path; {placeholders} are filled from the seeded ids
+    budget: int
+    status: int = 200
+    query: str = ""
+    kwargs: dict = {}
+    spare: bool = False  # use the ids of a second project/song/version/comment (for deletes)
+
+
+# In request order: reads first, then writes, deletes last.
+ROUTES = [
+    # settings
+    Call("GET", "/api/settings", 1),
+    Call("GET", "/api/logo", 1, 404),
+    Call("GET", "/admin/settings", 2),
+    Call("PUT", "/admin/settings", 4, kwargs={"json": {"accent_color": "#ff8800"}}),
+    Call("POST", "/admin/settings/logo", 4, kwargs={"files": {"file": ("logo.png", b"\x89PNG")}}),
+    Call("DELETE", "/admin/settings/logo", 3, 204),
+    # projects (client)
+    Call("GET", "/api/projects/{share_link}", 2),
+    Call("GET", "/api/projects/{share_link}", 4, query="fields=id,title,comment_count,versions.id"),
+    Call("GET", "/api/projects/{share_link}/bootstrap", 5),
+    Call("PATCH", "/api/projects/{share_link}/versions/{version_id}/favourite", 7),
+    Call("POST", "/api/projects/{share_link}/listening", 3, 202, kwargs={"json": {"listener": "budget-listener", "events": [
+        {"type": "play", "version_id": "{version_id}", "start": 0, "end": 30, "duration": 60},
+        {"type": "complete", "version_id": "{version_id}", "duration": 60},
+    ]}}),
+    Call("GET", "/api/audio/{version_id}", 1),
+    Call("GET", "/api/versions/{version_id}/spectrogram", 1, 202),
+    Call("GET", "/api/versions/{version_id}/spectrogram/{z}/{x}", 0, 404),
+    # comments
+    Call("GET", "/api/projects/{share_link}/comments", 3),
+    Call("GET", "/api/projects/{share_link}/comments", 3, query="version_id={version_id}&from=0&to=60"),
+    Call("GET", "/api/projects/{share_link}/comments", 3, query="fields=id,text,replies.text"),
+    Call("GET", "/api/projects/{share_link}/comments/export", 4),
+    Call("GET", "/api/projects/{share_link}/comments/export", 4, query="format=reaper&version_id={version_id}"),
+    Call("GET", "/api/versions/{version_id}/comment-histogram", 3),
+    Call("POST", "/api/projects/{share_link}/comments", 6, 201,
+         kwargs={"json": {"version_id": "{version_id}", "timecode": 12.5, "author_name": "Ann", "text": "Louder"}}),
+    Call("POST", "/api/projects/{share_link}/comments/{comment_id}/reply", 5, 201,
+         kwargs={"json": {"author_name": "Bob", "text": "Done"}}),
+    Call("PATCH", "/api/projects/{share_link}/comments/{comment_id}/resolve", 6),
+    Call("PATCH", "/api/projects/{share_link}/comments/{comment_id}/resolve-client", 7),
+    # admin
+    Call("GET", "/admin/auth/status", 1),
+    Call("POST", "/admin/auth/setup", 1, 400, kwargs={"json": {"username": "someone", "password": "password1"}}),
+    Call("POST", "/admin/auth/login", 1, kwargs={"json": {"username": "admin", "password": "password1"}}),
+    Call("GET", "/admin/projects", 4),
+    Call("POST", "/admin/projects", 4, 201, kwargs={"json": {"title": "New"}}),
+    Call("GET", "/admin/projects/{project_id}", 3),
+    Call("GET", "/admin/projects/{project_id}/listening", 5),
+    Call("GET", "/admin/maintenance", 2),
+    Call("PUT", "/admin/projects/{project_id}", 6, kwargs={"json": {"title": "Renamed"}}),
+    Call("POST", "/admin/projects/{project_id}/export-token", 2),
+    Call("GET", "/admin/projects/{project_id}/export", 6),
+    Call("POST", "/admin/projects/{project_id}/songs", 6, 201, kwargs={"json": {"title": "New song"}}),
+    Call("POST", "/admin/songs/{song_id}/versions", 5, 201, kwargs={"files": {"file": ("mix.wav", b"RIFF")}}),
+    Call("POST", "/admin/songs/{song_id}/versions/upload-url", 1, 409,
+         kwargs={"json": {"filename": "mix.wav"}}),
+    Call("POST", "/admin/songs/{song_id}/versions/complete", 6, 201,
+         kwargs={"json": {"key": "{upload_key}", "filename": "mix.wav"}}),
+    Call("PUT", "/admin/songs/{song_id}", 3, kwargs={"json": {"title": "Renamed"}}),
+    Call("PUT", "/admin/versions/{version_id}", 3, kwargs={"json": {"label": "Final"}}),
+    Call("PATCH", "/admin/versions/{version_id}/favourite", 4),
+    Call("POST", "/admin/versions/{version_id}/comments/import", 4, 201,
+         kwargs={"files": {"file": ("notes.csv", CSV_IMPORT)}}),
+    # the seeded audio is a stub, so alignment fails after the comments are loaded
+    Call("POST", "/admin/versions/{version_id}/carry-comments", 5, 422, kwargs={"json": {}}, spare=True),
+    Call("PUT", "/admin/comments/{comment_id}", 5, kwargs={"json": {"text": "Edited"}}),
+    Call("POST", "/admin/maintenance/{task}", 2, 202),
+    Call("DELETE", "/admin/comments/{comment_id}", 5, 204, spare=True),
+    Call("DELETE", "/admin/versions/{version_id}", 6, 204, spare=True),
+    Call("DELETE", "/admin/songs/{song_id}", 8, 204, spare=True),
+    Call("DELETE", "/admin/projects/{project_id}", 9, 204, spare=True),
+]
+
+
+# --- Dataset ---
+
+def _project(db, scale: Scale, title: str) -> Project:
+    project = Project(title=title)
+    for s in range(scale.songs):
+        song = Song(title=f"Song {s + 1}", position=s + 1)
+        project.songs.append(song)
+        for n in range(scale.versions):
+            version = Version(
+                version_number=n + 1, label=f"Mix {n + 1}",
+                file_path=f"missing/{uuid.uuid4().hex}.wav", original_filename=f"mix{n + 1}.wav",
+            )
+            song.versions.append(version)
+            for c in range(scale.comments):
+                version.comments.append(Comment(
+                    timecode=c * 7.5, author_name="Ann", text=f"Note {c}", solved=c % 3 == 0,
+                    replies=[Reply(author_name="Bob", text="Fixed") for _ in range(scale.replies)],
+                ))
+    db.add(project)
+    return project
+
+
+def seed(scale: Scale) -> dict:
+    """Fill the (empty) database; returns the ids the route paths refer to."""
+    db = database.SessionLocal()
+    try:
+        db.add(AdminUser(username="admin", password_hash=hash_password("password1")))
+        db.add(AppSettings(
+            id=1, clients_can_resolve=True,
+            rate_limit_comments=0, rate_limit_replies=0, rate_limit_favourites=0, rate_limit_resolve=0,
+            rate_limit_listening=0,
+        ))
+        target = _project(db, scale, "Target")
+        spare = _project(db, scale, "Spare")
+        for i in range(scale.projects - 2):
+            _project(db, scale, f"Other {i}")
+        db.commit()
+        db.add_all(
+            ListeningRollup(version_id=vid, share_link="budget", listener=f"listener-{i}", seconds=30.0, coverage=7)
+            for (vid,) in db.query(Version.id) for i in range(scale.listeners)
+        )
+        db.commit()
+        song, spare_song = target.songs[0], target.songs[1]
+        version, spare_version = song.versions[0], song.versions[1]
+        ids = {
+            "project_id": target.id,
+            "share_link": target.share_link,
+            "song_id": song.id,
+            "version_id": version.id,
+            "comment_id": version.comments[0].id,
+            "spare": {
+                "project_id": spare.id,
+                "song_id": spare_song.id,
+                "version_id": spare_version.id,
+                "comment_id": version.comments[1].id,
+            },
+            "audio_key": version.file_path,
+            "upload_key": f"{target.id}/{song.id}/{uuid.uuid4().hex}.wav",
+            "task": "backup",
+            "z": 0,
+            "x": 0,
+        }
+    finally:
+        db.close()
+    get_storage().save(ids["upload_key"], io.BytesIO(b"RIFF"))
+    get_storage().save(ids["audio_key"], io.BytesIO(b"RIFF"))
+    return ids
+
+
+# --- Measuring ---
+
+def _fill(value, ids: dict):
+    if isinstance(value, str):
+        return value.format(**ids)
+    if isinstance(value, dict):
+        return {k: _fill(v, ids) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_fill(v, ids) for v in value]
+    return value
+
+
+class Result(NamedTuple):
+    status: int
+    statements: list[str]
+
+
+def measure(scale: Scale, workdir: str) -> list[Result]:
+    engine = create_engine(f"sqlite:///{os.path.join(workdir, 'budget.db')}", connect_args={"check_same_thread": False})
+    database.Base.metadata.create_all(engine)
+    database.SessionLocal.configure(bind=engine)
+    get_storage().root = os.path.join(workdir, "uploads")
+    spectrogram.SPECTROGRAM_DIR = os.path.join(workdir, "spectrograms")
+    maintenance.BACKUP_DIR = os.path.join(workdir, "backups")
+    maintenance.STATE_DIR = jobs.JOBS_DIR = os.path.join(workdir, "jobs")
+    ids = seed(scale)
+
+    statements: list[str] = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count(_conn, _cursor, statement, *_args):
+        statements.append(statement)
+
+    client = TestClient(app, raise_server_exceptions=False)
+    client.headers["Authorization"] = f"Bearer {create_access_token('admin')}"
+    results = []
+    for call in ROUTES:
+        values = ids | ids["spare"] if call.spare else ids
+        url = call.path.format(**values) + (f"?{call.query.format(**values)}" if call.query else "")
+        statements.clear()
+        response = client.request(call.method, url, **_fill(call.kwargs, values))
+        results.append(Result(response.status_code, list(statements)))
+    analytics.buffer.flush()  # not into the next dataset's database
+    engine.dispose()
+    return results
+
+
+def _covered() -> list[str]:
+    """Router routes that have no entry in ROUTES."""
+    declared = {(c.method, c.path) for c in ROUTES}
+    missing = []
+    for router in (admin.router, comments.router, projects.router, settings.router):
+        for route in router.routes:
+            if isinstance(route, APIRoute):
+                missing += [f"{m} {route.path}" for m in sorted(route.methods) if (m, route.path) not in declared]
+    return missing
+
+
+def _report(statements: list[str]):
+    for statement, count in Counter(" ".join(s.split()) for s in statements).items():
+        print(f"      {count:>3}x {statement[:150]}{'...' if len(statement) > 150 else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-v", "--verbose", action="store_true", help="list every route's statements")
+    args = parser.parse_args()
+
+    logging.getLogger("app.spectrogram").setLevel(logging.ERROR)  # builds of the dummy audio fail
+    ratelimit.SETTINGS_TTL = 0  # re-read quotas on every request, so counts don't depend on timing
+    with tempfile.TemporaryDirectory() as small_dir, tempfile.TemporaryDirectory() as large_dir:
+        small = measure(SMALL, small_dir)
+        large = measure(LARGE, large_dir)
+
+    failures = 0
+    print(f"{'route':<76}{'small':>6}{'large':>6}{'budget':>7}")
+    for call, s, l in zip(ROUTES, small, large):
+        name = f"{call.method} {call.path}" + (f"?{call.query}" if call.query else "")
+        problems = []
+        if len(s.statements) != len(l.statements):
+            problems.append("grows with data size")
+        if len(l.statements) > call.budget:
+            problems.append("over budget")
+        if call.status not in (s.status, l.status) or s.status != l.status:
+            problems.append(f"status {s.status}/{l.status}, expected {call.status}")
+        flag = "  FAIL: " + ", ".join(problems) if problems else ""
+        print(f"{name[:75]:<76}{len(s.statements):>6}{len(l.statements):>6}{call.budget:>7}{flag}")
+        if problems or args.verbose:
+            _report(l.statements)
+        failures += bool(problems)
+
+    missing = _covered()
+    for route in missing:
+        print(f"FAIL: no budget declared for {route}")
+    failures += len(missing)
+    print(f"\n{len(ROUTES)} calls, {failures} failed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Benchmark JSON serialization and compression of a large comment list.
+
+    cd backend && python -m benchmarks.serialization [--comments 2000] [--replies 3]
+
+Compares the old response path (response_model validation, dump to Python,
+json.dumps in JSONResponse), the same with ORJSONResponse, and the direct
+pydantic-core dump used by app.responses.model_json_response, then reports
+the wire size under the compression middleware's gzip/brotli settings.
+"""
+import argparse
+import json
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import orjson
+from pydantic import TypeAdapter
+
+from app.schemas import CommentOut
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def _fake_comments(count: int, replies: int) -> list[SimpleNamespace]:
+    """ORM-like objects with the attributes CommentOut reads."""
+    base = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    result = []
+    for i in range(count):
+        created = base + timedelta(seconds=i)
+        result.append(SimpleNamespace(
+            id=i, version_id=1, timecode=i * 1.37, author_name=f"Reviewer {i % 7}",
+            text=f"Kick feels a bit loud around the drop, maybe pull 1dB? ({i})",
+            solved=i % 3 == 0, created_at=created,
+            replies=[
+                SimpleNamespace(
+                    id=i * 10 + r, comment_id=i, author_name="Engineer",
+                    text="Done in the next version, thanks!", created_at=created,
+                )
+                for r in range(replies)
+            ],
+        ))
+    return result
+
+
+def _time(fn, rounds: int) -> tuple[float, bytes]:
+    out = fn()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds * 1000, out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--comments", type=int, default=2000)
+    parser.add_argument("--replies", type=int, default=2)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    data = _fake_comments(args.comments, args.replies)
+    adapter = TypeAdapter(list[CommentOut])
+
+    def stdlib_json():
+        value = adapter.validate_python(data, from_attributes=True)
+        return json.dumps(
+            adapter.dump_python(value, mode="json"),
+            ensure_ascii=False, allow_nan=False, separators=(",", ":"),
+        ).encode("utf-8")
+
+    def orjson_response():
+        value = adapter.validate_python(data, from_attributes=True)
+        return orjson.dumps(adapter.dump_python(value, mode="json"))
+
+    def direct_dump():
+        return adapter.dump_json(adapter.validate_python(data, from_attributes=True))
+
+    print(f"{args.comments} comments x {args.replies} replies, mean of {args.rounds} rounds\n")
+    print(f"{'serializer':<28}{'ms/response':>12}{'speedup':>10}")
+    baseline = None
+    body = b""
+    for name, fn in [
+        ("JSONResponse (json.dumps)", stdlib_json),
+        ("ORJSONResponse", orjson_response),
+        ("pydantic dump_json", direct_dump),
+    ]:
+        ms, body = _time(fn, args.rounds)
+        baseline = baseline or ms
+        print(f"{name:<28}{ms:>12.2f}{baseline / ms:>9.2f}x")
+
+    print(f"\n{'encoding':<28}{'bytes':>12}{'ratio':>10}{'ms':>8}")
+    print(f"{'identity':<28}{len(body):>12}{1:>10.2f}{0:>8.2f}")
+    codecs = [("gzip level 6", lambda b: zlib.compress(b, 6))]
+    if brotli is not None:
+        codecs.append(("brotli quality 4", lambda b: brotli.compress(b, quality=4)))
+    for name, fn in codecs:
+        ms, packed = _time(lambda: fn(body), args.rounds)
+        print(f"{name:<28}{len(packed):>12}{len(body) / len(packed):>10.2f}{ms:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
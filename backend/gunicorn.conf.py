@@ -0,0 +1,25 @@
+# Production server: gunicorn managing uvicorn workers.
+#   gunicorn -c gunicorn.conf.py app.main:app
+import multiprocessing
+import os
+
+bind = os.environ.get("MIXREVIEW_BIND", "0.0.0.0:8000")
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.environ.get("MIXREVIEW_WORKERS", "0")) or multiprocessing.cpu_count()
+
+# On SIGTERM workers stop accepting connections and finish in-flight
+# responses (audio streams can take minutes on slow links) before exiting.
+graceful_timeout = int(os.environ.get("MIXREVIEW_GRACEFUL_TIMEOUT", "120"))
+timeout = 60
+keepalive = 5
+
+# Requests arrive through nginx, which sets X-Forwarded-*.
+forwarded_allow_ips = "*"
+accesslog = "-"
+
+
+def on_starting(server):
+    # Runs once in the master before any worker is forked.
+    from app.startup import prepare
+
+    prepare()
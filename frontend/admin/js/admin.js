@@ -111,6 +111,7 @@ window.openProject = async function(id) {
   $('project-title').textContent = project.title;
   $('share-link').textContent = `${window.location.origin}/${project.share_link}`;
   renderSongsList(project.songs);
+  loadListening(project);
 };
 
 function renderSongsList(songs) {
@@ -130,6 +131,33 @@ function renderSongsList(songs) {
   `).join('');
 }
 
+// Who listened to which version, and to how much of it (from the share-link page)
+async function loadListening(project) {
+  $('listening-area').classList.add('hidden');
+  let stats;
+  try { stats = await api(`/admin/projects/${project.id}/listening`); } catch { return; }
+  if (!stats.length || currentProject !== project) return;
+  const versions = {};
+  project.songs.forEach(s => s.versions.forEach(v => { versions[v.id] = { song: s, version: v }; }));
+  $('listening-list').innerHTML = stats.filter(l => versions[l.version_id]).map(l => {
+    const { song, version } = versions[l.version_id];
+    const peak = Math.max(1, ...l.coverage);
+    return `
+    <div class="bg-dark-800 rounded-lg p-3">
+      <div class="flex items-center justify-between gap-2 text-sm">
+        <div class="min-w-0 truncate">${esc(song.title)} <span class="font-mono text-accent">v${version.version_number}</span> <span class="text-gray-500">${esc(version.label)}</span></div>
+        <div class="text-xs text-gray-400 shrink-0">
+          ${l.listeners} listener${l.listeners !== 1 ? 's' : ''} · ${Math.round(l.heard * 100)}% heard · ${formatTime(l.seconds)} played${l.completes ? ` · ${l.completes}× to the end` : ''} · ${formatDate(l.last_at)}
+        </div>
+      </div>
+      <div class="flex h-2 mt-2 rounded overflow-hidden bg-dark-700" title="Parts of the track heard, by number of listeners">
+        ${l.coverage.map(n => `<div class="flex-1 bg-accent" style="opacity:${n ? 0.25 + 0.75 * n / peak : 0}"></div>`).join('')}
+      </div>
+    </div>`;
+  }).join('');
+  $('listening-area').classList.remove('hidden');
+}
+
 $('back-to-projects').addEventListener('click', () => showProjects());
 $('project-title').addEventListener('click', () => {
   openModal('Rename Project', 'Project title', async (title) => { await api(`/admin/projects/${currentProject.id}`, { method: 'PUT', json: { title } }); openProject(currentProject.id); }, currentProject.title);
@@ -142,6 +170,13 @@ $('delete-project-btn').addEventListener('click', async () => {
   if (!confirm('Delete this project and all its songs/versions?')) return;
   await api(`/admin/projects/${currentProject.id}`, { method: 'DELETE' }); showProjects();
 });
+// Plain navigation so the browser streams the ZIP to disk; the token is short-lived.
+$('export-project-btn').addEventListener('click', async () => {
+  try {
+    const { url } = await api(`/admin/projects/${currentProject.id}/export-token`, { method: 'POST' });
+    window.location.href = url;
+  } catch (e) { alert('Export failed: ' + e.message); }
+});
 $('add-song-btn').addEventListener('click', () => {
   openModal('Add Song', 'Song title', async (title) => { await api(`/admin/projects/${currentProject.id}/songs`, { method: 'POST', json: { title } }); openProject(currentProject.id); });
 });
@@ -197,7 +232,7 @@ function renderVersionsList(versions) {
         ${unsolved > 0 ? `<span class="text-xs text-amber-400" title="${unsolved} open comments">💬${unsolved}</span>` : ''}
       </div>
       <div class="flex items-center gap-3">
-        <a href="/api/audio/${v.id}" download="${esc(v.original_filename)}"
+        <a href="${v.download_url || `/api/audio/${v.id}`}" download="${esc(v.original_filename)}"
            onclick="event.stopPropagation()" class="text-xs text-gray-400 hover:text-white transition">Download</a>
         <button onclick="event.stopPropagation(); renameVersion(${v.id}, '${escAttr(v.label)}')"
           class="text-xs text-gray-400 hover:text-white transition">&#9998;</button>
@@ -219,8 +254,11 @@ window.playVersion = function(version) {
 
   const seekTo = ws ? ws.getCurrentTime() : undefined;
   const playing = ws ? ws.isPlaying() : false;
-  loadAudio(version.id, seekTo, playing);
+  loadAudio(version, seekTo, playing);
   loadComments(version.id);
+  const exportUrl = `/api/projects/${currentProject.share_link}/comments/export?version_id=${version.id}`;
+  $('export-comments-csv').href = exportUrl;
+  $('export-comments-markers').href = exportUrl + '&format=reaper';
 };
 
 $('back-to-project').addEventListener('click', () => { destroyPlayer(); currentSong = null; currentVersion = null; openProject(currentProject.id); });
@@ -251,7 +289,7 @@ window.toggleFavourite = async function(versionId) {
 // ============================================================
 // WAVESURFER
 // ============================================================
-function loadAudio(versionId, seekTo, wasPlaying) {
+function loadAudio(version, seekTo, wasPlaying) {
   destroyPlayer();
   ws = WaveSurfer.create({
     container: '#admin-waveform',
@@ -260,7 +298,7 @@ function loadAudio(versionId, seekTo, wasPlaying) {
     cursorColor: (appSettings ? getThemeColors(appSettings).text : '#e5e7eb'), cursorWidth: 1, height: window.innerWidth < 768 ? 64 : 128,
     barWidth: 2, barGap: 1, barRadius: 2, normalize: true,
   });
-  ws.load(`/api/audio/${versionId}`);
+  ws.load(version.audio_url || `/api/audio/${version.id}`);
   ws.on('ready', () => {
     $('admin-time-duration').textContent = formatTime(ws.getDuration());
     if (typeof seekTo === 'number' && ws.getDuration() > 0) ws.seekTo(Math.min(seekTo / ws.getDuration(), 1));
@@ -376,11 +414,15 @@ window.submitReply = async function(commentId) {
   await loadComments(currentVersion.id);
 };
 
+// Above this many comments the waveform shows a density histogram instead of one marker each
+const MARKER_LIMIT = 200;
+
 function renderCommentMarkers() {
-  document.querySelectorAll('.comment-marker').forEach(el => el.remove());
+  document.querySelectorAll('.comment-marker, .comment-density').forEach(el => el.remove());
   if (!ws || !ws.getDuration()) return;
   const container = document.querySelector('#admin-waveform');
   const dur = ws.getDuration();
+  if (adminComments.length > MARKER_LIMIT) { renderCommentDensity(container, dur); return; }
   adminComments.forEach(c => {
     const m = document.createElement('div');
     m.className = 'comment-marker';
@@ -391,6 +433,33 @@ function renderCommentMarkers() {
   });
 }
 
+async function renderCommentDensity(container, dur) {
+  const versionId = currentVersion.id;
+  const buckets = Math.max(10, Math.min(500, Math.floor(container.clientWidth / 4)));
+  let hist;
+  try { hist = await (await fetch(`/api/versions/${versionId}/comment-histogram?buckets=${buckets}&to=${dur}`)).json(); }
+  catch { return; }
+  if (!currentVersion || currentVersion.id !== versionId || !hist.open) return;
+  document.querySelectorAll('.comment-density').forEach(el => el.remove());
+  const max = Math.max(1, ...hist.open.map((n, i) => n + hist.resolved[i]));
+  const bar = document.createElement('div');
+  bar.className = 'comment-density';
+  hist.open.forEach((open, i) => {
+    const total = open + hist.resolved[i];
+    if (!total) return;
+    const start = hist.from + i * hist.bucket_seconds;
+    const b = document.createElement('div');
+    b.style.left = (start / dur * 100) + '%';
+    b.style.width = (hist.bucket_seconds / dur * 100) + '%';
+    b.style.height = Math.max(8, total / max * 100) + '%';
+    b.style.opacity = open ? 0.85 : 0.35;
+    b.title = `@${formatTime(start)}: ${open} open, ${hist.resolved[i]} resolved`;
+    b.addEventListener('click', (e) => { e.stopPropagation(); jumpTo(start); });
+    bar.appendChild(b);
+  });
+  container.appendChild(bar);
+}
+
 window.jumpTo = function(s) { if (ws && ws.getDuration()) ws.seekTo(s / ws.getDuration()); };
 
 $('admin-comment-submit').addEventListener('click', submitComment);
@@ -411,6 +480,41 @@ async function submitComment() {
   } catch (err) { alert('Failed: ' + err.message); }
 }
 
+$('import-comments-btn').addEventListener('click', () => { if (currentVersion) $('import-comments-file').click(); });
+$('import-comments-file').addEventListener('change', async (e) => {
+  const file = e.target.files[0];
+  e.target.value = '';
+  if (!file || !currentVersion) return;
+  const fd = new FormData();
+  fd.append('file', file);
+  fd.append('author_name', $('admin-author-name').value.trim());
+  try {
+    const res = await api(`/admin/versions/${currentVersion.id}/comments/import`, { method: 'POST', body: fd });
+    await loadComments(currentVersion.id);
+    alert(`Imported ${res.comments} comments` + (res.replies ? ` and ${res.replies} replies` : '') + '.');
+  } catch (err) { alert('Import failed: ' + err.message); }
+});
+
+$('carry-comments-btn').addEventListener('click', async () => {
+  if (!currentVersion) return;
+  if (!confirm(`Copy the open comments of the previous version onto v${currentVersion.version_number}?`)) return;
+  const btn = $('carry-comments-btn');
+  btn.disabled = true;
+  try {
+    const res = await api(`/admin/versions/${currentVersion.id}/carry-comments`, { method: 'POST', json: {} });
+    await loadComments(currentVersion.id);
+    const copied = res.comments.filter(c => c.new_comment_id !== null && !c.already_carried);
+    const before = res.comments.filter(c => c.already_carried).length;
+    const skipped = res.comments.filter(c => c.new_comment_id === null).length;
+    const unsure = copied.filter(c => c.confidence < 0.5).length;
+    alert(`Carried ${copied.length} comments.`
+      + (unsure ? ` ${unsure} could not be placed reliably; check their positions.` : '')
+      + (skipped ? ` ${skipped} could not be placed at all and were left out.` : '')
+      + (before ? ` ${before} were carried over already.` : ''));
+  } catch (err) { alert('Carry over failed: ' + err.message); }
+  btn.disabled = false;
+});
+
 // ============================================================
 // UPLOAD
 // ============================================================
@@ -438,19 +542,71 @@ function selectFile(file) {
   $('upload-selected').classList.remove('hidden'); $('upload-confirm').classList.remove('hidden');
 }
 
-$('upload-confirm').addEventListener('click', async () => {
-  if (!uploadFile || !currentSong) return;
-  $('upload-confirm').classList.add('hidden'); $('upload-progress').classList.remove('hidden');
+// null = unknown yet; false once the server says it has no object storage
+let directUploads = null;
+
+function sendWithProgress(xhr, body) {
+  return new Promise((resolve, reject) => {
+    xhr.upload.addEventListener('progress', (e) => { if (e.lengthComputable) $('upload-bar').style.width = Math.round((e.loaded / e.total) * 100) + '%'; });
+    xhr.addEventListener('load', () => resolve(xhr));
+    xhr.addEventListener('error', () => reject(new Error('Upload failed')));
+    xhr.send(body);
+  });
+}
+
+async function uploadMultipart(songId, file, label, vn) {
   const fd = new FormData();
-  fd.append('file', uploadFile); fd.append('label', $('upload-label').value.trim());
-  const vn = $('upload-version').value.trim(); if (vn) fd.append('version_number', vn);
+  fd.append('file', file); fd.append('label', label);
+  if (vn) fd.append('version_number', vn);
   const xhr = new XMLHttpRequest();
-  xhr.open('POST', `${API}/admin/songs/${currentSong.id}/versions`);
+  xhr.open('POST', `${API}/admin/songs/${songId}/versions`);
   xhr.setRequestHeader('Authorization', `Bearer ${token}`);
-  xhr.upload.addEventListener('progress', (e) => { if (e.lengthComputable) $('upload-bar').style.width = Math.round((e.loaded / e.total) * 100) + '%'; });
-  xhr.addEventListener('load', () => { if (xhr.status === 201) { closeUpload(); openSong(currentSong.id); } else { alert('Upload failed'); $('upload-confirm').classList.remove('hidden'); $('upload-progress').classList.add('hidden'); } });
-  xhr.addEventListener('error', () => { alert('Upload failed'); $('upload-confirm').classList.remove('hidden'); $('upload-progress').classList.add('hidden'); });
-  xhr.send(fd);
+  await sendWithProgress(xhr, fd);
+  if (xhr.status !== 201) throw new Error('Upload failed');
+}
+
+// Browser -> bucket via a presigned PUT; the backend only records the result.
+// Returns false when the server has no object storage.
+async function uploadDirect(songId, file, label, vn) {
+  const res = await fetch(`${API}/admin/songs/${songId}/versions/upload-url`, {
+    method: 'POST',
+    headers: { 'Authorization': `Bearer ${token}`, 'Content-Type': 'application/json' },
+    body: JSON.stringify({ filename: file.name }),
+  });
+  if (res.status === 409) return false;
+  const target = await res.json();
+  if (!res.ok) throw new Error(target.detail || 'Upload failed');
+
+  const xhr = new XMLHttpRequest();
+  xhr.open(target.method, target.upload_url);
+  Object.entries(target.headers).forEach(([k, v]) => xhr.setRequestHeader(k, v));
+  await sendWithProgress(xhr, file);
+  if (xhr.status < 200 || xhr.status >= 300) throw new Error('Upload failed');
+
+  await api(`/admin/songs/${songId}/versions/complete`, {
+    method: 'POST', json: { key: target.key, filename: file.name, label, version_number: vn ? parseInt(vn) : null },
+  });
+  return true;
+}
+
+$('upload-confirm').addEventListener('click', async () => {
+  if (!uploadFile || !currentSong) return;
+  $('upload-confirm').classList.add('hidden'); $('upload-progress').classList.remove('hidden');
+  const songId = currentSong.id;
+  const label = $('upload-label').value.trim();
+  const vn = $('upload-version').value.trim();
+  try {
+    let done = false;
+    if (directUploads !== false) {
+      done = await uploadDirect(songId, uploadFile, label, vn);
+      directUploads = done;
+    }
+    if (!done) await uploadMultipart(songId, uploadFile, label, vn);
+    closeUpload(); openSong(songId);
+  } catch (e) {
+    alert(e.message || 'Upload failed');
+    $('upload-confirm').classList.remove('hidden'); $('upload-progress').classList.add('hidden');
+  }
 });
 
 // ============================================================
@@ -490,6 +646,11 @@ const LIGHT_COLOR_FIELDS = [
   'light_accent_color', 'light_bg_900', 'light_bg_800', 'light_bg_700', 'light_bg_600',
   'light_text_color', 'light_waveform_color', 'light_waveform_progress_color',
 ];
+const RATE_LIMIT_FIELDS = {
+  rate_limit_comments: 'rl-comments', rate_limit_replies: 'rl-replies',
+  rate_limit_favourites: 'rl-favourites', rate_limit_resolve: 'rl-resolve',
+  rate_limit_listening: 'rl-listening',
+};
 const COLOR_DEFAULTS = {
   accent_color: '#6366f1', dark_900: '#0f0f0f', dark_800: '#1a1a1a',
   dark_700: '#2a2a2a', dark_600: '#3a3a3a', text_color: '#e5e7eb',
@@ -583,6 +744,7 @@ function populateSettingsUI() {
     const el = $(fieldToInputId(f));
     if (el) el.value = appSettings[f] || LIGHT_COLOR_DEFAULTS[f];
   });
+  Object.entries(RATE_LIMIT_FIELDS).forEach(([f, id]) => { $(id).value = appSettings[f] ?? ''; });
   if (appSettings.logo_url) {
     $('logo-img').src = appSettings.logo_url + '?t=' + Date.now();
     $('logo-img').classList.remove('hidden'); $('logo-placeholder').classList.add('hidden');
@@ -597,8 +759,9 @@ function populateSettingsUI() {
   }
 }
 
-$('settings-btn').addEventListener('click', () => {
+$('settings-btn').addEventListener('click', async () => {
   hideAllViews(); $('settings-view').classList.remove('hidden'); destroyPlayer();
+  try { appSettings = await api('/admin/settings'); } catch { /* keep the public copy */ }
   populateSettingsUI();
 });
 
@@ -614,6 +777,10 @@ $('save-settings-btn').addEventListener('click', async () => {
   COLOR_FIELDS.forEach(f => { data[f] = $(fieldToInputId(f)).value; });
   LIGHT_COLOR_FIELDS.forEach(f => { data[f] = $(fieldToInputId(f)).value; });
   data.logo_height = parseInt($('logo-size').value);
+  Object.entries(RATE_LIMIT_FIELDS).forEach(([f, id]) => {
+    const v = parseInt($(id).value);
+    if (!isNaN(v)) data[f] = v;
+  });
   try {
     appSettings = await api('/admin/settings', { method: 'PUT', json: data });
     applySettings(appSettings);
@@ -647,7 +814,7 @@ $('logo-file-input').addEventListener('change', async (e) => {
 $('delete-logo-btn').addEventListener('click', async () => {
   if (!confirm('Remove logo?')) return;
   await api('/admin/settings/logo', { method: 'DELETE' });
-  appSettings = await (await fetch('/api/settings')).json();
+  appSettings = await api('/admin/settings');
   applySettings(appSettings);
   $('logo-img').classList.add('hidden'); $('logo-placeholder').classList.remove('hidden');
   $('delete-logo-btn').classList.add('hidden');
@@ -8,6 +8,7 @@ let currentSong = null;
 let currentVersion = null;
 let ws = null; // wavesurfer
 let comments = [];
+let preloaded = null; // comments shipped with the bootstrap payload
 let authorStorageKey = 'mixreaview_author';
 let currentTheme = localStorage.getItem('mixreaview_theme') || (window.matchMedia('(prefers-color-scheme: light)').matches ? 'light' : 'dark');
 
@@ -31,6 +32,68 @@ async function postComment(data) {
   return res.json();
 }
 
+// --- Offline support (see /sw.js) ---
+const QUEUED_NOTICE = 'You are offline. It will be posted as soon as the connection is back.';
+
+if ('serviceWorker' in navigator) {
+  navigator.serviceWorker.register('/sw.js').catch(() => { /* works without it */ });
+  navigator.serviceWorker.addEventListener('message', (e) => {
+    if (e.data && e.data.type === 'outbox-flushed' && currentVersion) loadComments(currentVersion.id);
+  });
+  window.addEventListener('online', () => {
+    if (navigator.serviceWorker.controller) navigator.serviceWorker.controller.postMessage('flush-outbox');
+  });
+}
+
+// --- Listening analytics ---
+// Played spans, seeks and completions are batched and sent every half minute
+// (and when the page is hidden); the server adds them up per version.
+const LISTEN_FLUSH_MS = 30000;
+const listenerId = localStorage.getItem('mixreaview_listener') || (() => {
+  const id = (crypto.randomUUID ? crypto.randomUUID() : Math.random().toString(36).slice(2) + Date.now().toString(36)).replace(/-/g, '').slice(0, 32);
+  localStorage.setItem('mixreaview_listener', id);
+  return id;
+})();
+let listenEvents = [];
+let tracked = null; // { versionId, duration, spanStart, lastTime } of the loaded version
+
+function trackVersion(versionId, duration, position) {
+  tracked = { versionId, duration, spanStart: null, lastTime: position || 0 };
+}
+function listenEvent(type, start, end) {
+  if (tracked) listenEvents.push({ type, version_id: tracked.versionId, start, end, duration: tracked.duration });
+}
+function spanOpen(t) { if (tracked && tracked.spanStart === null) { tracked.spanStart = t; tracked.lastTime = t; } }
+function spanClose(t) {
+  if (!tracked || tracked.spanStart === null) return;
+  if (t > tracked.spanStart) listenEvent('play', tracked.spanStart, t);
+  tracked.spanStart = null;
+  tracked.lastTime = t;
+}
+function listenSeek(t) {
+  if (!tracked) return;
+  const from = tracked.lastTime;
+  if (Math.abs(t - from) < 1) { tracked.lastTime = t; return; }
+  const playing = tracked.spanStart !== null;
+  spanClose(from);
+  listenEvent('seek', from, t);
+  tracked.lastTime = t;
+  if (playing) spanOpen(t);
+}
+function stopTracking() { if (tracked) spanClose(tracked.lastTime); tracked = null; }
+
+function flushListening(beacon) {
+  if (tracked && tracked.spanStart !== null) { const t = tracked.lastTime; spanClose(t); spanOpen(t); }
+  if (!listenEvents.length) return;
+  const body = JSON.stringify({ listener: listenerId, events: listenEvents.splice(0, 500) });
+  const url = `/api/projects/${shareLink}/listening`;
+  if (beacon && navigator.sendBeacon) navigator.sendBeacon(url, new Blob([body], { type: 'application/json' }));
+  else fetch(url, { method: 'POST', headers: { 'Content-Type': 'application/json' }, body, keepalive: true }).catch(() => {});
+}
+setInterval(() => flushListening(false), LISTEN_FLUSH_MS);
+document.addEventListener('visibilitychange', () => { if (document.visibilityState === 'hidden') flushListening(true); });
+window.addEventListener('pagehide', () => flushListening(true));
+
 // --- Settings ---
 async function loadAppSettings() {
   try {
@@ -86,14 +149,23 @@ function applySettings(s) {
 
 // --- Init ---
 async function init() {
-  await loadAppSettings();
-  try {
-    project = await api(`/api/projects/${shareLink}`);
-  } catch {
-    $('loading').classList.add('hidden');
-    $('not-found').classList.remove('hidden');
-    return;
+  // One payload with settings, project tree and the default version's comments:
+  // inlined into the page by the server when enabled, otherwise one request.
+  let boot = window.__MIXREVIEW_BOOTSTRAP__;
+  if (!boot) {
+    try {
+      boot = await api(`/api/projects/${shareLink}/bootstrap`);
+    } catch {
+      await loadAppSettings();
+      $('loading').classList.add('hidden');
+      $('not-found').classList.remove('hidden');
+      return;
+    }
   }
+  appSettings = boot.settings;
+  applySettings(appSettings);
+  project = boot.project;
+  if (boot.version_id) preloaded = { versionId: boot.version_id, comments: boot.comments };
 
   $('loading').classList.add('hidden');
   $('client').classList.remove('hidden');
@@ -179,6 +251,7 @@ window.openSong = function(songId) {
     $('comment-input-area').classList.add('hidden');
     $('versions-empty').classList.remove('hidden');
     comments = [];
+    commentWindow = null;
     renderComments();
   }
 };
@@ -202,7 +275,7 @@ function renderVersionsList(versions) {
         <span class="text-sm">${esc(v.label)}</span>
       </div>
       <div class="flex items-center gap-3">
-        <a href="/api/audio/${v.id}" download="${esc(v.original_filename)}"
+        <a href="${v.download_url || v.audio_url || `/api/audio/${v.id}`}" download="${esc(v.original_filename)}"
            onclick="event.stopPropagation()" class="text-xs text-gray-400 hover:text-white transition">Download</a>
         <span class="text-xs text-gray-500">${formatDate(v.created_at)}</span>
       </div>
@@ -228,7 +301,7 @@ window.playVersion = function(version) {
 
   const seekTo = ws ? ws.getCurrentTime() : undefined;
   const playing = ws ? ws.isPlaying() : false;
-  loadAudio(version.id, seekTo, playing);
+  loadAudio(version, seekTo, playing);
   loadComments(version.id);
 };
 
@@ -242,7 +315,8 @@ $('back-to-songs').addEventListener('click', () => {
 // ============================================================
 // WAVESURFER
 // ============================================================
-function loadAudio(versionId, seekTo, wasPlaying) {
+function loadAudio(version, seekTo, wasPlaying) {
+  const versionId = version.id;
   destroyPlayer();
   ws = WaveSurfer.create({
     container: '#waveform',
@@ -251,20 +325,23 @@ function loadAudio(versionId, seekTo, wasPlaying) {
     cursorColor: (appSettings ? getThemeColors(appSettings).text : '#e5e7eb'), cursorWidth: 1, height: window.innerWidth < 768 ? 64 : 128,
     barWidth: 2, barGap: 1, barRadius: 2, normalize: true,
   });
-  ws.load(`/api/audio/${versionId}`);
+  ws.load(version.audio_url || `/api/audio/${versionId}`);
   ws.on('ready', () => {
     $('time-duration').textContent = formatTime(ws.getDuration());
+    trackVersion(versionId, ws.getDuration(), seekTo);
     if (typeof seekTo === 'number' && ws.getDuration() > 0) ws.seekTo(Math.min(seekTo / ws.getDuration(), 1));
     if (wasPlaying) ws.play();
     renderCommentMarkers();
+    showSpectrogram(versionId);
   });
-  ws.on('audioprocess', updateTime);
-  ws.on('seeking', updateTime);
-  ws.on('play', () => { $('play-icon').classList.add('hidden'); $('pause-icon').classList.remove('hidden'); });
-  ws.on('pause', () => { $('play-icon').classList.remove('hidden'); $('pause-icon').classList.add('hidden'); });
+  ws.on('audioprocess', () => { updateTime(); followCommentWindow(); if (tracked && tracked.spanStart !== null) tracked.lastTime = ws.getCurrentTime(); });
+  ws.on('seeking', () => { updateTime(); followCommentWindow(); listenSeek(ws.getCurrentTime()); });
+  ws.on('play', () => { $('play-icon').classList.add('hidden'); $('pause-icon').classList.remove('hidden'); spanOpen(ws.getCurrentTime()); });
+  ws.on('pause', () => { $('play-icon').classList.remove('hidden'); $('pause-icon').classList.add('hidden'); spanClose(ws.getCurrentTime()); });
+  ws.on('finish', () => { if (tracked) { spanClose(tracked.duration); listenEvent('complete', 0, tracked.duration); } });
 }
 
-function destroyPlayer() { if (ws) { ws.destroy(); ws = null; } }
+function destroyPlayer() { clearSpectrogram(); stopTracking(); if (ws) { ws.destroy(); ws = null; } }
 function updateTime() {
   if (!ws) return;
   $('time-current').textContent = formatTime(ws.getCurrentTime());
@@ -274,20 +351,123 @@ function updateTime() {
 $('play-btn').addEventListener('click', () => { if (ws) ws.playPause(); });
 document.addEventListener('keydown', (e) => { if (e.code === 'Space' && e.target.tagName !== 'INPUT') { e.preventDefault(); if (ws) ws.playPause(); } });
 
+// ============================================================
+// SPECTROGRAM
+// ============================================================
+let spectrogramOn = localStorage.getItem('mixreaview_spectrogram') === '1';
+let spectrogramRun = 0; // bumped to cancel polling/drawing for a previous version
+
+function clearSpectrogram() {
+  spectrogramRun++;
+  const old = $('spectrogram'); if (old) old.remove();
+}
+
+async function showSpectrogram(versionId) {
+  clearSpectrogram();
+  $('spectrogram-btn').classList.toggle('text-accent', spectrogramOn);
+  if (!spectrogramOn) return;
+  const run = spectrogramRun;
+  let meta = null;
+  for (let i = 0; i < 60 && !meta; i++) {
+    const res = await fetch(`/api/versions/${versionId}/spectrogram`);
+    if (run !== spectrogramRun) return;
+    if (res.status === 202) await new Promise(r => setTimeout(r, 3000));
+    else if (res.ok) meta = await res.json();
+    else return;
+  }
+  if (!meta || run !== spectrogramRun) return;
+
+  const container = $('waveform');
+  const width = Math.round(container.clientWidth * (window.devicePixelRatio || 1));
+  // Coarsest zoom level that still has a column per device pixel
+  let z = 0;
+  while (z < meta.max_zoom && Math.ceil(meta.columns / 2 ** (meta.max_zoom - z)) < width) z++;
+  const columns = Math.ceil(meta.columns / 2 ** (meta.max_zoom - z));
+  const canvas = document.createElement('canvas');
+  canvas.id = 'spectrogram';
+  canvas.className = 'absolute inset-0 w-full h-full pointer-events-none opacity-80';
+  canvas.width = width; canvas.height = meta.tile_height;
+  container.appendChild(canvas);
+  const ctx = canvas.getContext('2d');
+  const scale = width / columns;
+  for (let x = 0; x * meta.tile_width < columns; x++) {
+    const img = new Image();
+    img.onload = () => { if (run === spectrogramRun) ctx.drawImage(img, x * meta.tile_width * scale, 0, img.width * scale, canvas.height); };
+    img.src = meta.tiles.replace('{z}', z).replace('{x}', x);
+  }
+}
+
+$('spectrogram-btn').addEventListener('click', () => {
+  spectrogramOn = !spectrogramOn;
+  localStorage.setItem('mixreaview_spectrogram', spectrogramOn ? '1' : '0');
+  if (currentVersion) showSpectrogram(currentVersion.id);
+});
+
 // ============================================================
 // COMMENTS
 // ============================================================
+// Above this many comments the waveform shows a density histogram instead of one marker each,
+// and only the comments in a window around the playhead are fetched
+const MARKER_LIMIT = 200;
+const COMMENT_WINDOW = 60; // seconds
+
+let commentTotal = 0; // comments on the current version, also those outside the window
+let commentWindow = null; // { from, to } while only one window is loaded
+
 async function loadComments(versionId) {
-  try { comments = await api(`/api/projects/${shareLink}/comments?version_id=${versionId}`); }
-  catch { comments = []; }
+  const shipped = preloaded && preloaded.versionId === versionId ? preloaded.comments : null;
+  preloaded = null;
+  if (shipped && shipped.length <= MARKER_LIMIT) {
+    comments = shipped;
+    commentTotal = comments.length;
+    commentWindow = null;
+  } else {
+    try {
+      // A single bucket is just the count, so a dense version is never fetched whole
+      const hist = await api(`/api/versions/${versionId}/comment-histogram?buckets=1`);
+      commentTotal = hist.open[0] + hist.resolved[0];
+    } catch { commentTotal = 0; }
+    if (!currentVersion || currentVersion.id !== versionId) return;
+    if (commentTotal > MARKER_LIMIT) {
+      if (!await loadCommentWindow(versionId, ws ? ws.getCurrentTime() : 0)) return;
+    } else {
+      commentWindow = null;
+      try { comments = await api(`/api/projects/${shareLink}/comments?version_id=${versionId}`); }
+      catch { comments = []; }
+      if (!currentVersion || currentVersion.id !== versionId) return;
+    }
+  }
   renderComments();
   renderCommentMarkers();
 }
 
+// Fetch the comments of the window containing time t; false if it was superseded meanwhile
+async function loadCommentWindow(versionId, t) {
+  const from = Math.floor(t / COMMENT_WINDOW) * COMMENT_WINDOW;
+  const win = { from, to: from + COMMENT_WINDOW };
+  commentWindow = win;
+  let loaded;
+  try { loaded = await api(`/api/projects/${shareLink}/comments?version_id=${versionId}&from=${win.from}&to=${win.to}`); }
+  catch { loaded = []; }
+  if (commentWindow !== win || !currentVersion || currentVersion.id !== versionId) return false;
+  comments = loaded;
+  return true;
+}
+
+// Move the window along with the playhead
+async function followCommentWindow() {
+  if (!commentWindow || !ws || !currentVersion) return;
+  const t = ws.getCurrentTime();
+  if (t >= commentWindow.from && t < commentWindow.to) return;
+  if (await loadCommentWindow(currentVersion.id, t)) renderComments();
+}
+
 function renderComments() {
-  if (comments.length === 0) { $('comments-list').innerHTML = ''; $('comments-empty').classList.remove('hidden'); return; }
+  if (comments.length === 0 && !commentWindow) { $('comments-list').innerHTML = ''; $('comments-empty').classList.remove('hidden'); return; }
   $('comments-empty').classList.add('hidden');
-  $('comments-list').innerHTML = comments.map(c => `
+  const header = commentWindow ? `
+    <p class="text-xs text-gray-500 mb-2">${comments.length} of ${commentTotal} comments, @${formatTime(commentWindow.from)}–${formatTime(commentWindow.to)}. Play or click the waveform for others.</p>` : '';
+  $('comments-list').innerHTML = header + comments.map(c => `
     <div class="bg-dark-800 rounded-lg p-3 mb-2 ${c.solved ? 'opacity-50' : ''}">
       <div class="flex items-center gap-2 mb-1">
         <button onclick="jumpTo(${c.timecode})"
@@ -318,10 +498,11 @@ function renderComments() {
 }
 
 function renderCommentMarkers() {
-  document.querySelectorAll('.comment-marker').forEach(el => el.remove());
+  document.querySelectorAll('.comment-marker, .comment-density').forEach(el => el.remove());
   if (!ws || !ws.getDuration()) return;
   const container = document.querySelector('#waveform');
   const dur = ws.getDuration();
+  if (commentWindow) { renderCommentDensity(container, dur); return; }
   comments.forEach(c => {
     const m = document.createElement('div');
     m.className = 'comment-marker';
@@ -332,6 +513,33 @@ function renderCommentMarkers() {
   });
 }
 
+async function renderCommentDensity(container, dur) {
+  const versionId = currentVersion.id;
+  const buckets = Math.max(10, Math.min(500, Math.floor(container.clientWidth / 4)));
+  let hist;
+  try { hist = await (await fetch(`/api/versions/${versionId}/comment-histogram?buckets=${buckets}&to=${dur}`)).json(); }
+  catch { return; }
+  if (!currentVersion || currentVersion.id !== versionId || !hist.open) return;
+  document.querySelectorAll('.comment-density').forEach(el => el.remove());
+  const max = Math.max(1, ...hist.open.map((n, i) => n + hist.resolved[i]));
+  const bar = document.createElement('div');
+  bar.className = 'comment-density';
+  hist.open.forEach((open, i) => {
+    const total = open + hist.resolved[i];
+    if (!total) return;
+    const start = hist.from + i * hist.bucket_seconds;
+    const b = document.createElement('div');
+    b.style.left = (start / dur * 100) + '%';
+    b.style.width = (hist.bucket_seconds / dur * 100) + '%';
+    b.style.height = Math.max(8, total / max * 100) + '%';
+    b.style.opacity = open ? 0.85 : 0.35;
+    b.title = `@${formatTime(start)}: ${open} open, ${hist.resolved[i]} resolved`;
+    b.addEventListener('click', (e) => { e.stopPropagation(); jumpTo(start); });
+    bar.appendChild(b);
+  });
+  container.appendChild(bar);
+}
+
 window.jumpTo = function(s) { if (ws && ws.getDuration()) ws.seekTo(s / ws.getDuration()); };
 
 window.toggleReplyInput = function(commentId) {
@@ -358,11 +566,12 @@ window.submitReply = async function(commentId) {
   const author = document.getElementById(`reply-author-${commentId}`).value.trim();
   if (!text || !author) return;
   try {
-    await fetch(`/api/projects/${shareLink}/comments/${commentId}/reply`, {
+    const res = await fetch(`/api/projects/${shareLink}/comments/${commentId}/reply`, {
       method: 'POST', headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify({ author_name: author, text })
     });
     localStorage.setItem(authorStorageKey, author);
+    if (res.status === 202) alert('Reply saved. ' + QUEUED_NOTICE);
     await loadComments(currentVersion.id);
   } catch (err) { alert('Failed to reply: ' + err.message); }
 };
@@ -378,9 +587,10 @@ async function submitComment() {
   if (!currentVersion) return;
   const timecode = ws ? ws.getCurrentTime() : 0;
   try {
-    await postComment({ version_id: currentVersion.id, timecode, author_name: author, text });
+    const saved = await postComment({ version_id: currentVersion.id, timecode, author_name: author, text });
     localStorage.setItem(authorStorageKey, author);
     $('comment-text').value = '';
+    if (saved.queued) alert('Comment saved. ' + QUEUED_NOTICE);
     await loadComments(currentVersion.id);
   } catch (err) { alert('Failed to post comment: ' + err.message); }
 }
@@ -0,0 +1,310 @@
+// Mix Reaview service worker
+// - audio: cached in CHUNK_SIZE pieces as Range requests come in, least
+//   recently used chunks evicted above AUDIO_BUDGET. Audio URLs carry a ?v=
+//   tag that changes with the file, so a cached chunk is never stale.
+// - project/comment/settings JSON and the share page: network first, cached
+//   copy when offline. Spectrogram tiles: cache first (they are immutable).
+// - comment and reply POSTs that fail for lack of network are queued in
+//   IndexedDB and sent on Background Sync (or when the page reports it is
+//   back online, where Background Sync isn't supported).
+
+const JSON_CACHE = 'mixreview-json-v1';
+const AUDIO_CACHE = 'mixreview-audio-v1';
+const TILE_CACHE = 'mixreview-tiles-v1';
+const CACHES = [JSON_CACHE, AUDIO_CACHE, TILE_CACHE];
+const CHUNK_SIZE = 1024 * 1024;
+const MAX_FETCH = 8 * CHUNK_SIZE; // most fetched from the network for one Range request
+const AUDIO_BUDGET = 300 * 1024 * 1024;
+const MAX_TILES = 4000;
+const SYNC_TAG = 'mixreview-outbox';
+
+const POSTS = /^\/api\/projects\/[^/]+\/comments(\/\d+\/reply)?$/;
+const TILES = /^\/api\/versions\/\d+\/spectrogram\/\d+\/\d+$/;
+const JSON_PATHS = /^\/api\/(projects\/[^/]+(\/bootstrap|\/comments)?|settings|versions\/\d+\/(spectrogram|comment-histogram))$/;
+
+self.addEventListener('install', () => self.skipWaiting());
+self.addEventListener('activate', (event) => {
+  event.waitUntil((async () => {
+    for (const name of await caches.keys()) {
+      if (name.startsWith('mixreview-') && !CACHES.includes(name)) await caches.delete(name);
+    }
+    await self.clients.claim();
+  })());
+});
+
+self.addEventListener('fetch', (event) => {
+  const request = event.request;
+  const url = new URL(request.url);
+  if (url.origin !== self.location.origin) return;
+  const path = url.pathname;
+
+  if (request.method === 'POST' && POSTS.test(path)) {
+    event.respondWith(postOrQueue(request));
+  } else if (request.method !== 'GET') {
+    return;
+  } else if (path.startsWith('/api/audio/') && url.searchParams.has('v')) {
+    event.respondWith(audio(request, event));
+  } else if (TILES.test(path)) {
+    event.respondWith(cacheFirst(request, TILE_CACHE));
+  } else if (JSON_PATHS.test(path) || (request.mode === 'navigate' && !path.startsWith('/admin'))) {
+    event.respondWith(networkFirst(request));
+  }
+});
+
+// --- IndexedDB ---
+
+let dbPromise = null;
+
+function openDb() {
+  if (!dbPromise) {
+    dbPromise = new Promise((resolve, reject) => {
+      const req = indexedDB.open('mixreview', 1);
+      req.onupgradeneeded = () => {
+        const db = req.result;
+        db.createObjectStore('files', { keyPath: 'url' }); // {url, size, type}
+        db.createObjectStore('chunks', { keyPath: 'key' }).createIndex('used', 'used'); // {key, url, bytes, used}
+        db.createObjectStore('outbox', { keyPath: 'id', autoIncrement: true }); // {url, body, queued}
+      };
+      req.onsuccess = () => resolve(req.result);
+      req.onerror = () => reject(req.error);
+    });
+  }
+  return dbPromise;
+}
+
+// Runs fn(store) in a transaction; resolves with the result of the request fn returns, if any.
+async function tx(storeName, mode, fn) {
+  const db = await openDb();
+  return new Promise((resolve, reject) => {
+    const t = db.transaction(storeName, mode);
+    const req = fn(t.objectStore(storeName));
+    t.oncomplete = () => resolve(req ? req.result : undefined);
+    t.onerror = () => reject(t.error);
+  });
+}
+
+// --- JSON, pages, tiles ---
+
+async function networkFirst(request) {
+  const cache = await caches.open(JSON_CACHE);
+  try {
+    const res = await fetch(request);
+    if (res.ok) cache.put(request, res.clone());
+    return res;
+  } catch (err) {
+    const cached = await cache.match(request);
+    if (cached) return cached;
+    throw err;
+  }
+}
+
+async function cacheFirst(request, cacheName) {
+  const cache = await caches.open(cacheName);
+  const cached = await cache.match(request);
+  if (cached) return cached;
+  const res = await fetch(request);
+  if (res.ok) {
+    await cache.put(request, res.clone());
+    const keys = await cache.keys(); // insertion order: oldest first
+    for (const key of keys.slice(0, Math.max(0, keys.length - MAX_TILES))) await cache.delete(key);
+  }
+  return res;
+}
+
+// --- Audio ---
+
+const chunkKey = (url, index) => `${url}&sw-chunk=${index}`;
+
+function parseRange(header) {
+  const m = /^bytes=(\d+)-(\d*)$/.exec(header || '');
+  return m ? { start: Number(m[1]), end: m[2] ? Number(m[2]) : null } : null;
+}
+
+function totalFromContentRange(header) {
+  const m = /\/(\d+)$/.exec(header || '');
+  return m ? Number(m[1]) : null;
+}
+
+function partial(blob, start, end, file) {
+  return new Response(blob, {
+    status: 206,
+    headers: {
+      'Content-Type': file.type,
+      'Content-Length': String(end - start + 1),
+      'Content-Range': `bytes ${start}-${end}/${file.size}`,
+      'Accept-Ranges': 'bytes',
+    },
+  });
+}
+
+async function audio(request, event) {
+  const url = request.url;
+  const rangeHeader = request.headers.get('range');
+  const range = parseRange(rangeHeader);
+  if (rangeHeader && !range) return fetch(request); // suffix/multi ranges: not worth caching
+
+  const file = await tx('files', 'readonly', (s) => s.get(url));
+  if (file && range && range.start >= file.size) {
+    return new Response(null, { status: 416, headers: { 'Content-Range': `bytes */${file.size}` } });
+  }
+  if (file) {
+    const start = range ? range.start : 0;
+    const end = Math.min(range && range.end !== null ? range.end : file.size - 1, file.size - 1);
+    if (start <= end) {
+      const cached = await cachedPrefix(url, start, end, file);
+      // Ranges may be answered with just the cached part; whole-file GETs need all of it.
+      if (cached && (range || cached.end === end)) {
+        event.waitUntil(touch(cached.keys));
+        return range
+          ? partial(cached.blob, start, cached.end, file)
+          : new Response(cached.blob, { headers: { 'Content-Type': file.type, 'Content-Length': String(file.size) } });
+      }
+    }
+  }
+  return range ? fetchRange(request, range, file, event) : fetchWhole(request, event);
+}
+
+// The cached bytes from start up to end or the first missing chunk, or null.
+async function cachedPrefix(url, start, end, file) {
+  const cache = await caches.open(AUDIO_CACHE);
+  const first = Math.floor(start / CHUNK_SIZE);
+  const last = Math.floor(end / CHUNK_SIZE);
+  const blobs = [];
+  const keys = [];
+  for (let i = first; i <= last; i++) {
+    const res = await cache.match(chunkKey(url, i));
+    if (!res) break;
+    blobs.push(await res.blob());
+    keys.push(chunkKey(url, i));
+  }
+  if (!blobs.length) return null;
+  const available = Math.min(end, first * CHUNK_SIZE + blobs.reduce((n, b) => n + b.size, 0) - 1);
+  if (available < start) return null;
+  const offset = first * CHUNK_SIZE;
+  return { blob: new Blob(blobs).slice(start - offset, available - offset + 1, file.type), end: available, keys };
+}
+
+async function fetchRange(request, range, file, event) {
+  const first = Math.floor(range.start / CHUNK_SIZE) * CHUNK_SIZE;
+  let last = Math.min(range.end !== null ? range.end : Infinity, first + MAX_FETCH - 1);
+  last = Math.ceil((last + 1) / CHUNK_SIZE) * CHUNK_SIZE - 1;
+  if (file) last = Math.min(last, file.size - 1);
+  const res = await fetch(request.url, { headers: { Range: `bytes=${first}-${last}` } });
+  const size = totalFromContentRange(res.headers.get('content-range'));
+  // Without a readable Content-Range (e.g. a bucket that doesn't expose it) just pass it on.
+  if (res.status !== 206 || size === null) return res;
+
+  const body = await res.blob();
+  const info = { url: request.url, size, type: res.headers.get('content-type') || 'application/octet-stream' };
+  event.waitUntil(storeChunks(info, first, body));
+  const end = Math.min(range.end !== null ? range.end : Infinity, first + body.size - 1, size - 1);
+  return partial(body.slice(range.start - first, end - first + 1, info.type), range.start, end, info);
+}
+
+async function fetchWhole(request, event) {
+  const res = await fetch(request);
+  if (res.status === 200) {
+    const copy = res.clone();
+    event.waitUntil((async () => {
+      const body = await copy.blob();
+      await storeChunks({ url: request.url, size: body.size, type: copy.headers.get('content-type') || 'application/octet-stream' }, 0, body);
+    })());
+  }
+  return res;
+}
+
+// Stores whole chunks of body (which starts at byte offset) plus the file's last, short chunk.
+async function storeChunks(info, offset, body) {
+  const cache = await caches.open(AUDIO_CACHE);
+  const now = Date.now();
+  const entries = [];
+  for (let pos = 0; pos < body.size; pos += CHUNK_SIZE) {
+    const piece = body.slice(pos, pos + CHUNK_SIZE);
+    if (piece.size < CHUNK_SIZE && offset + pos + piece.size !== info.size) break;
+    const key = chunkKey(info.url, (offset + pos) / CHUNK_SIZE);
+    await cache.put(key, new Response(piece));
+    entries.push({ key, url: info.url, bytes: piece.size, used: now });
+  }
+  await tx('files', 'readwrite', (s) => s.put(info));
+  const db = await openDb();
+  await new Promise((resolve, reject) => {
+    const t = db.transaction('chunks', 'readwrite');
+    entries.forEach((e) => t.objectStore('chunks').put(e));
+    t.oncomplete = resolve;
+    t.onerror = () => reject(t.error);
+  });
+  await evict();
+}
+
+async function touch(keys) {
+  const db = await openDb();
+  const t = db.transaction('chunks', 'readwrite');
+  const store = t.objectStore('chunks');
+  const now = Date.now();
+  keys.forEach((key) => {
+    const req = store.get(key);
+    req.onsuccess = () => { if (req.result) store.put({ ...req.result, used: now }); };
+  });
+}
+
+async function evict() {
+  let budget = AUDIO_BUDGET;
+  if (navigator.storage && navigator.storage.estimate) {
+    const { quota } = await navigator.storage.estimate();
+    if (quota) budget = Math.min(budget, quota / 2);
+  }
+  const chunks = await tx('chunks', 'readonly', (s) => s.index('used').getAll()); // oldest first
+  let total = chunks.reduce((n, c) => n + c.bytes, 0);
+  if (total <= budget) return;
+  const cache = await caches.open(AUDIO_CACHE);
+  const evicted = [];
+  for (const chunk of chunks) {
+    if (total <= budget) break;
+    await cache.delete(chunk.key);
+    evicted.push(chunk.key);
+    total -= chunk.bytes;
+  }
+  const db = await openDb();
+  const t = db.transaction('chunks', 'readwrite');
+  evicted.forEach((key) => t.objectStore('chunks').delete(key));
+}
+
+// --- Comment outbox ---
+
+async function postOrQueue(request) {
+  const body = await request.clone().text();
+  try {
+    return await fetch(request);
+  } catch (err) {
+    await tx('outbox', 'readwrite', (s) => s.add({ url: request.url, body, queued: Date.now() }));
+    if (self.registration.sync) self.registration.sync.register(SYNC_TAG).catch(() => {});
+    return new Response(JSON.stringify({ queued: true }), { status: 202, headers: { 'Content-Type': 'application/json' } });
+  }
+}
+
+// Sends queued posts in order; throws (so Background Sync retries) if some remain.
+async function flushOutbox() {
+  const items = await tx('outbox', 'readonly', (s) => s.getAll());
+  let sent = 0;
+  let rejected = 0;
+  try {
+    for (const item of items) {
+      const res = await fetch(item.url, { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: item.body });
+      if (res.status === 429 || res.status >= 500) throw new Error(`Server answered ${res.status}`);
+      if (res.ok) sent++; else rejected++; // other 4xx won't succeed on retry either
+      await tx('outbox', 'readwrite', (s) => s.delete(item.id));
+    }
+  } finally {
+    if (sent || rejected) {
+      for (const client of await self.clients.matchAll()) client.postMessage({ type: 'outbox-flushed', sent, rejected });
+    }
+  }
+}
+
+self.addEventListener('sync', (event) => {
+  if (event.tag === SYNC_TAG) event.waitUntil(flushOutbox());
+});
+
+self.addEventListener('message', (event) => {
+  if (event.data === 'flush-outbox') event.waitUntil(flushOutbox().catch(() => {}));
+});
@@ -131,44 +131,100 @@ end
 json.decode = json_decode
 
 ---------------------------------------------------------------------------
--- HTTP helper (uses curl via os.execute)
+-- HTTP helper (asynchronous curl, polled from the defer loop)
 ---------------------------------------------------------------------------
-local function http_request(method, url, body, token)
-  local tmp_out = os.tmpname()
-  local tmp_err = os.tmpname()
-  local cmd = 'curl -s -w "\\n%{http_code}" -X ' .. method
+-- Each request runs curl in the background and writes the response to a
+-- temp file; a marker file appears when curl exits. http_poll() is called
+-- every frame, so REAPER's UI never waits on the network.
+local IS_WINDOWS = reaper.GetOS():match("Win") ~= nil
+local HTTP_MAX_PARALLEL = 4
+local HTTP_TIMEOUT = 30 -- seconds, passed to curl --max-time
+
+local http_queue = {}    -- waiting for a free slot
+local http_inflight = {} -- curl running
+
+local function http_start(req)
+  req.out_file = os.tmpname()
+  req.done_file = req.out_file .. ".done"
+  local cmd = 'curl -s --max-time ' .. HTTP_TIMEOUT .. ' -w "\\n%{http_code}" -X ' .. req.method
   cmd = cmd .. ' -H "Content-Type: application/json"'
-  if token and token ~= "" then
-    cmd = cmd .. ' -H "Authorization: Bearer ' .. token .. '"'
+  if req.token and req.token ~= "" then
+    cmd = cmd .. ' -H "Authorization: Bearer ' .. req.token .. '"'
   end
-  if body then
-    local tmp_body = os.tmpname()
-    local f = io.open(tmp_body, "w")
-    f:write(body)
+  if req.body then
+    req.body_file = os.tmpname()
+    local f = io.open(req.body_file, "w")
+    f:write(req.body)
     f:close()
-    cmd = cmd .. ' -d @' .. tmp_body
-    cmd = cmd .. ' "' .. url .. '" > ' .. tmp_out .. ' 2>' .. tmp_err
-    os.execute(cmd)
-    os.remove(tmp_body)
+    cmd = cmd .. ' -d @"' .. req.body_file .. '"'
+  end
+  local null = IS_WINDOWS and "NUL" or "/dev/null"
+  cmd = cmd .. ' "' .. req.url .. '" > "' .. req.out_file .. '" 2> ' .. null
+
+  if IS_WINDOWS then
+    -- cmd strips the outer quotes; -2 = don't wait, minimized window
+    reaper.ExecProcess('cmd.exe /C "' .. cmd .. ' & type nul > "' .. req.done_file .. '""', -2)
   else
-    cmd = cmd .. ' "' .. url .. '" > ' .. tmp_out .. ' 2>' .. tmp_err
-    os.execute(cmd)
+    os.execute('(' .. cmd .. '; touch "' .. req.done_file .. '") > /dev/null 2>&1 &')
   end
+  req.started = reaper.time_precise()
+  http_inflight[#http_inflight + 1] = req
+end
 
-  local f = io.open(tmp_out, "r")
+local function http_cleanup(req)
+  os.remove(req.out_file)
+  os.remove(req.done_file)
+  if req.body_file then os.remove(req.body_file) end
+end
+
+local function http_read_response(req)
+  local f = io.open(req.out_file, "r")
   local raw = f and f:read("*a") or ""
   if f then f:close() end
-  os.remove(tmp_out)
-  os.remove(tmp_err)
 
   -- Last line is HTTP status code
   local lines = {}
   for line in raw:gmatch("[^\n]+") do lines[#lines + 1] = line end
   local status_code = tonumber(lines[#lines]) or 0
   table.remove(lines)
-  local response_body = table.concat(lines, "\n")
+  return status_code, table.concat(lines, "\n")
+end
 
-  return status_code, response_body
+-- Queue a request; callback(status_code, response_body) runs from the defer loop.
+local function http_request(method, url, body, token, callback)
+  local req = {method = method, url = url, body = body, token = token, callback = callback}
+  if #http_inflight < HTTP_MAX_PARALLEL then
+    http_start(req)
+  else
+    http_queue[#http_queue + 1] = req
+  end
+end
+
+local function http_poll()
+  local now = reaper.time_precise()
+  for i = #http_inflight, 1, -1 do
+    local req = http_inflight[i]
+    local marker = io.open(req.done_file, "r")
+    local status, resp
+    if marker then
+      marker:close()
+      status, resp = http_read_response(req)
+    elseif now - req.started > HTTP_TIMEOUT + 5 then
+      status, resp = 0, "" -- curl never finished
+    end
+    if status then
+      http_cleanup(req)
+      table.remove(http_inflight, i)
+      if req.callback then req.callback(status, resp) end
+    end
+  end
+  while #http_inflight < HTTP_MAX_PARALLEL and #http_queue > 0 do
+    http_start(table.remove(http_queue, 1))
+  end
+end
+
+local function http_busy()
+  return #http_inflight + #http_queue > 0
 end
 
 ---------------------------------------------------------------------------
@@ -233,8 +289,14 @@ local selected_song_idx = 0
 local selected_version_idx = 0
 local comments = {}
 local loading = false
+local comments_loading = false
+local login_pending = false
 local error_msg = ""
 
+-- Bumped per comments request so a slow response for a previously selected
+-- version can't overwrite the current one.
+local comments_request_seq = 0
+
 -- Calibration: offset per song/version key
 local calibration_offsets = {}
 local current_offset_key = ""
@@ -302,23 +364,53 @@ end
 ---------------------------------------------------------------------------
 -- API functions
 ---------------------------------------------------------------------------
+-- Only the fields the script shows, in the server's compact row format:
+-- less for the server to select and far less for json_decode to walk.
+local COMMENT_FIELDS = "id,timecode,author_name,text,solved,replies.author_name,replies.text"
+local PROJECT_FIELDS = "id,title,versions.id,versions.version_number,versions.label,versions.favourite"
+
+-- Expand a compact {fields, nested, rows} payload into a list of tables.
+local function expand_rows(fields, nested, rows)
+  local out = {}
+  for i, row in ipairs(rows or {}) do
+    local item = {}
+    for fi = 1, #fields do
+      local name = fields[fi]
+      local value = row[fi]
+      if nested and nested[name] then value = expand_rows(nested[name], nil, value) end
+      item[name] = value
+    end
+    out[i] = item
+  end
+  return out
+end
+
+local function decode_compact(resp)
+  local payload = json.decode(resp)
+  if not payload or not payload.fields then return nil, payload end
+  return expand_rows(payload.fields, payload.nested, payload.rows), payload
+end
+
 local function api_login()
   login_error = ""
+  login_pending = true
   local url = server_url .. "/admin/auth/login"
   local body = json.encode({username = username, password = password})
-  local status, resp = http_request("POST", url, body)
-  if status == 200 then
-    local data = json.decode(resp)
-    if data and data.access_token then
-      jwt_token = data.access_token
-      logged_in = true
-      save_state()
+  http_request("POST", url, body, nil, function(status, resp)
+    login_pending = false
+    if status == 200 then
+      local data = json.decode(resp)
+      if data and data.access_token then
+        jwt_token = data.access_token
+        logged_in = true
+        save_state()
+      else
+        login_error = "Invalid response"
+      end
     else
-      login_error = "Invalid response"
+      login_error = "Login failed (HTTP " .. tostring(status) .. ")"
     end
-  else
-    login_error = "Login failed (HTTP " .. tostring(status) .. ")"
-  end
+  end)
 end
 
 local function extract_share_code(input)
@@ -329,54 +421,98 @@ local function extract_share_code(input)
   return input
 end
 
+local function load_saved_offsets()
+  for _, song in ipairs(songs) do
+    local key = tostring(song.id)
+    local saved = reaper.GetExtState("Mix Reaview", "offset_" .. key)
+    if saved ~= "" then calibration_offsets[key] = tonumber(saved) end
+  end
+end
+
+local function default_version_idx(song)
+  -- Prefer favourite version, fallback to newest
+  local versions = song and song.versions or {}
+  for vi, ver in ipairs(versions) do
+    if ver.favourite then return vi end
+  end
+  return #versions
+end
+
 local function api_load_comments()
   if share_link == "" then return end
   local song = songs[selected_song_idx]
   local ver = song and song.versions and song.versions[selected_version_idx]
-  if not ver then comments = {}; return end
+  comments_request_seq = comments_request_seq + 1
+  if not ver then comments = {}; comments_loading = false; return end
 
+  local seq = comments_request_seq
+  comments_loading = true
   local url = server_url .. "/api/projects/" .. share_link .. "/comments?version_id=" .. tostring(ver.id)
-  local status, resp = http_request("GET", url)
-  if status == 200 then
-    comments = json.decode(resp) or {}
-  else
-    error_msg = "Failed to load comments"
-    comments = {}
-  end
+    .. "&format=compact&fields=" .. COMMENT_FIELDS
+  http_request("GET", url, nil, nil, function(status, resp)
+    if seq ~= comments_request_seq then return end -- superseded
+    comments_loading = false
+    if status == 200 then
+      comments = decode_compact(resp) or {}
+    else
+      error_msg = "Failed to load comments"
+      comments = {}
+    end
+  end)
 end
 
-local function api_load_project()
+-- keep_selection: refresh songs/versions in place (used alongside a
+-- parallel comments reload) instead of jumping to the default version.
+local function api_load_project(keep_selection)
   error_msg = ""
   loading = true
   share_link_input = extract_share_code(share_link_input)
-  local url = server_url .. "/api/projects/" .. share_link_input
-  local status, resp = http_request("GET", url)
-  if status == 200 then
-    project_data = json.decode(resp)
-    songs = project_data and project_data.songs or {}
+  local code = share_link_input
+  local prev_song = keep_selection and songs[selected_song_idx]
+  local prev_ver = prev_song and prev_song.versions and prev_song.versions[selected_version_idx]
+  local url = server_url .. "/api/projects/" .. code .. "?format=compact&fields=" .. PROJECT_FIELDS
+  http_request("GET", url, nil, nil, function(status, resp)
+    loading = false
+    if status ~= 200 then
+      error_msg = "Failed to load project (HTTP " .. tostring(status) .. ")"
+      project_data = nil
+      songs = {}
+      return
+    end
+    local rows
+    rows, project_data = decode_compact(resp)
+    songs = rows or {}
+    share_link = code
+    save_state()
+    load_saved_offsets()
+
     selected_song_idx = #songs > 0 and 1 or 0
     selected_version_idx = 0
-    if selected_song_idx > 0 and songs[selected_song_idx].versions then
-      local versions = songs[selected_song_idx].versions
-      selected_version_idx = #versions > 0 and #versions or 0
-      for vi, ver in ipairs(versions) do
-        if ver.favourite then selected_version_idx = vi; break end
+    if prev_song then
+      for si, song in ipairs(songs) do
+        if song.id == prev_song.id then selected_song_idx = si end
       end
     end
-    share_link = share_link_input
-    save_state()
-    -- Auto-load comments for selected version
+    local song = songs[selected_song_idx]
+    if song and prev_ver then
+      for vi, ver in ipairs(song.versions or {}) do
+        if ver.id == prev_ver.id then selected_version_idx = vi end
+      end
+      if selected_version_idx > 0 then return end -- comments already reloading
+    end
+    selected_version_idx = default_version_idx(song)
     if selected_version_idx > 0 then
       api_load_comments()
     else
       comments = {}
     end
-  else
-    error_msg = "Failed to load project (HTTP " .. tostring(status) .. ")"
-    project_data = nil
-    songs = {}
-  end
-  loading = false
+  end)
+end
+
+-- Project tree and comments in parallel (two requests in flight at once).
+local function api_refresh_all()
+  api_load_comments()
+  api_load_project(true)
 end
 
 local function api_create_comment(timecode, text)
@@ -391,12 +527,13 @@ local function api_create_comment(timecode, text)
     author_name = author_name,
     text = text,
   })
-  local status, resp = http_request("POST", url, body)
-  if status == 201 then
-    api_load_comments()
-  else
-    error_msg = "Failed to create comment (HTTP " .. tostring(status) .. ")"
-  end
+  http_request("POST", url, body, nil, function(status, resp)
+    if status == 201 then
+      api_load_comments()
+    else
+      error_msg = "Failed to create comment (HTTP " .. tostring(status) .. ")"
+    end
+  end)
 end
 
 local function api_reply(comment_id, text)
@@ -405,23 +542,25 @@ local function api_reply(comment_id, text)
     author_name = author_name,
     text = text,
   })
-  local status, resp = http_request("POST", url, body)
-  if status == 201 then
-    api_load_comments()
-  else
-    error_msg = "Failed to reply (HTTP " .. tostring(status) .. ")"
-  end
+  http_request("POST", url, body, nil, function(status, resp)
+    if status == 201 then
+      api_load_comments()
+    else
+      error_msg = "Failed to reply (HTTP " .. tostring(status) .. ")"
+    end
+  end)
 end
 
 local function api_resolve(comment_id)
   -- Use admin endpoint with JWT
   local url = server_url .. "/api/projects/" .. share_link .. "/comments/" .. tostring(comment_id) .. "/resolve"
-  local status, resp = http_request("PATCH", url, nil, jwt_token)
-  if status == 200 then
-    api_load_comments()
-  else
-    error_msg = "Failed to resolve (HTTP " .. tostring(status) .. ")"
-  end
+  http_request("PATCH", url, nil, jwt_token, function(status, resp)
+    if status == 200 then
+      api_load_comments()
+    else
+      error_msg = "Failed to resolve (HTTP " .. tostring(status) .. ")"
+    end
+  end)
 end
 
 ---------------------------------------------------------------------------
@@ -475,7 +614,9 @@ local function draw_login_section()
     rem_changed, remember_password = reaper.ImGui_Checkbox(ctx, "Remember me", remember_password)
     if rem_changed then save_state() end
     reaper.ImGui_SameLine(ctx)
-    if reaper.ImGui_Button(ctx, "Login##login_btn") then
+    if login_pending then
+      reaper.ImGui_TextColored(ctx, COL_DIMMED, "Logging in...")
+    elseif reaper.ImGui_Button(ctx, "Login##login_btn") then
       api_login()
     end
 
@@ -492,12 +633,14 @@ local function draw_project_section()
   local changed
   changed, share_link_input = reaper.ImGui_InputText(ctx, "##share_link", share_link_input)
   reaper.ImGui_SameLine(ctx)
-  if reaper.ImGui_Button(ctx, "Load##load_btn") then
+  if reaper.ImGui_Button(ctx, "Load##load_btn") and not loading then
     api_load_project()
   end
 
   if project_data then
     reaper.ImGui_TextColored(ctx, COL_ACCENT, project_data.title or "")
+  elseif loading then
+    reaper.ImGui_TextColored(ctx, COL_DIMMED, "Loading project...")
   end
 
   -- Per-project link status
@@ -537,12 +680,7 @@ local function draw_song_version_section()
     for i, song in ipairs(songs) do
       if reaper.ImGui_Selectable(ctx, song.title, i == selected_song_idx) then
         selected_song_idx = i
-        local versions = songs[i].versions or {}
-        -- Prefer favourite version, fallback to newest
-        selected_version_idx = #versions > 0 and #versions or 0
-        for vi, ver in ipairs(versions) do
-          if ver.favourite then selected_version_idx = vi; break end
-        end
+        selected_version_idx = default_version_idx(songs[i])
         api_load_comments()
       end
     end
@@ -611,6 +749,23 @@ local function draw_new_comment_section()
   end
 end
 
+-- One project marker per listed comment, at the calibrated position
+-- (same names as the server's format=reaper export). Undoable as one step.
+local function add_comment_markers()
+  local offset = get_current_offset()
+  reaper.Undo_BeginBlock()
+  for _, c in ipairs(comments) do
+    local show = (filter_mode == 0)
+      or (filter_mode == 1 and not c.solved)
+      or (filter_mode == 2 and c.solved)
+    if show then
+      local name = ((c.author_name or "") .. ": " .. (c.text or "")):gsub("%s+", " ")
+      reaper.AddProjectMarker2(0, false, offset + c.timecode, 0, name, -1, 0)
+    end
+  end
+  reaper.Undo_EndBlock("Mix Reaview: add comment markers", -1)
+end
+
 local function draw_comments_section()
   if share_link == "" then return end
 
@@ -630,7 +785,15 @@ local function draw_comments_section()
   if reaper.ImGui_RadioButton(ctx, "Done (" .. resolved_count .. ")", filter_mode == 2) then filter_mode = 2 end
   reaper.ImGui_SameLine(ctx)
   if reaper.ImGui_SmallButton(ctx, "Refresh") then
-    api_load_comments()
+    api_refresh_all()
+  end
+  reaper.ImGui_SameLine(ctx)
+  if reaper.ImGui_SmallButton(ctx, "Add Markers") then
+    add_comment_markers()
+  end
+  if comments_loading then
+    reaper.ImGui_SameLine(ctx)
+    reaper.ImGui_TextColored(ctx, COL_DIMMED, "loading...")
   end
 
   -- Scrollable comment list (0 height = use remaining space)
@@ -730,14 +893,26 @@ local function draw_comments_section()
   end
 end
 
+local function draw_network_status()
+  if not http_busy() then return end
+  local text = tostring(#http_inflight) .. " request(s) in flight"
+  if #http_queue > 0 then
+    text = text .. ", " .. tostring(#http_queue) .. " queued"
+  end
+  reaper.ImGui_TextColored(ctx, COL_DIMMED, text)
+end
+
 ---------------------------------------------------------------------------
 -- Main loop
 ---------------------------------------------------------------------------
 local function loop()
+  http_poll()
+
   reaper.ImGui_SetNextWindowSize(ctx, 420, 700, reaper.ImGui_Cond_FirstUseEver())
   local visible, open = reaper.ImGui_Begin(ctx, 'Mix Reaview Comments', true)
 
   if visible then
+    draw_network_status()
     draw_login_section()
     draw_project_section()
     draw_song_version_section()
@@ -751,19 +926,15 @@ local function loop()
   end
 end
 
--- Auto-load linked project on script start
+-- Auto-load linked project on script start (comments follow once it arrives;
+-- saved calibration offsets are restored in the same callback)
 if is_linked and share_link_input ~= "" then
   api_load_project()
-  if selected_version_idx > 0 then
-    api_load_comments()
-  end
 end
 
--- Load saved calibration offsets (per song)
-for _, song in ipairs(songs) do
-  local key = tostring(song.id)
-  local saved = reaper.GetExtState("Mix Reaview", "offset_" .. key)
-  if saved ~= "" then calibration_offsets[key] = tonumber(saved) end
-end
+-- Don't leave temp files behind for requests still running at exit
+reaper.atexit(function()
+  for _, req in ipairs(http_inflight) do http_cleanup(req) end
+end)
 
 reaper.defer(loop)